@@ -0,0 +1,92 @@
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("rebuild-sales-facts")
+@click.option("--from-date", help="First day to rebuild (defaults to the first submitted Sales Invoice)")
+@click.option("--to-date", help="Last day to rebuild (defaults to the last submitted Sales Invoice)")
+@pass_context
+def rebuild_sales_facts(context, from_date=None, to_date=None):
+    "Rebuild the Sales Monthly Fact table used by Consolidated Monthly Sales Analysis"
+    import frappe
+
+    from erpmco.utils.sales_fact import rebuild_sales_facts as rebuild
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        rebuild(from_date=from_date, to_date=to_date)
+    finally:
+        frappe.destroy()
+
+
+@click.command("rebuild-transporter-rollup")
+@click.option("--from-date", help="First day to rebuild (defaults to the first submitted Delivery Note)")
+@click.option("--to-date", help="Last day to rebuild (defaults to the last submitted Delivery Note)")
+@pass_context
+def rebuild_transporter_rollup(context, from_date=None, to_date=None):
+    "Rebuild the Delivery Transporter Rollup used by Sales Delivery by Transporter"
+    import frappe
+
+    from erpmco.utils.transporter_rollup import rebuild_transporter_rollup as rebuild
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        rebuild(from_date=from_date, to_date=to_date)
+    finally:
+        frappe.destroy()
+
+
+@click.command("reconcile-reservation-balances")
+@pass_context
+def reconcile_reservation_balances(context):
+    "Rewrite the Reservation Balance rows that drifted from the open Stock Reservation Entries"
+    import frappe
+
+    from erpmco.utils.reservation_balance import reconcile_reservation_balances as reconcile
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        fixed = reconcile()
+        click.echo(f"Reconciled {fixed} Sales Order Items")
+    finally:
+        frappe.destroy()
+
+
+@click.command("purge-allocations")
+@click.option("--from-date", help="Purge Allocations created on or after this date")
+@click.option("--to-date", help="Purge Allocations created before this date (defaults to one day ago)")
+@click.option("--chunk-size", type=int, default=500, help="Allocations deleted per commit")
+@click.option("--dry-run", is_flag=True, default=False, help="Only count what would be deleted")
+@pass_context
+def purge_allocations(context, from_date=None, to_date=None, chunk_size=500, dry_run=False):
+    "Delete old Allocations and their details in chunks, keeping those with open Shortages"
+    import frappe
+    from frappe.utils import add_days, now_datetime
+
+    from erpmco.utils.cleanup import purge_allocations as purge
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        stats = purge(
+            from_date=from_date,
+            to_date=to_date or add_days(now_datetime(), -1),
+            chunk_size=chunk_size,
+            dry_run=dry_run,
+        )
+        click.echo(
+            f"{'Would delete' if dry_run else 'Deleted'} {stats.allocations} Allocations and "
+            f"{stats.details} details in {stats.chunks} chunks ({stats.seconds}s, {stats.rows_per_second} rows/s)"
+        )
+    finally:
+        frappe.destroy()
+
+
+commands = [rebuild_sales_facts, rebuild_transporter_rollup, reconcile_reservation_balances, purge_allocations]
@@ -4,7 +4,7 @@
 from frappe.model.document import Document
 import frappe
 from frappe import _
-from frappe.utils import flt
+from frappe.utils import flt, now_datetime
 import copy
 import re
 from frappe.exceptions import ValidationError
@@ -31,10 +31,12 @@ class Allocation(Document):
     #     self.update_shortages()
 
     @frappe.whitelist()
-    def reserve_all(self, details=None):
+    def reserve_all(self, details=None, stock_limits=None):
         try:
             """
             Réserve le stock pour toutes les lignes ou seulement celles passées en paramètre.
+            stock_limits: {item_code: qty en UOM de stock} plafonne la quantité réservée
+            par article (ex. la quantité transférée, voir erpmco.utils.allocation_queue).
             Retourne la liste des lignes mises à jour.
             """
             warehouse_stock_map = {}
@@ -63,6 +65,14 @@ class Allocation(Document):
                 warehouse_stock_map = get_warehouse_stock_map(
                     frappe._dict(detail), warehouse_stock_map
                 )
+                allocated_before = 0
+                if stock_limits is not None:
+                    warehouse_stock_map = cap_warehouse_stock_map(
+                        warehouse_stock_map, stock_limits.get(detail["item_code"], 0)
+                    )
+                    allocated_before = flt(
+                        frappe.db.get_value("Allocation Detail", detail["name"], "qty_allocated")
+                    )
                 warehouse_stock = sum(warehouse_stock_map.values())
 
                 try:
@@ -89,6 +99,12 @@ class Allocation(Document):
 
                 # Recalcul après réservation (always reload)
                 al = frappe.get_doc("Allocation Detail", detail["name"])
+                if stock_limits is not None:
+                    stock_limits[detail["item_code"]] = flt(
+                        stock_limits.get(detail["item_code"], 0)
+                        - (flt(al.qty_allocated) - allocated_before) * flt(detail["conversion_factor"] or 1),
+                        9,
+                    )
                 updated_rows.append(
                     {
                         "name": al.name,
@@ -255,12 +271,92 @@ class Allocation(Document):
         shortage.submit()
 
     @frappe.whitelist()
-    def populate_details(self):
+    def populate_details(self, sales_orders=None, item_codes=None):
         """
         Populates the details table with relevant sales orders and their stock status.
+        sales_orders / item_codes: restrict to these orders or items.
+        Rows already present for a (sales_order, so_item) are updated in place, so
+        their names (Shortage.allocation_detail) stay the same.
         """
+        existing = {(d.sales_order, d.so_item): d for d in self.details}
+        details = []
+        for so in self._get_open_lines(sales_orders, item_codes):
+            values = _get_detail_values(so)
+            row = existing.get((values["sales_order"], values["so_item"]))
+            if row:
+                row.update(values)
+            details.append(row or values)
+
         self.details = []
+        for row in details:
+            self.append("details", row)
+        self.save()
 
+    def refresh_details(self, sales_orders=None, item_codes=None):
+        """
+        Standing allocations (erpmco.utils.allocation_queue): refreshes the details of
+        some orders or items without rewriting the whole table. Rows are matched on
+        (sales_order, so_item): changed ones are updated, new ones bulk inserted, and
+        lines no longer open dropped unless an open Shortage points at them.
+        Returns the refreshed rows, as reserve_all(details=...) takes them.
+        """
+        filters = {"parenttype": "Allocation", "parentfield": "details", "parent": self.name}
+        if sales_orders:
+            filters["sales_order"] = ["in", list(sales_orders)]
+        if item_codes:
+            filters["item_code"] = ["in", list(item_codes)]
+        existing = {
+            (d.sales_order, d.so_item): d
+            for d in frappe.get_all("Allocation Detail", filters=filters, fields=["name"] + DETAIL_FIELDS)
+        }
+
+        rows, new_rows = [], []
+        for so in self._get_open_lines(sales_orders, item_codes):
+            values = _get_detail_values(so)
+            current = existing.pop((values["sales_order"], values["so_item"]), None)
+            if current:
+                changed = {f: v for f, v in values.items() if current[f] != v}
+                if changed:
+                    frappe.db.set_value("Allocation Detail", current.name, changed, update_modified=False)
+                values["name"] = current.name
+            else:
+                values["name"] = frappe.generate_hash(length=10)
+                new_rows.append(values)
+            rows.append(values)
+
+        if new_rows:
+            now = now_datetime()
+            user = frappe.session.user
+            idx = frappe.db.max("Allocation Detail", "idx", {"parenttype": "Allocation", "parent": self.name}) or 0
+            fields = ["name", "creation", "modified", "owner", "modified_by", "docstatus",
+                      "parent", "parenttype", "parentfield", "idx"] + DETAIL_FIELDS
+            frappe.db.bulk_insert(
+                "Allocation Detail",
+                fields,
+                [
+                    [r["name"], now, now, user, user, self.docstatus, self.name, "Allocation", "details", idx + i]
+                    + [r[f] for f in DETAIL_FIELDS]
+                    for i, r in enumerate(new_rows, start=1)
+                ],
+            )
+
+        stale = [d.name for d in existing.values()]
+        if stale:
+            referenced = set(frappe.get_all(
+                "Shortage",
+                filters={"docstatus": 1, "status": "Open", "allocation_detail": ["in", stale]},
+                pluck="allocation_detail",
+            ))
+            stale = [name for name in stale if name not in referenced]
+        if stale:
+            frappe.db.delete("Allocation Detail", {"name": ["in", stale]})
+
+        # An open form saved after this run must reload first, not write its old rows back
+        self.db_set("modified", now_datetime(), update_modified=False)
+        return rows
+
+    def _get_open_lines(self, sales_orders=None, item_codes=None):
+        """Open Sales Order lines matching the allocation filters, oldest order first."""
         query = """
             SELECT *
             FROM
@@ -304,18 +400,15 @@ class Allocation(Document):
                     AND soi.item_code = dn_draft_qty.item_code
                 LEFT JOIN (
                     SELECT
-                        sre.item_code,
-                        sre.voucher_no AS sales_order,
-                        sre.voucher_detail_no AS sales_order_item,
-                        SUM(sre.reserved_qty)  AS reserved_qty,
-                        SUM(sre.custom_so_reserved_qty) AS custom_so_reserved_qty
+                        rb.item_code,
+                        rb.sales_order,
+                        rb.sales_order_item,
+                        SUM(rb.reserved_qty)  AS reserved_qty,
+                        SUM(rb.so_reserved_qty) AS custom_so_reserved_qty
                     FROM
-                        `tabStock Reservation Entry` sre
-                    WHERE
-                        sre.docstatus = 1 AND sre.status IN ('Reserved', 'Partially Reserved', 'Partially Delivered')
-                        AND sre.voucher_type = 'Sales Order'
+                        `tabReservation Balance` rb
                     GROUP BY
-                        sre.voucher_no, sre.voucher_detail_no, sre.item_code
+                        rb.sales_order, rb.sales_order_item, rb.item_code
                 ) reserved_stock
                     ON soi.item_code = reserved_stock.item_code
                     AND soi.parent = reserved_stock.sales_order
@@ -326,11 +419,26 @@ class Allocation(Document):
                     AND (soi.qty - IFNULL(dn_draft_qty.delivered_qty, 0) - soi.delivered_qty) > 0
                     AND so.company = %(company)s AND so.branch LIKE %(branch)s AND so.customer LIKE %(customer)s
                     AND soi.item_code LIKE %(item_code)s AND so.name LIKE %(sales_order)s
+                    {extra_conditions}
                 ORDER BY
                     so.transaction_date, so.name, soi.item_code
             ) AS t   
         """
 
+        extra_conditions = ""
+        params = {}
+        if isinstance(sales_orders, str):
+            sales_orders = frappe.parse_json(sales_orders)
+        if isinstance(item_codes, str):
+            item_codes = frappe.parse_json(item_codes)
+        if sales_orders:
+            extra_conditions += " AND so.name IN %(sales_orders)s"
+            params["sales_orders"] = tuple(sales_orders)
+        if item_codes:
+            extra_conditions += " AND soi.item_code IN %(item_codes)s"
+            params["item_codes"] = tuple(item_codes)
+        query = query.replace("{extra_conditions}", extra_conditions)
+
         # Adjust query based on filters
         if self.include_lines_fully_allocated:
             query += " WHERE t.reserved_status <= 2"
@@ -341,7 +449,7 @@ class Allocation(Document):
         item_code = self.item if self.item else "%"
         branch = self.branch if self.branch else "%"
         sales_order = self.sales_order if self.sales_order else "%"
-        sales_orders = frappe.db.sql(
+        return frappe.db.sql(
             query,
             {
                 "company": self.company,
@@ -349,37 +457,40 @@ class Allocation(Document):
                 "item_code": item_code,
                 "branch": branch,
                 "sales_order": sales_order,
+                **params,
             },
             as_dict=True,
         )
 
-        # Populate the child table
-        self.details.clear()
-        for so in sales_orders:
-            qa = max(flt(so["qty_allocated"]), 0)  # clamp once (can be negative in SQL)
-            qr = flt(so["qty_remaining"])
-            q_to_alloc = max(qr - qa, 0)
 
-            self.append(
-                "details",
-                {
-                    "sales_order": so["sales_order"],
-                    "date": so["date"],
-                    "item_code": so["item_code"],
-                    "warehouse": so["warehouse"],
-                    "qty_ordered": so["qty_ordered"],
-                    "qty_allocated": qa,
-                    "qty_delivered": so["qty_delivered"],
-                    "shortage": q_to_alloc,
-                    "qty_to_allocate": q_to_alloc,
-                    "so_item": so["detail_name"],
-                    "customer": so["customer"],
-                    "branch": so["branch"],
-                    "conversion_factor": so["conversion_factor"],
-                    "remaining_qty": qr,
-                },
-            )
-        self.save()
+DETAIL_FIELDS = [
+    "sales_order", "date", "item_code", "warehouse", "qty_ordered", "qty_allocated",
+    "qty_delivered", "shortage", "qty_to_allocate", "so_item", "customer", "branch",
+    "conversion_factor", "remaining_qty",
+]
+
+
+def _get_detail_values(so):
+    qa = max(flt(so["qty_allocated"]), 0)  # clamp once (can be negative in SQL)
+    qr = flt(so["qty_remaining"])
+    q_to_alloc = max(qr - qa, 0)
+
+    return {
+        "sales_order": so["sales_order"],
+        "date": so["date"],
+        "item_code": so["item_code"],
+        "warehouse": so["warehouse"],
+        "qty_ordered": flt(so["qty_ordered"]),
+        "qty_allocated": qa,
+        "qty_delivered": flt(so["qty_delivered"]),
+        "shortage": q_to_alloc,
+        "qty_to_allocate": q_to_alloc,
+        "so_item": so["detail_name"],
+        "customer": so["customer"],
+        "branch": so["branch"],
+        "conversion_factor": flt(so["conversion_factor"]),
+        "remaining_qty": qr,
+    }
 
 
 def get_reservation_by_item(sale_order, detail_name):
@@ -389,15 +500,13 @@ def get_reservation_by_item(sale_order, detail_name):
     """
     reserved_qty = frappe.db.sql(
         """
-            SELECT SUM(reserved_qty - delivered_qty)
-            FROM `tabStock Reservation Entry`
+            SELECT SUM(balance_qty)
+            FROM `tabReservation Balance`
             WHERE
-                voucher_type = %s
-                AND voucher_no = %s
-                AND voucher_detail_no = %s
-                AND docstatus = 1
+                sales_order = %s
+                AND sales_order_item = %s
         """,
-        ("Sales Order", sale_order, detail_name),
+        (sale_order, detail_name),
     )[0][0] or 0.0
 
     return reserved_qty
@@ -408,7 +517,7 @@ def process_shortages(item_code=None):
     if item_code:
         shortages = frappe.get_list(
             "Shortage",
-            filters={"docstatus": 1, "item_code": item_code},
+            filters={"docstatus": 1, "status": "Open", "item_code": item_code},
             fields=[
                 "name",
                 "item_code",
@@ -425,7 +534,7 @@ def process_shortages(item_code=None):
     else:
         shortages = frappe.get_list(
             "Shortage",
-            filters={"docstatus": 1},
+            filters={"docstatus": 1, "status": "Open"},
             fields=[
                 "name",
                 "item_code",
@@ -469,6 +578,7 @@ def process_shortages(item_code=None):
                 frappe.db.set_value("Shortage", shortage.name, "shortage", remaining_qty)
             else:
                 doc = frappe.get_doc("Shortage", shortage.name)
+                doc.flags.resolved = True
                 doc.cancel()
 
             frappe.db.set_value(
@@ -536,6 +646,18 @@ def get_warehouse_stock_map(item, warehouse_stock_map):
     return warehouse_stock_map
 
 
+def cap_warehouse_stock_map(warehouse_stock_map, limit):
+    """Copie de warehouse_stock_map dont le total ne dépasse pas limit."""
+    capped = {}
+    remaining = flt(limit, 9)
+    for warehouse, qty in warehouse_stock_map.items():
+        if remaining <= 0:
+            break
+        capped[warehouse] = min(qty, remaining)
+        remaining -= capped[warehouse]
+    return capped
+
+
 def create_stock_reservation_entries(
     sales_order: object,
     item: dict,
@@ -715,12 +837,10 @@ def get_item_totals(item_code, warehouse):
     total_allocated = (
         frappe.db.sql(
             f"""
-        SELECT COALESCE(SUM(reserved_qty - delivered_qty), 0)
-        FROM `tabStock Reservation Entry`
+        SELECT COALESCE(SUM(balance_qty), 0)
+        FROM `tabReservation Balance`
         WHERE item_code = %s
         AND warehouse IN ({placeholders})
-        AND status NOT IN ('Cancelled', 'Delivered')
-        AND docstatus = 1
     """,
             [item_code] + warehouses_list,
         )[0][0]
@@ -4,6 +4,33 @@
 # import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from erpmco.erpmco.doctype.allocation.allocation import cap_warehouse_stock_map
+
 
 class TestAllocation(FrappeTestCase):
 	pass
+
+
+class TestCapWarehouseStockMap(FrappeTestCase):
+	def test_limit_above_stock_keeps_the_map(self):
+		stock = {"WH-1": 5, "WH-2": 3}
+		self.assertEqual(cap_warehouse_stock_map(stock, 10), stock)
+
+	def test_limit_is_taken_in_warehouse_order(self):
+		self.assertEqual(cap_warehouse_stock_map({"WH-1": 5, "WH-2": 3, "WH-3": 4}, 7), {"WH-1": 5, "WH-2": 2})
+
+	def test_limit_inside_the_first_warehouse(self):
+		self.assertEqual(cap_warehouse_stock_map({"WH-1": 5, "WH-2": 3}, 2.5), {"WH-1": 2.5})
+
+	def test_no_limit_left(self):
+		self.assertEqual(cap_warehouse_stock_map({"WH-1": 5}, 0), {})
+		self.assertEqual(cap_warehouse_stock_map({"WH-1": 5}, -1), {})
+
+	def test_input_is_not_modified(self):
+		stock = {"WH-1": 5, "WH-2": 3}
+		cap_warehouse_stock_map(stock, 4)
+		self.assertEqual(stock, {"WH-1": 5, "WH-2": 3})
+
+	def test_total_never_exceeds_the_limit(self):
+		capped = cap_warehouse_stock_map({"WH-1": 0.1, "WH-2": 0.2, "WH-3": 0.3}, 0.35)
+		self.assertAlmostEqual(sum(capped.values()), 0.35, places=9)
@@ -0,0 +1,18 @@
+# Copyright (c) 2026, Kossivi Dodzi Amouzou and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class DeliveryTransporterRollup(Document):
+	pass
+
+
+def on_doctype_update():
+	# One row per day, transporter, branch and item, even with concurrent refreshes
+	frappe.db.add_unique(
+		"Delivery Transporter Rollup",
+		["posting_date", "transporter_name", "branch", "item_code"],
+		constraint_name="unique_date_transporter_branch_item",
+	)
@@ -0,0 +1,9 @@
+# Copyright (c) 2026, Kossivi Dodzi Amouzou and Contributors
+# See license.txt
+
+# import frappe
+from frappe.tests.utils import FrappeTestCase
+
+
+class TestItem360Settings(FrappeTestCase):
+	pass
@@ -0,0 +1,18 @@
+# Copyright (c) 2026, Kossivi Dodzi Amouzou and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class LeadTimeStatistic(Document):
+	pass
+
+
+def on_doctype_update():
+	# One row per company, item, supplier and branch, even with concurrent receipts
+	frappe.db.add_unique(
+		"Lead Time Statistic",
+		["company", "item_code", "supplier", "branch"],
+		constraint_name="unique_company_item_supplier_branch",
+	)
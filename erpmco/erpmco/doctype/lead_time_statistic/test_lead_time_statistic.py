@@ -0,0 +1,74 @@
+# Copyright (c) 2026, Kossivi Dodzi Amouzou and Contributors
+# See license.txt
+
+import json
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from erpmco.utils.lead_time import LEAD_TIME_WINDOW, _apply_samples, _percentile, summarize_samples
+
+
+def make_sample(pr, lead_days, pr_date, po="PO-1"):
+	return {"pr": pr, "po": po, "pr_date": pr_date, "po_date": None, "lead_days": lead_days}
+
+
+class TestLeadTimeStatistic(FrappeTestCase):
+	def test_percentile(self):
+		self.assertIsNone(_percentile([], 50))
+		self.assertEqual(_percentile([7], 90), 7)
+		self.assertEqual(_percentile([4, 1, 3, 2], 50), 2.5)
+		self.assertAlmostEqual(_percentile([10, 20, 30, 40, 50], 90), 46)
+		self.assertEqual(_percentile([10, 20, 30], 0), 10)
+		self.assertEqual(_percentile([10, 20, 30], 100), 30)
+
+	def test_summarize_samples(self):
+		samples = [
+			make_sample("PR-1", 10, "2025-01-01"),
+			make_sample("PR-3", 30, "2025-03-01"),
+			make_sample("PR-2", 20, "2025-02-01"),
+		]
+		summary = summarize_samples(samples)
+
+		self.assertEqual(summary["n"], 3)
+		self.assertEqual(summary["avg_days"], 20)
+		self.assertEqual(summary["p50_days"], 20)
+		self.assertAlmostEqual(summary["p90_days"], 28)
+		self.assertEqual([s["pr"] for s in summary["samples"]], ["PR-3", "PR-2", "PR-1"])
+
+	def test_summarize_keeps_the_most_recent(self):
+		samples = [make_sample(f"PR-{i}", i, f"2025-01-{i:02d}") for i in range(1, 11)]
+		summary = summarize_samples(samples, limit=2)
+
+		self.assertEqual(summary["n"], 2)
+		self.assertEqual(summary["avg_days"], 9.5)
+
+	def test_summarize_without_samples(self):
+		summary = summarize_samples([])
+
+		self.assertEqual(summary["n"], 0)
+		self.assertIsNone(summary["avg_days"])
+		self.assertIsNone(summary["p90_days"])
+
+	def test_apply_samples(self):
+		stat = frappe.get_doc({"doctype": "Lead Time Statistic"})
+		_apply_samples(stat, add=[make_sample("PR-1", 10, "2025-01-01"), make_sample("PR-2", 20, "2025-02-01")])
+		# A receipt folded twice counts once
+		_apply_samples(stat, add=[make_sample("PR-2", 20, "2025-02-01")])
+
+		self.assertEqual(stat.sample_count, 2)
+		self.assertEqual(stat.mean_days, 15)
+		self.assertEqual(str(stat.last_receipt_date), "2025-02-01")
+
+		_apply_samples(stat, remove_pr="PR-2")
+		self.assertEqual(stat.sample_count, 1)
+		self.assertEqual(stat.p90_days, 10)
+		self.assertEqual([s["pr"] for s in json.loads(stat.samples)], ["PR-1"])
+
+	def test_apply_samples_keeps_a_rolling_window(self):
+		stat = frappe.get_doc({"doctype": "Lead Time Statistic"})
+		samples = [make_sample(f"PR-{i}", i, f"2025-{1 + i // 28:02d}-{1 + i % 28:02d}") for i in range(LEAD_TIME_WINDOW + 5)]
+		_apply_samples(stat, add=samples)
+
+		self.assertEqual(stat.sample_count, LEAD_TIME_WINDOW)
+		self.assertNotIn("PR-0", [s["pr"] for s in json.loads(stat.samples)])
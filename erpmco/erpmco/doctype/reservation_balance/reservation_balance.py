@@ -0,0 +1,16 @@
+# Copyright (c) 2026, Kossivi Dodzi Amouzou and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class ReservationBalance(Document):
+	pass
+
+
+def on_doctype_update():
+	# One row per Sales Order Item and warehouse, even with concurrent refreshes
+	frappe.db.add_unique(
+		"Reservation Balance", ["sales_order_item", "warehouse"], constraint_name="unique_so_item_warehouse"
+	)
@@ -0,0 +1,95 @@
+# Copyright (c) 2026, Kossivi Dodzi Amouzou and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import now_datetime
+
+from erpmco.utils import reservation_balance
+
+
+def make_balance(so_item, warehouse, balance_qty):
+	row = frappe._dict({f: 0 for f in reservation_balance.BALANCE_FIELDS})
+	row.update(
+		sales_order="_Test SO",
+		sales_order_item=so_item,
+		customer="_Test Customer",
+		item_code="_Test Item",
+		warehouse=warehouse,
+		stock_uom="Nos",
+		uom="Nos",
+		conversion_factor=1,
+		reserved_qty=balance_qty,
+		balance_qty=balance_qty,
+		so_reserved_qty=balance_qty,
+		so_balance_qty=balance_qty,
+		open_entries=1,
+		first_reserved_on=now_datetime(),
+	)
+	return row
+
+
+def get_balances():
+	return {
+		(r.sales_order_item, r.warehouse): r
+		for r in frappe.get_all(
+			"Reservation Balance", fields=["name", "sales_order_item", "warehouse", "balance_qty"]
+		)
+	}
+
+
+class TestReservationBalance(FrappeTestCase):
+	def setUp(self):
+		frappe.db.delete("Reservation Balance")
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def reconcile(self, expected):
+		with (
+			patch.object(reservation_balance, "get_reservation_balance_rows", return_value=expected),
+			patch.object(frappe.db, "commit"),
+		):
+			return reservation_balance.reconcile_reservation_balances()
+
+	def test_reconcile_rewrites_drifted_items_only(self):
+		reservation_balance._insert_balances(
+			[
+				make_balance("SOI-OK", "WH-1", 10),
+				make_balance("SOI-DRIFT", "WH-1", 4),
+				make_balance("SOI-GONE", "WH-1", 2),
+			]
+		)
+		untouched = get_balances()[("SOI-OK", "WH-1")].name
+
+		fixed = self.reconcile(
+			[
+				make_balance("SOI-OK", "WH-1", 10),
+				make_balance("SOI-DRIFT", "WH-1", 6),
+				make_balance("SOI-NEW", "WH-2", 3),
+			]
+		)
+
+		balances = get_balances()
+		self.assertEqual(fixed, 3)
+		self.assertEqual(set(balances), {("SOI-OK", "WH-1"), ("SOI-DRIFT", "WH-1"), ("SOI-NEW", "WH-2")})
+		self.assertEqual(balances[("SOI-OK", "WH-1")].name, untouched)
+		self.assertEqual(balances[("SOI-DRIFT", "WH-1")].balance_qty, 6)
+		self.assertEqual(balances[("SOI-NEW", "WH-2")].balance_qty, 3)
+
+	def test_reconcile_without_drift(self):
+		reservation_balance._insert_balances([make_balance("SOI-OK", "WH-1", 10)])
+
+		self.assertEqual(self.reconcile([make_balance("SOI-OK", "WH-1", 10)]), 0)
+
+	def test_drift_in_one_warehouse_rewrites_the_so_item(self):
+		reservation_balance._insert_balances([make_balance("SOI-1", "WH-1", 5), make_balance("SOI-1", "WH-2", 5)])
+
+		fixed = self.reconcile([make_balance("SOI-1", "WH-1", 5), make_balance("SOI-1", "WH-2", 1)])
+
+		balances = get_balances()
+		self.assertEqual(fixed, 1)
+		self.assertEqual(balances[("SOI-1", "WH-1")].balance_qty, 5)
+		self.assertEqual(balances[("SOI-1", "WH-2")].balance_qty, 1)
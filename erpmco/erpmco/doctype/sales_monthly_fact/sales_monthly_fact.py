@@ -0,0 +1,16 @@
+# Copyright (c) 2026, Kossivi Dodzi Amouzou and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class SalesMonthlyFact(Document):
+	pass
+
+
+def on_doctype_update():
+	# One row per month, branch and item, even with concurrent refreshes
+	frappe.db.add_unique(
+		"Sales Monthly Fact", ["month", "branch", "item_code"], constraint_name="unique_month_branch_item"
+	)
@@ -0,0 +1,80 @@
+# Copyright (c) 2026, Kossivi Dodzi Amouzou and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from erpmco.utils import sales_fact
+
+BRANCH = "_Test Fact Branch"
+
+
+def make_fact(item_code, qty, month="2025-01"):
+	row = {f: 0 for f in sales_fact.FACT_FIELDS}
+	row.update({"month": month, "branch": BRANCH, "item_code": item_code, "item_name": item_code, "uom": "CT", "qty": qty})
+	return frappe._dict(row)
+
+
+def get_facts(month="2025-01"):
+	return {
+		r.item_code: r.qty
+		for r in frappe.get_all(
+			"Sales Monthly Fact", filters={"month": month, "branch": BRANCH}, fields=["item_code", "qty"]
+		)
+	}
+
+
+class TestSalesMonthlyFact(FrappeTestCase):
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_invoice_queues_one_refresh_per_month_and_branch(self):
+		invoice = frappe._dict(
+			posting_date="2025-01-15",
+			branch=BRANCH,
+			items=[frappe._dict(item_code="A"), frappe._dict(item_code="B")],
+		)
+		with patch("frappe.enqueue") as enqueue:
+			sales_fact.on_sales_invoice_change(invoice, "on_submit")
+
+		enqueue.assert_called_once()
+		kwargs = enqueue.call_args.kwargs
+		self.assertEqual(kwargs["job_id"], f"sales_fact::2025-01::{BRANCH}")
+		self.assertTrue(kwargs["deduplicate"])
+		self.assertTrue(kwargs["enqueue_after_commit"])
+		self.assertEqual((kwargs["month"], kwargs["branch"]), ("2025-01", BRANCH))
+
+	def test_invoice_without_branch_is_skipped(self):
+		invoice = frappe._dict(posting_date="2025-01-15", branch=None, items=[frappe._dict(item_code="A")])
+		with patch("frappe.enqueue") as enqueue:
+			sales_fact.on_sales_invoice_change(invoice, "on_submit")
+
+		enqueue.assert_not_called()
+
+	def test_refresh_replaces_the_month_and_branch(self):
+		sales_fact._insert_facts([make_fact("A", 1), make_fact("OLD", 1), make_fact("A", 9, month="2025-02")])
+
+		with (
+			patch.object(sales_fact, "get_sales_fact_rows", return_value=[make_fact("A", 5), make_fact("B", 2)]),
+			patch.object(sales_fact, "invalidate_cached_results") as invalidate,
+		):
+			sales_fact.refresh_sales_facts("2025-01", BRANCH)
+
+		self.assertEqual(get_facts(), {"A": 5, "B": 2})
+		# Other months are left alone
+		self.assertEqual(get_facts("2025-02"), {"A": 9})
+		invalidate.assert_called_once()
+
+	def test_refresh_of_some_items(self):
+		sales_fact._insert_facts([make_fact("A", 1), make_fact("B", 1)])
+
+		with (
+			patch.object(sales_fact, "get_sales_fact_rows", return_value=[make_fact("A", 3)]) as get_rows,
+			patch.object(sales_fact, "invalidate_cached_results"),
+		):
+			sales_fact.refresh_sales_facts("2025-01", BRANCH, item_codes={"A"})
+
+		self.assertEqual(get_rows.call_args.kwargs["item_codes"], ["A"])
+		self.assertEqual(get_facts(), {"A": 3, "B": 1})
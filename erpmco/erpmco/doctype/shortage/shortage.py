@@ -1,9 +1,49 @@
 # Copyright (c) 2024, Kossivi Dodzi Amouzou and contributors
 # For license information, please see license.txt
 
-# import frappe
+from functools import partial
+
+import frappe
 from frappe.model.document import Document
 
+# Items with at least one Open shortage, checked on every incoming Stock Ledger Entry
+OPEN_SHORTAGE_ITEMS_KEY = "erpmco:open_shortage_items"
+# Set once the set above was loaded; an empty Redis set cannot be told from a missing one
+OPEN_SHORTAGE_ITEMS_LOADED_KEY = "erpmco:open_shortage_items_loaded"
+
 
 class Shortage(Document):
-	pass
+	def on_submit(self):
+		self.db_set("status", "Open")
+		update_open_shortage_items(self.item_code)
+
+	def on_cancel(self):
+		# process_shortages cancels the shortages it covered
+		self.db_set("status", "Resolved" if self.flags.resolved else "Cancelled")
+		# Drop the item only once committed, so a rollback never hides an open shortage
+		frappe.db.after_commit.add(partial(update_open_shortage_items, self.item_code))
+
+
+def has_open_shortage(item_code):
+	if not frappe.cache().get_value(OPEN_SHORTAGE_ITEMS_LOADED_KEY):
+		rebuild_open_shortage_items()
+	return frappe.cache().sismember(OPEN_SHORTAGE_ITEMS_KEY, item_code)
+
+
+def update_open_shortage_items(item_code):
+	if not frappe.cache().get_value(OPEN_SHORTAGE_ITEMS_LOADED_KEY):
+		rebuild_open_shortage_items()
+	elif frappe.db.exists("Shortage", {"docstatus": 1, "status": "Open", "item_code": item_code}):
+		frappe.cache().sadd(OPEN_SHORTAGE_ITEMS_KEY, item_code)
+	else:
+		frappe.cache().srem(OPEN_SHORTAGE_ITEMS_KEY, item_code)
+
+
+def rebuild_open_shortage_items():
+	item_codes = frappe.get_all(
+		"Shortage", filters={"docstatus": 1, "status": "Open"}, pluck="item_code", distinct=True
+	)
+	frappe.cache().delete_value(OPEN_SHORTAGE_ITEMS_KEY)
+	if item_codes:
+		frappe.cache().sadd(OPEN_SHORTAGE_ITEMS_KEY, *item_codes)
+	frappe.cache().set_value(OPEN_SHORTAGE_ITEMS_LOADED_KEY, 1)
@@ -0,0 +1,8 @@
+// Copyright (c) 2026, Kossivi Dodzi Amouzou and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("Standard Cost Snapshot", {
+// 	refresh(frm) {
+
+// 	},
+// });
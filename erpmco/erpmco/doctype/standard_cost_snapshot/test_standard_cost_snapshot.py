@@ -0,0 +1,90 @@
+# Copyright (c) 2026, Kossivi Dodzi Amouzou and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import getdate
+
+from erpmco.utils import standard_cost
+
+ITEM = "_Test Standard Cost Item"
+
+
+def make_cost(std_cogs, routing="_Test Routing"):
+	row = frappe._dict({f: 0 for f in standard_cost.COST_FIELDS})
+	row.update(production_item=ITEM, routing=routing, bom="_Test BOM", std_cogs=std_cogs)
+	return row
+
+
+def rebuild(on_date, costs):
+	with (
+		patch.object(standard_cost, "nowdate", return_value=on_date),
+		patch.object(standard_cost, "get_standard_costs", return_value=costs),
+		patch.object(frappe.db, "commit"),
+	):
+		standard_cost.rebuild_standard_cost_snapshots()
+
+
+def get_snapshots():
+	return frappe.get_all(
+		"Standard Cost Snapshot",
+		filters={"production_item": ITEM},
+		fields=["valid_from", "valid_to", "is_current", "std_cogs"],
+		order_by="valid_from",
+	)
+
+
+class TestStandardCostSnapshot(FrappeTestCase):
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_first_snapshot_covers_the_past(self):
+		rebuild("2025-03-10", [make_cost(100)])
+
+		(snapshot,) = get_snapshots()
+		self.assertEqual(getdate(snapshot.valid_from), getdate(standard_cost.SEED_VALID_FROM))
+		self.assertIsNone(snapshot.valid_to)
+		self.assertTrue(snapshot.is_current)
+
+	def test_unchanged_cost_keeps_its_snapshot(self):
+		rebuild("2025-03-10", [make_cost(100)])
+		rebuild("2025-03-11", [make_cost(100)])
+
+		self.assertEqual(len(get_snapshots()), 1)
+
+	def test_changed_cost_closes_the_previous_snapshot(self):
+		rebuild("2025-03-10", [make_cost(100)])
+		rebuild("2025-04-01", [make_cost(120)])
+
+		old, new = get_snapshots()
+		self.assertEqual(getdate(old.valid_to), getdate("2025-03-31"))
+		self.assertFalse(old.is_current)
+		self.assertEqual(getdate(new.valid_from), getdate("2025-04-01"))
+		self.assertTrue(new.is_current)
+		self.assertEqual(new.std_cogs, 120)
+
+	def test_second_change_on_the_same_day_replaces_the_snapshot(self):
+		rebuild("2025-03-10", [make_cost(100)])
+		rebuild("2025-04-01", [make_cost(120)])
+		rebuild("2025-04-01", [make_cost(130)])
+
+		old, new = get_snapshots()
+		self.assertEqual(old.std_cogs, 100)
+		self.assertEqual(new.std_cogs, 130)
+		self.assertEqual(getdate(new.valid_from), getdate("2025-04-01"))
+
+	def test_routing_change_opens_a_snapshot(self):
+		rebuild("2025-03-10", [make_cost(100)])
+		rebuild("2025-04-01", [make_cost(100, routing="_Test Routing 2")])
+
+		self.assertEqual(len(get_snapshots()), 2)
+
+	def test_item_without_cost_is_closed(self):
+		rebuild("2025-03-10", [make_cost(100)])
+		rebuild("2025-04-01", [])
+
+		(snapshot,) = get_snapshots()
+		self.assertFalse(snapshot.is_current)
+		self.assertEqual(getdate(snapshot.valid_to), getdate("2025-03-31"))
@@ -47,5 +47,41 @@ frappe.query_reports["Consolidated Monthly Sales Analysis"] = {
             fieldtype: "Float",
             default: 6
         }
-    ]
+    ],
+
+    onload(report) {
+        report.page.add_inner_button(__("Export in Background"), () => {
+            const d = new frappe.ui.Dialog({
+                title: __("Export Consolidated Monthly Sales Analysis"),
+                fields: [
+                    {
+                        fieldname: "file_format",
+                        label: __("Format"),
+                        fieldtype: "Select",
+                        options: ["csv", "xlsx", "parquet"],
+                        default: "xlsx",
+                        reqd: 1
+                    }
+                ],
+                primary_action_label: __("Export"),
+                primary_action(values) {
+                    frappe.call({
+                        method: "erpmco.erpmco.report.consolidated_monthly_sales_analysis.consolidated_monthly_sales_analysis.export_report",
+                        args: {
+                            filters: report.get_values(),
+                            file_format: values.file_format
+                        },
+                        callback() {
+                            frappe.show_alert({
+                                message: __("Export queued. You will be notified when the file is ready."),
+                                indicator: "blue"
+                            });
+                        }
+                    });
+                    d.hide();
+                }
+            });
+            d.show();
+        });
+    }
 };
@@ -1,12 +1,27 @@
 # Copyright (c) 2025, Kossivi Dodzi Amouzou and contributors
 # For license information, please see license.txt
 
+import csv
+import importlib.util
+from functools import partial
+
 import frappe
 from frappe import _
+from frappe.utils import add_months, get_first_day, getdate
 import pandas as pd
 import numpy as np
 from copy import deepcopy
 
+from erpmco.utils.report_cache import cached_report, clear_report_cache
+
+
+
+REPORT_NAME = "Consolidated Monthly Sales Analysis"
+RESULT_CACHE_TTL = 24 * 3600
+# Prepared Reports of this report by month of their period: PREPARED_REPORTS_KEY + "2025-01"
+PREPARED_REPORTS_KEY = "erpmco:cmsa_prepared_reports:"
+# Set once the index above was loaded from existing Prepared Reports
+PREPARED_REPORTS_LOADED_KEY = "erpmco:cmsa_prepared_reports_loaded"
 
 
 def execute(filters=None):
@@ -16,6 +31,59 @@ def execute(filters=None):
 	return columns, data
 
 
+def invalidate_cached_results(from_date, to_date=None):
+	"""
+	Drops cached results and prepared reports whose period overlaps [from_date, to_date]
+	once the current transaction commits, so a rolled back refresh keeps them.
+	Called whenever the sales facts of that period are refreshed.
+	"""
+	frappe.db.after_commit.add(partial(_invalidate_cached_results, getdate(from_date), getdate(to_date or from_date)))
+
+
+def _invalidate_cached_results(from_date, to_date):
+	clear_report_cache(REPORT_NAME, from_date=from_date, to_date=to_date)
+
+	if not frappe.cache().get_value(PREPARED_REPORTS_LOADED_KEY):
+		rebuild_prepared_report_index()
+
+	for month in _months(from_date, to_date):
+		key = PREPARED_REPORTS_KEY + month
+		for name in frappe.cache().smembers(key) or ():
+			name = frappe.safe_decode(name)
+			if frappe.db.exists("Prepared Report", name):
+				frappe.delete_doc("Prepared Report", name, ignore_permissions=True, delete_permanently=True)
+		frappe.cache().delete_value(key)
+
+
+def register_prepared_report(doc, method=None):
+	"""Prepared Report after_insert: index it under each month of its period."""
+	if doc.report_name == REPORT_NAME:
+		_index_prepared_report(doc.name, doc.filters)
+
+
+def rebuild_prepared_report_index():
+	for prepared in frappe.get_all(
+		"Prepared Report", filters={"report_name": REPORT_NAME}, fields=["name", "filters"]
+	):
+		_index_prepared_report(prepared.name, prepared.filters)
+	frappe.cache().set_value(PREPARED_REPORTS_LOADED_KEY, 1)
+
+
+def _index_prepared_report(name, filters):
+	filters = frappe.parse_json(filters or "{}")
+	if not filters.get("from_date") or not filters.get("to_date"):
+		return
+	for month in _months(filters["from_date"], filters["to_date"]):
+		frappe.cache().sadd(PREPARED_REPORTS_KEY + month, name)
+
+
+def _months(from_date, to_date):
+	month_start, to_date = get_first_day(from_date), getdate(to_date)
+	while month_start <= to_date:
+		yield month_start.strftime("%Y-%m")
+		month_start = add_months(month_start, 1)
+
+
 def get_columns(filters, mois):
 	columns = []
 
@@ -88,228 +156,445 @@ def get_columns(filters, mois):
 
 
 
+LITERAL_COLS = ["branch", "category", "sub_category", "group", "item_code", "item_name", "uom", "conversion_factor", "production_item", "rn", "price_list"]
+RATE_FIELDS = ("inv_disc_rate", "csh_disc_rate", "bonus_rate", "royalty_rate")
+# Flags returned by the query and consumed by apply_rates
+RATE_FLAGS = ["is_cosmetic", "has_dda", "is_band"]
+BASE_MEASURES = [
+	"conversion_factor", "qty", "stock_qty", "net_amount", "gross_amount", "tva", "fpi", "dda",
+	"price_list_rate", "cogs_rate_t", "free_qty", "cogs_free_qty_t", "total_tax",
+	"raw_material_cost", "scrap_material_credit", "total_cost", "factory_overhead", "other_overhead",
+	"labour", "depreciation", "std_cogs",
+] + RATE_FLAGS
+RATE_DEPENDENT_COLS = [
+	"inv_disc", "royalty", "cash_disc", "bonus", "std_tva", "std_dda", "std_fpi",
+	"std_net_sales_with_tax_ct", "std_net_sales_with_tax_t", "std_net_sales_ct", "std_net_sales_t",
+	"gp", "gp_percent",
+]
+WHAT_IF_KEYS = ["branch", "item_code", "item_name"]
+
+
 def get_data(filters=None):
-	if not filters:
-		filters = {}
+	filters = frappe._dict(filters or {})
+	months, params = get_query_params(filters)
+	if not months:
+		return [], months
+
+	rows = get_base_rows(filters, months, params)
+	if not rows:
+		return [], months
+
+	df = apply_rates(pd.DataFrame([dict(r) for r in rows]), get_rates(filters))
+	consolidated_df = pivot_months(df)
+	return consolidated_df.fillna(0).to_dict(orient='records'), months
+
+
+@cached_report(
+	REPORT_NAME,
+	doctypes=["Sales Invoice", "Delivery Note"],
+	key_filters=["from_date", "to_date", "branch"],
+	ttl=RESULT_CACHE_TTL,
+)
+def get_base_rows(filters, months, params):
+	"""
+	Rate-independent rows (one per item, branch and month), cached per period and
+	branch: discount/bonus/royalty rates are applied on top (see apply_rates).
+	"""
+	# One query for the whole period. Sales and COGS come pre-aggregated from
+	# Sales Monthly Fact (see erpmco.utils.sales_fact), routing and taxes are computed once.
+	return frappe.db.sql(get_query(months), params, as_dict=True)
+
 
+def get_query_params(filters):
 	from_date = filters.get("from_date")
 	to_date = filters.get("to_date")
 	branch = (filters.get("branch") or "") + "%"
 
-	inv_disc_rate = float(filters.get("inv_disc_rate") or 0) / 100
-	csh_disc_rate = float(filters.get("csh_disc_rate") or 0) / 100
-	bonus_rate = float(filters.get("bonus_rate") or 0) / 100
-	royalty_rate = float(filters.get("royalty_rate") or 0) / 100
-
 	# Define the months in the period
 	months = pd.date_range(from_date, to_date, freq='MS').strftime('%Y-%m').tolist()
-
-	# Initialize an empty list to hold the monthly dataframes
-	monthly_dfs = []
-
-	# Loop through each month in the period
-	for month in months:
-		# Get the start and end of the month
-		month_start = f"{month}-01"
-		month_end = pd.to_datetime(month_start) + pd.offsets.MonthEnd(1)
-
-		# Execute the query for each month
-		query = f"""
-			WITH sales AS (
-				SELECT
-					sii.item_code,  
-					sii.item_name,  
-					si.branch,
-					MAX(sii.uom) AS uom,
-					MAX(ucd.conversion_factor) AS conversion_factor,
-					SUM(sii.qty) AS qty,  
-					SUM(CASE WHEN sii.stock_uom = 'T' THEN sii.stock_qty ELSE 0 END) AS stock_qty,
-					SUM(sii.net_amount) AS net_amount,  
-					SUM(sii.amount) AS gross_amount,
-					SUM(
-						(JSON_UNQUOTE(JSON_EXTRACT(sii.item_tax_rate, '$."44310000 - T.V.A. Charged On Sales - MCO"')) / 100) 
-						* sii.net_amount
-					) AS tva, 
-					SUM(
-						(JSON_UNQUOTE(JSON_EXTRACT(sii.item_tax_rate, '$."44210300 - Taxes - FPI on Sales - MCO"')) / 100) 
-						* sii.net_amount
-					) AS fpi,
-					SUM(
-						(JSON_UNQUOTE(JSON_EXTRACT(sii.item_tax_rate, '$."44350000 - Droit de Acciss on Sales - MCO"')) / 100) 
-						* sii.net_amount
-					) AS dda
-				FROM `tabSales Invoice` si
-				INNER JOIN `tabSales Invoice Item` sii ON si.name = sii.parent 
-				INNER JOIN `tabUOM Conversion Detail` ucd ON ucd.parent = sii.item_code AND ucd.uom = sii.uom
-				WHERE
-					si.docstatus = 1  
-					AND si.posting_date BETWEEN %(from_date)s AND %(to_date)s  
-					AND si.branch LIKE %(branch)s
-				GROUP BY sii.item_code, sii.item_name, si.branch
-			),
-			ranked_routing AS (
-				SELECT r.production_item, b.raw_material_cost, 
-					(b.scrap_material_cost * -1) AS scrap_material_credit, 
-					b.total_cost,
-					(w.hour_rate_electricity * o.time_in_mins / 60) AS factory_overhead, 
-					(w.hour_rate_consumable * o.time_in_mins / 60) AS other_overhead, 
-					(w.hour_rate_labour * o.time_in_mins / 60) AS labour,
-					(w.hour_rate_rent * o.time_in_mins / 60) AS depreciation,
-					b.total_cost + ((w.hour_rate_electricity + w.hour_rate_consumable + w.hour_rate_labour + w.hour_rate_rent) * o.time_in_mins / 60) AS std_cogs,
-					ROW_NUMBER() OVER (PARTITION BY r.production_item ORDER BY r.name) AS rn
-				FROM `tabRouting` r 
-				INNER JOIN `tabBOM Operation` o ON o.parent = r.name 
-				INNER JOIN `tabWorkstation` w ON w.name = o.workstation
-				INNER JOIN `tabBOM` b ON b.item = r.production_item
-				WHERE b.docstatus = 1 AND b.is_active = 1 AND b.is_default = 1
-			),
-			cogs AS(
-				SELECT t.branch, t.item_code, SUM(t.cogs) / SUM(t.stock_qty) AS cogs_rate_t, SUM(free_qty) AS free_qty, SUM(cogs_free_qty) / SUM(t.free_qty) AS cogs_free_qty_t
-				FROM(
-					SELECT si.branch, si.name, si.posting_date, si.customer, si.customer_name, dni.item_code, dni.item_name, dni.qty, 
-						CASE WHEN dni.stock_uom = 'T' THEN dni.stock_qty ELSE 0 END as stock_qty,
-						dni.stock_qty* dni.incoming_rate AS cogs, dni.parent, dni.against_sales_order,
-						CASE WHEN dni.is_free_item = 1 THEN dni.stock_qty ELSE 0 END AS free_qty,
-						CASE WHEN dni.is_free_item = 1 THEN dni.stock_qty* dni.incoming_rate ELSE 0 END AS cogs_free_qty
-					FROM `tabDelivery Note Item` dni INNER JOIN    
-						`tabSales Invoice Item` sii on dni.parent = sii.delivery_note and dni.item_code = sii.item_code
-					LEFT JOIN `tabSales Invoice` si ON si.name = sii.parent 
-					WHERE si.docstatus = 1 AND si.posting_date BETWEEN %(from_date)s AND %(to_date)s AND si.branch LIKE %(branch)s
-					GROUP BY si.branch, si.name, si.posting_date, si.customer, si.customer_name, dni.item_code, dni.item_name, 
-						dni.qty, dni.stock_qty, dni.amount, dni.parent, dni.against_sales_order
-					ORDER BY si.posting_date, si.name
-				) AS t
-				GROUP BY t.branch, t.item_code
-			),
-			taxes AS(
-				SELECT v.*, 
-					(v.tva_1 + (1 - v.tva_1) * v.dda_1  + (1 - v.tva_1) * (1 - v.dda_1) * v.fpi_1) * 100 AS total_tax
-				FROM (
-					SELECT t.item_code, t.tax_category, MAX(t.tva) / 100 AS tva_1, MAX(t.dda) / 100 AS dda_1, MAX(t.fpi) / 100 AS fpi_1
-					FROM (
-						SELECT
-							it.parent AS item_code, it.tax_category,
-							CASE WHEN itd.tax_type LIKE '44310000%%' THEN itd.tax_rate ELSE 0 END AS tva,
-							CASE WHEN itd.tax_type LIKE '44350000%%' THEN itd.tax_rate ELSE 0 END AS dda,
-							CASE WHEN itd.tax_type LIKE '44210300%%' THEN itd.tax_rate ELSE 0 END AS fpi
-						FROM `tabItem` i JOIN `tabItem Tax` it ON it.parent = i.name
-							JOIN `tabItem Tax Template` itt  ON it.item_tax_template = itt.name
-							JOIN `tabItem Tax Template Detail` itd ON itd.parent = itt.name
-						WHERE i.item_group   = 'FG' AND i.disabled  = 0 AND itt.disabled = 0
-					) AS t
-					GROUP BY t.item_code, t.tax_category
-				) AS v
-			),
-			price_weights AS (
-				SELECT sub.item_code, sub.price_list, 
-					SUM(sub.price_list_rate * sub.days_in_period) / SUM(sub.days_in_period)  AS price_list_rate
-				FROM (
-				SELECT ip.item_code, ip.price_list, ip.price_list_rate,
-					DATEDIFF(
-					LEAST(COALESCE(ip.valid_upto,   %(to_date)s), %(to_date)s),
-					GREATEST(ip.valid_from,         %(from_date)s)
-					) + 1                                 AS days_in_period
-				FROM `tabItem Price` ip
-				WHERE ip.valid_from <= %(to_date)s AND (ip.valid_upto IS NULL OR ip.valid_upto >= %(from_date)s)
-					AND LOWER(ip.price_list) LIKE CASE
-					WHEN %(branch)s IS NOT NULL THEN
-						CONCAT(LOWER(%(branch)s), ' gross', '%%')
-					ELSE
-						'%% gross%%'
-					END
-				) AS sub
-				GROUP BY sub.item_code, sub.price_list
+	if not months:
+		return months, {}
+
+	params = {
+		"from_month": months[0],
+		"to_month": months[-1],
+		"branch": branch,
+	}
+	params.update(get_month_params(months))
+	return months, params
+
+
+def get_rates(filters):
+	return frappe._dict({rate: float(filters.get(rate) or 0) / 100 for rate in RATE_FIELDS})
+
+
+def apply_rates(df, rates):
+	"""
+	Standard discount, royalty, bonus, tax and GP columns computed from the base
+	measures, vectorized over all rows. Returns a new DataFrame.
+	"""
+	df = df.copy()
+	for col in BASE_MEASURES:
+		df[col] = pd.to_numeric(df[col], errors="coerce")
+
+	plr = df["price_list_rate"]
+	weight = df["conversion_factor"]
+	after_inv_disc = plr * (1 - rates.inv_disc_rate)
+	dda_rate = np.where(df["is_cosmetic"] == 1, 0.15, 0.10) * df["has_dda"]
+	royalty_rate = np.where(df["is_band"] == 1, rates.royalty_rate, 0)
+
+	df["weight_in_ct"] = weight
+	df["std_gross_rate"] = plr / weight
+	df["inv_disc"] = plr * rates.inv_disc_rate
+	df["std_tva"] = after_inv_disc * 0.16
+	df["std_dda"] = after_inv_disc * dda_rate
+	df["std_fpi"] = after_inv_disc * 0.0167
+	df["royalty"] = after_inv_disc * 0.84 * (1 - dda_rate) * 0.9833 * royalty_rate
+	df["cash_disc"] = after_inv_disc * (1 - royalty_rate) * rates.csh_disc_rate
+	df["bonus"] = after_inv_disc * (1 - royalty_rate) * (1 - rates.csh_disc_rate) * rates.bonus_rate
+	df["actual_buying"] = df["cogs_rate_t"] * df["stock_qty"]
+
+	df["std_net_sales_with_tax_ct"] = plr - df["inv_disc"] - df["cash_disc"] - df["bonus"] - df["royalty"]
+	df["actual_gp"] = df["net_amount"] - df["actual_buying"]
+	df["std_net_sales_ct"] = df["std_net_sales_with_tax_ct"] - df["std_tva"] - df["std_dda"] - df["std_fpi"]
+	for col in ("inv_disc", "cash_disc", "bonus", "std_tva", "std_dda", "std_fpi", "royalty"):
+		df[f"{col}_t"] = df[col] / weight
+
+	df["std_net_sales_t"] = df["std_net_sales_ct"] / weight
+	df["std_net_sales_with_tax_t"] = df["std_net_sales_with_tax_ct"] / weight
+	df["gp"] = df["std_net_sales_t"] - df["std_cogs"]
+	df["actual_cost_ct"] = df["gross_amount"] / df["qty"]
+	df["actual_cost_t"] = df["gross_amount"] / df["stock_qty"]
+	df["gp_percent"] = np.where(df["std_net_sales_t"] != 0, 100 * (1 - df["std_cogs"] / df["std_net_sales_t"]), 0)
+	df["actual_gp_percent"] = df["actual_gp"] / df["net_amount"] * 100
+	df["actual_cogs_t"] = df["actual_buying"] / df["stock_qty"]
+	df["conv_cost_t"] = df["factory_overhead"] + df["other_overhead"] + df["labour"] + df["depreciation"]
+
+	# Division by zero gives NULL in SQL, keep the same blanks here
+	return df.replace([np.inf, -np.inf], np.nan).drop(columns=RATE_FLAGS)
+
+
+@frappe.whitelist()
+def get_what_if(filters, rate_sets):
+	"""
+	Recomputes the rate-dependent columns for several rate sets (same keys as the
+	report filters, in %) from a single fetch of the base rows.
+	"""
+	check_report_permission()
+	filters = frappe._dict(frappe.parse_json(filters) or {})
+	rate_sets = frappe.parse_json(rate_sets) or []
+
+	months, params = get_query_params(filters)
+	rows = get_base_rows(filters, months, params) if months else []
+	base = pd.DataFrame([dict(r) for r in rows])
+
+	scenarios = []
+	for rate_set in rate_sets:
+		rates = get_rates({**filters, **rate_set})
+		data = []
+		if not base.empty:
+			df = apply_rates(base, rates)
+			keep = [col for col in df.columns if col in LITERAL_COLS or col == "month" or col in RATE_DEPENDENT_COLS]
+			wide = pivot_months(df[keep])
+			data = wide.drop(columns=[c for c in LITERAL_COLS if c not in WHAT_IF_KEYS]).fillna(0).to_dict(orient="records")
+		scenarios.append({"rates": {rate: rates[rate] * 100 for rate in RATE_FIELDS}, "data": data})
+
+	return {
+		"months": months,
+		"columns": [f"{col}_{month}" for col in RATE_DEPENDENT_COLS for month in months],
+		"scenarios": scenarios,
+	}
+
+
+def get_month_params(months):
+	params = {}
+	for i, month in enumerate(months):
+		params[f"month_{i}"] = month
+		params[f"month_start_{i}"] = f"{month}-01"
+		params[f"month_end_{i}"] = (pd.to_datetime(f"{month}-01") + pd.offsets.MonthEnd(1)).strftime("%Y-%m-%d")
+	return params
+
+
+def get_months_cte(months):
+	"""Derived table with one row per month of the period (month, month_start, month_end)."""
+	rows = []
+	for i in range(len(months)):
+		if i == 0:
+			rows.append(
+				f"SELECT CAST(%(month_{i})s AS CHAR(7)) AS month, CAST(%(month_start_{i})s AS DATE) AS month_start, "
+				f"CAST(%(month_end_{i})s AS DATE) AS month_end"
 			)
-			SELECT DISTINCT v.*, v.std_net_sales_ct / weight_in_ct AS std_net_sales_t, v.std_net_sales_with_tax_ct / weight_in_ct AS std_net_sales_with_tax_t,
-				(v.std_net_sales_ct / weight_in_ct) - v.std_cogs AS gp, gross_amount / qty AS actual_cost_ct, gross_amount / stock_qty AS actual_cost_t,
-				CASE WHEN (v.std_net_sales_ct / weight_in_ct) <> 0 THEN 100 * (1 - v.std_cogs / (v.std_net_sales_ct / weight_in_ct)) ELSE 0 END AS gp_percent,
-				v.actual_gp / v.net_amount * 100 AS actual_gp_percent, v.actual_buying / v.stock_qty AS actual_cogs_t, 
-				v.factory_overhead + v.other_overhead + v.labour + v.depreciation AS conv_cost_t
-			FROM(
-			SELECT t.*, t.price_list_rate - t.inv_disc - t.cash_disc - t.bonus - t.royalty AS std_net_sales_with_tax_ct, 
-				t.net_amount - t.actual_buying AS actual_gp,
-				(t.price_list_rate - t.inv_disc - t.cash_disc - t.bonus - t.royalty - std_tva - std_dda - std_fpi)  AS std_net_sales_ct,
-				inv_disc / weight_in_ct AS inv_disc_t, cash_disc / weight_in_ct AS cash_disc_t, bonus / weight_in_ct AS bonus_t,
-				std_tva / weight_in_ct AS std_tva_t, std_dda / weight_in_ct AS std_dda_t, std_fpi / weight_in_ct AS std_fpi_t, royalty / weight_in_ct AS royalty_t
+		else:
+			rows.append(f"SELECT %(month_{i})s, %(month_start_{i})s, %(month_end_{i})s")
+	return "\n\t\t\t\tUNION ALL ".join(rows)
+
+
+def pivot_months(df):
+	"""Long (one row per item and month) -> wide (`<column>_<YYYY-MM>` per month) in a single unstack."""
+	df['group'] = df['category'] + " - " + df['sub_category']
+	numeric_cols = [col for col in df.columns if col not in LITERAL_COLS + ["month"]]
+
+	for col in LITERAL_COLS:
+		if df[col].dtype == object:
+			df[col] = df[col].fillna("")
+
+	# Rows sharing all literal keys in the same month stay on separate lines
+	df["_seq"] = df.groupby(LITERAL_COLS + ["month"], dropna=False).cumcount()
+
+	wide = df.set_index(LITERAL_COLS + ["_seq", "month"])[numeric_cols].unstack("month")
+	wide.columns = [f"{col}_{month}" for col, month in wide.columns]
+	return wide.reset_index().drop(columns="_seq")
+
+
+EXPORT_FORMATS = ("csv", "xlsx", "parquet")
+EXPORT_CHUNK_ROWS = 20000
+STRING_LITERAL_COLS = [col for col in LITERAL_COLS if col not in ("conversion_factor", "rn")]
+
+
+def check_report_permission():
+	"""Whitelisted entry points outside the report view: same access as opening the report."""
+	if not frappe.get_cached_doc("Report", REPORT_NAME).is_permitted():
+		frappe.throw(_("Not permitted to access {0}").format(REPORT_NAME), frappe.PermissionError)
+	frappe.has_permission("Sales Invoice", "read", throw=True)
+
+
+@frappe.whitelist()
+def export_report(filters, file_format="csv"):
+	"""Queues a streaming export of the report; the file is attached to a File record when done."""
+	check_report_permission()
+	filters = frappe._dict(frappe.parse_json(filters) or {})
+	if file_format not in EXPORT_FORMATS:
+		frappe.throw(_("Unsupported export format: {0}").format(file_format))
+	if file_format == "parquet" and not importlib.util.find_spec("pyarrow"):
+		frappe.throw(_("Parquet export requires the pyarrow package"))
+
+	frappe.enqueue(
+		"erpmco.erpmco.report.consolidated_monthly_sales_analysis.consolidated_monthly_sales_analysis.run_export",
+		queue="long",
+		timeout=3600,
+		filters=filters,
+		file_format=file_format,
+		user=frappe.session.user,
+	)
+	return {"queued": True}
+
+
+def run_export(filters, file_format, user):
+	filters = frappe._dict(filters)
+	months, params = get_query_params(filters)
+	columns = get_columns(filters, months)
+	fieldnames = [c["fieldname"] for c in columns]
+
+	file_name = f"consolidated_monthly_sales_{filters.get('from_date')}_{filters.get('to_date')}_{frappe.generate_hash(length=6)}.{file_format}"
+	writer = EXPORT_WRITERS[file_format](frappe.get_site_path("private", "files", file_name), columns)
+	try:
+		if months:
+			for chunk in iter_wide_chunks(months, params, fieldnames, get_rates(filters)):
+				writer.write(chunk)
+	finally:
+		writer.close()
+
+	file_doc = frappe.get_doc({
+		"doctype": "File",
+		"file_name": file_name,
+		"file_url": f"/private/files/{file_name}",
+		"is_private": 1,
+	}).insert(ignore_permissions=True)
+	frappe.db.commit()
+
+	frappe.publish_realtime(
+		"msgprint",
+		_("Consolidated Monthly Sales Analysis export is ready: {0}").format(
+			f"<a href='{file_doc.file_url}' target='_blank'>{file_name}</a>"
+		),
+		user=user,
+	)
+
+
+def iter_wide_chunks(months, params, fieldnames, rates):
+	"""
+	Streams the query through an unbuffered cursor ordered by branch and item,
+	pivoting about EXPORT_CHUNK_ROWS long rows at a time. A chunk is only cut
+	between items so all months of an item end up on the same wide row.
+	"""
+	query = get_query(months) + "\n\tORDER BY v.branch, v.item_code"
+	numeric_cols = sorted({f.rsplit("_", 1)[0] for f in fieldnames if f not in LITERAL_COLS})
+
+	buffer, last_key = [], None
+	with frappe.db.unbuffered_cursor():
+		for row in frappe.db.sql(query, params, as_dict=True, as_iterator=True):
+			key = (row.branch, row.item_code)
+			if len(buffer) >= EXPORT_CHUNK_ROWS and key != last_key:
+				yield compact_wide_chunk(buffer, numeric_cols, fieldnames, rates)
+				buffer = []
+			buffer.append(row)
+			last_key = key
+
+	if buffer:
+		yield compact_wide_chunk(buffer, numeric_cols, fieldnames, rates)
+
+
+def compact_wide_chunk(rows, numeric_cols, fieldnames, rates):
+	"""Pivots a chunk of long rows to the report columns with float32 measures and categorical literals."""
+	df = apply_rates(pd.DataFrame(rows), rates)
+	for col in numeric_cols:
+		df[col] = pd.to_numeric(df[col], errors="coerce").astype("float32")
+
+	keep = [col for col in df.columns if col in LITERAL_COLS or col == "month" or col in numeric_cols]
+	wide = pivot_months(df[keep]).reindex(columns=fieldnames)
+	for col in wide.columns:
+		if col in STRING_LITERAL_COLS:
+			wide[col] = wide[col].astype("category")
+		else:
+			wide[col] = wide[col].fillna(0).astype("float32")
+	return wide
+
+
+class CsvExportWriter:
+	def __init__(self, path, columns):
+		self.file = open(path, "w", newline="", encoding="utf-8")
+		csv.writer(self.file).writerow([c["label"] for c in columns])
+
+	def write(self, df):
+		df.to_csv(self.file, header=False, index=False)
+
+	def close(self):
+		self.file.close()
+
+
+class XlsxExportWriter:
+	def __init__(self, path, columns):
+		from openpyxl import Workbook
+
+		self.path = path
+		self.workbook = Workbook(write_only=True)
+		self.sheet = self.workbook.create_sheet("Consolidated Sales")
+		self.sheet.append([c["label"] for c in columns])
+
+	def write(self, df):
+		for row in df.astype(object).itertuples(index=False, name=None):
+			self.sheet.append([float(v) if isinstance(v, np.floating) else v for v in row])
+
+	def close(self):
+		self.workbook.save(self.path)
+
+
+class ParquetExportWriter:
+	def __init__(self, path, columns):
+		try:
+			import pyarrow as pa
+			import pyarrow.parquet as pq
+		except ImportError:
+			frappe.throw(_("Parquet export requires the pyarrow package"))
+
+		self.pa = pa
+		# Literals are plain strings here, Parquet dictionary-encodes them on disk
+		self.schema = pa.schema([
+			(c["fieldname"], pa.string() if c["fieldname"] in STRING_LITERAL_COLS else pa.float32())
+			for c in columns
+		])
+		self.writer = pq.ParquetWriter(path, self.schema, compression="snappy")
+
+	def write(self, df):
+		for col in df.columns:
+			if col in STRING_LITERAL_COLS:
+				df[col] = df[col].astype(str)
+		self.writer.write_table(self.pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+
+	def close(self):
+		self.writer.close()
+
+
+EXPORT_WRITERS = {
+	"csv": CsvExportWriter,
+	"xlsx": XlsxExportWriter,
+	"parquet": ParquetExportWriter,
+}
+
+
+def get_query(months):
+	return f"""
+		WITH months AS (
+				{get_months_cte(months)}
+		),
+		sales AS (
+			SELECT f.month, f.item_code, f.item_name, f.branch, f.uom, f.conversion_factor,
+				f.qty, f.stock_qty, f.net_amount, f.gross_amount, f.tva, f.fpi, f.dda
+			FROM `tabSales Monthly Fact` f
+			WHERE f.month BETWEEN %(from_month)s AND %(to_month)s
+				AND f.branch LIKE %(branch)s
+		),
+		ranked_routing AS (
+			-- Standard cost snapshot in effect at the end of each month (see erpmco.utils.standard_cost)
+			SELECT m.month, sc.production_item, sc.raw_material_cost, sc.scrap_material_credit, sc.total_cost,
+				sc.factory_overhead, sc.other_overhead, sc.labour, sc.depreciation, sc.std_cogs,
+				1 AS rn
+			FROM months m
+			INNER JOIN `tabStandard Cost Snapshot` sc ON sc.valid_from <= m.month_end AND (sc.valid_to IS NULL OR sc.valid_to >= m.month_end)
+		),
+		cogs AS(
+			SELECT f.month, f.branch, f.item_code, f.cogs / f.cogs_stock_qty AS cogs_rate_t, f.free_qty, f.cogs_free_qty / f.free_qty AS cogs_free_qty_t
+			FROM `tabSales Monthly Fact` f
+			WHERE f.month BETWEEN %(from_month)s AND %(to_month)s
+				AND f.branch LIKE %(branch)s
+		),
+		taxes AS(
+			SELECT v.*, 
+				(v.tva_1 + (1 - v.tva_1) * v.dda_1  + (1 - v.tva_1) * (1 - v.dda_1) * v.fpi_1) * 100 AS total_tax
 			FROM (
-					SELECT s.*, r.*, ip.price_list, ip.price_list_rate, s.conversion_factor AS weight_in_ct, 
-						ip.price_list_rate / s.conversion_factor AS std_gross_rate, 
-						ip.price_list_rate * %(inv_disc_rate)s AS inv_disc,
-
-						ip.price_list_rate * (1 - %(inv_disc_rate)s) * 0.16 AS std_tva,
-						ip.price_list_rate * (1 - %(inv_disc_rate)s) * (CASE WHEN i.category = 'Cosmetic' THEN 0.15 ELSE 0.1 END) * (CASE WHEN IFNULL(x.dda_1, 0) <> 0 AND s.branch = 'Kinshasa' THEN 1 ELSE 0 END)  AS std_dda,
-						ip.price_list_rate * (1 - %(inv_disc_rate)s) * 0.0167 AS std_fpi,
-						ip.price_list_rate * (1 - %(inv_disc_rate)s) * 0.84 * (1 - (CASE WHEN i.category = 'Cosmetic' THEN 0.15 ELSE 0.10 END) * (CASE WHEN IFNULL(x.dda_1, 0) <> 0 AND s.branch = 'Kinshasa' THEN 1 ELSE 0 END)) * 0.9833 * (CASE WHEN LOWER(s.item_name) LIKE '%%band%%' THEN %(royalty_rate)s ELSE 0 END) AS royalty,
-						ip.price_list_rate * (1 - %(inv_disc_rate)s) * (1 - (CASE WHEN LOWER(s.item_name) LIKE '%%band%%' THEN %(royalty_rate)s ELSE 0 END)) * %(csh_disc_rate)s AS cash_disc,
-						ip.price_list_rate * (1 - %(inv_disc_rate)s) * (1 - (CASE WHEN LOWER(s.item_name) LIKE '%%band%%' THEN %(royalty_rate)s ELSE 0 END)) * (1 - %(csh_disc_rate)s) * %(bonus_rate)s AS bonus,
-						c.cogs_rate_t , c.cogs_rate_t * stock_qty AS actual_buying, c.free_qty, c.cogs_free_qty_t,
-						cat.description AS category, scat.description AS sub_category, x.tax_category, x.total_tax
-					FROM sales s 
-					INNER JOIN price_weights ip ON s.item_code = ip.item_code AND LOWER(ip.price_list) LIKE LOWER(CONCAT(s.branch, ' gross', '%%'))
-					INNER JOIN tabItem i ON i.name = ip.item_code
-					INNER JOIN `tabFamille Statistique` cat ON cat.name = i.category
-					INNER JOIN `tabFamille Statistique` scat ON scat.name = i.sub_category
-					INNER JOIN ranked_routing r ON r.production_item = s.item_code AND r.rn = 1
-					LEFT JOIN cogs c ON c.item_code = s.item_code AND c.branch = s.branch
-					LEFT JOIN taxes x ON x.item_code = s.item_code
-					WHERE x.tax_category LIKE CONCAT(s.branch, '%%') 
+				SELECT t.item_code, t.tax_category, MAX(t.tva) / 100 AS tva_1, MAX(t.dda) / 100 AS dda_1, MAX(t.fpi) / 100 AS fpi_1
+				FROM (
+					SELECT
+						it.parent AS item_code, it.tax_category,
+						CASE WHEN itd.tax_type LIKE '44310000%%' THEN itd.tax_rate ELSE 0 END AS tva,
+						CASE WHEN itd.tax_type LIKE '44350000%%' THEN itd.tax_rate ELSE 0 END AS dda,
+						CASE WHEN itd.tax_type LIKE '44210300%%' THEN itd.tax_rate ELSE 0 END AS fpi
+					FROM `tabItem` i JOIN `tabItem Tax` it ON it.parent = i.name
+						JOIN `tabItem Tax Template` itt  ON it.item_tax_template = itt.name
+						JOIN `tabItem Tax Template Detail` itd ON itd.parent = itt.name
+					WHERE i.item_group   = 'FG' AND i.disabled  = 0 AND itt.disabled = 0
 				) AS t
+				GROUP BY t.item_code, t.tax_category
 			) AS v
-		"""
-
-		# Fetch data for the current month
-		result = frappe.db.sql(query, {
-			"from_date": month_start,
-			"to_date": month_end,
-			"branch": branch,
-			"inv_disc_rate": inv_disc_rate,
-			"csh_disc_rate": csh_disc_rate,
-			"bonus_rate": bonus_rate,
-			"royalty_rate": royalty_rate
-		}, as_dict=True)
-
-		df = pd.DataFrame([dict(r) for r in result])
-		if df.empty:
-			continue
-
-		df['group'] = df['category'] + " - " + df['sub_category']
-		literal_cols = ["branch", "category", "sub_category", "group", "item_code", "item_name", "uom", "conversion_factor", "production_item", "rn", "price_list"]
-		numeric_cols = [col for col in df.columns if col not in literal_cols]
-		df = df[literal_cols + numeric_cols]
-		df = df.rename(columns={col: f"{col}_{month}" for col in numeric_cols})
-		monthly_dfs.append(df)
-
-	if not monthly_dfs:
-		return [], months
-
-	consolidated_df = monthly_dfs[0]
-	for df in monthly_dfs[1:]:
-		consolidated_df = pd.merge(consolidated_df, df, how='outer', on=literal_cols)
-
-	# Sous-totaux par groupe
-	#grouped_totals = []
-	#group_keys = consolidated_df['group'].unique()
-
-	#for group in group_keys:
-	#	group_df = consolidated_df[consolidated_df['group'] == group]
-	#	total_row = {
-	#		col: f"TOTAL {group}" if col == "item_name"
-	#		else "" if col in literal_cols
-	#		else group_df[col].sum()
-	#		for col in consolidated_df.columns
-	#	}
-	#	grouped_totals.append(total_row)
-
-	# Ajoute les lignes de sous-totaux
-	#consolidated_df = pd.concat([consolidated_df, pd.DataFrame(grouped_totals)], ignore_index=True)
-
-	# Total général
-	#numeric_columns = [col for col in consolidated_df.columns if col not in literal_cols]
-	#numeric_columns = [col for col in numeric_columns if consolidated_df[col].dtype in [np.float64, np.int64]]
-
-	#total_general = {col: consolidated_df[col].sum() if col in numeric_columns else '' for col in consolidated_df.columns}
-	#total_general['item_name'] = 'TOTAL GENERAL'
-
-	#consolidated_df = pd.concat([consolidated_df, pd.DataFrame([total_general])], ignore_index=True)
-
-	return consolidated_df.fillna(0).to_dict(orient='records'), months
+		),
+		price_weights AS (
+			SELECT sub.month, sub.item_code, sub.price_list, 
+				SUM(sub.price_list_rate * sub.days_in_period) / SUM(sub.days_in_period)  AS price_list_rate
+			FROM (
+			SELECT m.month, ip.item_code, ip.price_list, ip.price_list_rate,
+				DATEDIFF(
+				LEAST(COALESCE(ip.valid_upto,   m.month_end), m.month_end),
+				GREATEST(ip.valid_from,         m.month_start)
+				) + 1                                 AS days_in_period
+			FROM `tabItem Price` ip
+			INNER JOIN months m ON ip.valid_from <= m.month_end AND (ip.valid_upto IS NULL OR ip.valid_upto >= m.month_start)
+			WHERE LOWER(ip.price_list) LIKE CASE
+				WHEN %(branch)s IS NOT NULL THEN
+					CONCAT(LOWER(%(branch)s), ' gross', '%%')
+				ELSE
+					'%% gross%%'
+				END
+			) AS sub
+			GROUP BY sub.month, sub.item_code, sub.price_list
+		)
+		SELECT DISTINCT v.*
+		FROM (
+				SELECT s.*, r.production_item, r.raw_material_cost, r.scrap_material_credit, r.total_cost,
+					r.factory_overhead, r.other_overhead, r.labour, r.depreciation, r.std_cogs, r.rn,
+					ip.price_list, ip.price_list_rate,
+					c.cogs_rate_t, c.free_qty, c.cogs_free_qty_t,
+					cat.description AS category, scat.description AS sub_category, x.tax_category, x.total_tax,
+					CASE WHEN i.category = 'Cosmetic' THEN 1 ELSE 0 END AS is_cosmetic,
+					CASE WHEN IFNULL(x.dda_1, 0) <> 0 AND s.branch = 'Kinshasa' THEN 1 ELSE 0 END AS has_dda,
+					CASE WHEN LOWER(s.item_name) LIKE '%%band%%' THEN 1 ELSE 0 END AS is_band
+				FROM sales s 
+				INNER JOIN price_weights ip ON ip.month = s.month AND s.item_code = ip.item_code AND LOWER(ip.price_list) LIKE LOWER(CONCAT(s.branch, ' gross', '%%'))
+				INNER JOIN tabItem i ON i.name = ip.item_code
+				INNER JOIN `tabFamille Statistique` cat ON cat.name = i.category
+				INNER JOIN `tabFamille Statistique` scat ON scat.name = i.sub_category
+				INNER JOIN ranked_routing r ON r.month = s.month AND r.production_item = s.item_code AND r.rn = 1
+				LEFT JOIN cogs c ON c.month = s.month AND c.item_code = s.item_code AND c.branch = s.branch
+				LEFT JOIN taxes x ON x.item_code = s.item_code
+				WHERE x.tax_category LIKE CONCAT(s.branch, '%%') 
+		) AS v
+	"""
@@ -0,0 +1,188 @@
+# Copyright (c) 2026, Kossivi Dodzi Amouzou and Contributors
+# See license.txt
+
+import frappe
+import pandas as pd
+from frappe.tests.utils import FrappeTestCase
+
+from erpmco.erpmco.report.consolidated_monthly_sales_analysis.consolidated_monthly_sales_analysis import (
+	LITERAL_COLS,
+	RATE_DEPENDENT_COLS,
+	apply_rates,
+	get_rates,
+	pivot_months,
+)
+
+
+def make_row(item_code, month, qty, **kwargs):
+	row = {col: None for col in LITERAL_COLS}
+	row.update(
+		{
+			"branch": "Kinshasa",
+			"category": "Food",
+			"sub_category": "Oil",
+			"item_code": item_code,
+			"item_name": f"Item {item_code}",
+			"uom": "CT",
+			"conversion_factor": 0.01,
+			"production_item": item_code,
+			"rn": 1,
+			"price_list": "Kinshasa Gross",
+			"month": month,
+			"qty": qty,
+		}
+	)
+	row.update(kwargs)
+	return row
+
+
+class TestPivotMonths(FrappeTestCase):
+	def test_one_wide_row_per_item(self):
+		df = pd.DataFrame(
+			[
+				make_row("A", "2025-01", 10),
+				make_row("A", "2025-02", 20),
+				make_row("B", "2025-02", 5),
+			]
+		)
+		wide = pivot_months(df).set_index("item_code")
+
+		self.assertEqual(len(wide), 2)
+		self.assertEqual(wide.loc["A", "qty_2025-01"], 10)
+		self.assertEqual(wide.loc["A", "qty_2025-02"], 20)
+		self.assertEqual(wide.loc["B", "qty_2025-02"], 5)
+		# A month without sales is blank, not zero
+		self.assertTrue(pd.isna(wide.loc["B", "qty_2025-01"]))
+
+	def test_group_and_literal_columns(self):
+		wide = pivot_months(pd.DataFrame([make_row("A", "2025-01", 1, production_item=None)]))
+
+		self.assertEqual(wide.loc[0, "group"], "Food - Oil")
+		self.assertEqual(wide.loc[0, "production_item"], "")
+		self.assertEqual(set(LITERAL_COLS) - set(wide.columns), set())
+		self.assertNotIn("_seq", wide.columns)
+
+	def test_rows_sharing_literal_keys_stay_separate(self):
+		df = pd.DataFrame(
+			[
+				make_row("A", "2025-01", 10),
+				make_row("A", "2025-01", 3),
+				make_row("A", "2025-02", 7),
+			]
+		)
+		wide = pivot_months(df)
+
+		self.assertEqual(len(wide), 2)
+		self.assertEqual(sorted(wide["qty_2025-01"].tolist()), [3, 10])
+		self.assertEqual(wide["qty_2025-02"].sum(), 7)
+
+
+RATES = {"inv_disc_rate": 5, "csh_disc_rate": 2, "bonus_rate": 3, "royalty_rate": 4}
+
+
+def make_base_row(**kwargs):
+	row = {
+		"item_code": "A",
+		"month": "2025-01",
+		"conversion_factor": 0.02,
+		"qty": 100,
+		"stock_qty": 2,
+		"net_amount": 9000,
+		"gross_amount": 10000,
+		"tva": 1440,
+		"fpi": 150,
+		"dda": 0,
+		"price_list_rate": 120,
+		"cogs_rate_t": 3500,
+		"free_qty": 0,
+		"cogs_free_qty_t": 0,
+		"total_tax": 0,
+		"raw_material_cost": 2500,
+		"scrap_material_credit": -10,
+		"total_cost": 2490,
+		"factory_overhead": 100,
+		"other_overhead": 50,
+		"labour": 80,
+		"depreciation": 20,
+		"std_cogs": 2740,
+		"is_cosmetic": 0,
+		"has_dda": 0,
+		"is_band": 0,
+	}
+	row.update(kwargs)
+	return row
+
+
+def sql_reference(row, rates):
+	"""The rate-dependent columns as the report computed them in SQL before apply_rates."""
+	r = frappe._dict(row)
+	dda = (0.15 if r.is_cosmetic else 0.10) * (1 if r.has_dda else 0)
+	royalty_rate = rates.royalty_rate if r.is_band else 0
+	weight_in_ct = r.conversion_factor
+	plr = r.price_list_rate
+
+	out = frappe._dict(
+		inv_disc=plr * rates.inv_disc_rate,
+		std_tva=plr * (1 - rates.inv_disc_rate) * 0.16,
+		std_dda=plr * (1 - rates.inv_disc_rate) * dda,
+		std_fpi=plr * (1 - rates.inv_disc_rate) * 0.0167,
+		royalty=plr * (1 - rates.inv_disc_rate) * 0.84 * (1 - dda) * 0.9833 * royalty_rate,
+		cash_disc=plr * (1 - rates.inv_disc_rate) * (1 - royalty_rate) * rates.csh_disc_rate,
+		bonus=plr * (1 - rates.inv_disc_rate) * (1 - royalty_rate) * (1 - rates.csh_disc_rate) * rates.bonus_rate,
+	)
+	out.std_net_sales_with_tax_ct = plr - out.inv_disc - out.cash_disc - out.bonus - out.royalty
+	out.std_net_sales_ct = out.std_net_sales_with_tax_ct - out.std_tva - out.std_dda - out.std_fpi
+	out.std_net_sales_t = out.std_net_sales_ct / weight_in_ct
+	out.std_net_sales_with_tax_t = out.std_net_sales_with_tax_ct / weight_in_ct
+	out.gp = out.std_net_sales_t - r.std_cogs
+	out.gp_percent = 100 * (1 - r.std_cogs / out.std_net_sales_t) if out.std_net_sales_t != 0 else 0
+	out.actual_buying = r.cogs_rate_t * r.stock_qty
+	out.actual_gp = r.net_amount - out.actual_buying
+	out.actual_gp_percent = out.actual_gp / r.net_amount * 100
+	out.actual_cost_ct = r.gross_amount / r.qty
+	out.actual_cost_t = r.gross_amount / r.stock_qty
+	out.actual_cogs_t = out.actual_buying / r.stock_qty
+	out.std_gross_rate = plr / weight_in_ct
+	out.inv_disc_t = out.inv_disc / weight_in_ct
+	out.royalty_t = out.royalty / weight_in_ct
+	return out
+
+
+class TestApplyRates(FrappeTestCase):
+	def test_parity_with_sql_formulas(self):
+		rows = [
+			make_base_row(),
+			make_base_row(item_code="B", is_cosmetic=1, has_dda=1),
+			make_base_row(item_code="C", has_dda=1, is_band=1),
+			make_base_row(item_code="D", is_cosmetic=1, has_dda=1, is_band=1, price_list_rate=80.5),
+		]
+		rates = get_rates(RATES)
+		df = apply_rates(pd.DataFrame(rows), rates).set_index("item_code")
+
+		for row in rows:
+			expected = sql_reference(row, rates)
+			for col, value in expected.items():
+				with self.subTest(item_code=row["item_code"], column=col):
+					self.assertAlmostEqual(df.loc[row["item_code"], col], value, places=6)
+
+	def test_covers_rate_dependent_columns(self):
+		df = apply_rates(pd.DataFrame([make_base_row()]), get_rates(RATES))
+
+		self.assertEqual(set(RATE_DEPENDENT_COLS) - set(df.columns), set())
+		# Flags only feed the formulas
+		self.assertNotIn("is_band", df.columns)
+
+	def test_zero_division_is_blank(self):
+		df = apply_rates(pd.DataFrame([make_base_row(qty=0, stock_qty=0)]), get_rates(RATES))
+
+		self.assertTrue(pd.isna(df.loc[0, "actual_cost_ct"]))
+		self.assertTrue(pd.isna(df.loc[0, "actual_cost_t"]))
+		self.assertTrue(pd.isna(df.loc[0, "actual_cogs_t"]))
+
+	def test_zero_rates(self):
+		df = apply_rates(pd.DataFrame([make_base_row(is_band=1)]), get_rates({}))
+
+		self.assertEqual(df.loc[0, "inv_disc"], 0)
+		self.assertEqual(df.loc[0, "royalty"], 0)
+		self.assertEqual(df.loc[0, "bonus"], 0)
+		self.assertAlmostEqual(df.loc[0, "std_net_sales_with_tax_ct"], 120)
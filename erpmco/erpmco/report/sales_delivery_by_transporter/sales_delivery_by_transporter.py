@@ -1,59 +1,112 @@
 import frappe
+from frappe import _
+
+from erpmco.utils.report_cache import cached_report
+from erpmco.utils.transporter_rollup import get_rollup_by_transporter
+
+
 def execute(filters=None):
-    # Step 1: Fetch list of transporter names from Supplier master
-    transporters = frappe.get_all(
-        "Supplier",
-        filters={"is_transporter": 1},
-        fields=["name"]
+    filters = frappe._dict(filters or {})
+
+    rows = get_rows(filters)
+    keys = get_transporter_keys(get_transporters(rows))
+    columns = get_columns(keys)
+    data = pivot_by_transporter(rows, keys)
+    return columns, data
+
+
+@cached_report("Sales Delivery by Transporter", doctypes=["Delivery Note"])
+def get_rows(filters):
+    if filters.get("customer") or not (filters.get("from_date") and filters.get("to_date")):
+        # The daily rollup is not split by customer
+        return get_delivered_by_transporter(filters)
+    return get_rollup_by_transporter(filters.from_date, filters.to_date, branch=filters.get("branch"))
+
+
+def get_delivered_by_transporter(filters):
+    """Cartons and metric tons per (item, transporter), over the filtered Delivery Notes only."""
+    conditions = ""
+    params = {}
+    if filters.get("from_date"):
+        conditions += " AND dn.posting_date >= %(from_date)s"
+        params["from_date"] = filters.from_date
+    if filters.get("to_date"):
+        conditions += " AND dn.posting_date <= %(to_date)s"
+        params["to_date"] = filters.to_date
+    if filters.get("branch"):
+        conditions += " AND dn.branch = %(branch)s"
+        params["branch"] = filters.branch
+    if filters.get("customer"):
+        conditions += " AND dn.customer = %(customer)s"
+        params["customer"] = filters.customer
+
+    return frappe.db.sql(
+        f"""
+        SELECT
+            dni.item_code,
+            dni.item_name,
+            dni.stock_uom,
+            dn.transporter_name,
+            SUM(dni.stock_qty) AS cartons,
+            SUM(dni.stock_qty * dni.conversion_factor) AS metric_ton
+        FROM `tabDelivery Note` dn
+        INNER JOIN `tabDelivery Note Item` dni ON dn.name = dni.parent
+        WHERE dn.docstatus = 1
+          AND IFNULL(dn.transporter_name, '') != ''
+          {conditions}
+        GROUP BY dni.item_code, dni.item_name, dni.stock_uom, dn.transporter_name
+        ORDER BY dni.item_code
+        """,
+        params,
+        as_dict=True,
     )
-    
-    # Step 2: Generate dynamic CASE statements for each transporter
-    case_statements = []
+
+
+def get_transporters(rows):
+    """Transporter suppliers first (as in the Supplier master), then any other transporter found."""
+    transporters = frappe.get_all("Supplier", filters={"is_transporter": 1}, pluck="name")
+    known = set(transporters)
+    for row in rows:
+        if row.transporter_name not in known:
+            known.add(row.transporter_name)
+            transporters.append(row.transporter_name)
+    return transporters
+
+
+def get_transporter_keys(transporters):
+    """Maps each transporter to a column key; names that scrub alike get a _2, _3... suffix."""
+    keys, used = {}, set()
+    for transporter in transporters:
+        base = key = frappe.scrub(transporter)
+        suffix = 1
+        while key in used:
+            suffix += 1
+            key = f"{base}_{suffix}"
+        used.add(key)
+        keys[transporter] = key
+    return keys
+
+
+def get_columns(keys):
     columns = [
-        {"label": "Delivered Product", "fieldname": "item_code", "fieldtype": "Data", "width": 150},
-        {"label": "Item Name", "fieldname": "item_name", "fieldtype": "Data", "width": 150},
-        {"label": "Stock UOM", "fieldname": "stock_uom", "fieldtype": "Data", "width": 100}
+        {"label": _("Delivered Product"), "fieldname": "item_code", "fieldtype": "Link", "options": "Item", "width": 150},
+        {"label": _("Item Name"), "fieldname": "item_name", "fieldtype": "Data", "width": 150},
+        {"label": _("Stock UOM"), "fieldname": "stock_uom", "fieldtype": "Data", "width": 100},
     ]
-    
-    for transporter in transporters:
-        transporter_name = transporter["name"]
-        case_statements.append(f"""
-            SUM(CASE WHEN dn.transporter_name = '{transporter_name}' THEN dni.stock_qty ELSE 0 END) AS "cartons_by_{transporter_name}",
-            SUM(CASE WHEN dn.transporter_name = '{transporter_name}' THEN (dni.stock_qty * dni.conversion_factor) ELSE 0 END) AS "metric_ton_by_{transporter_name}"
-        """)
-        
-        # Add corresponding columns for each transporter
-        columns.append({"label": f"Cartons by {transporter_name}", "fieldname": f"cartons_by_{transporter_name}", "fieldtype": "Float", "width": 120})
-        columns.append({"label": f"Metric Ton by {transporter_name}", "fieldname": f"metric_ton_by_{transporter_name}", "fieldtype": "Float", "width": 120})
-    
-    # Step 3: Join all CASE statements into the main query
-    case_statements_sql = ",\n".join(case_statements)
-
-    # Ensure there's no trailing comma by checking if there are any CASE statements
-    if case_statements_sql:
-        case_statements_sql = ",\n" + case_statements_sql
-
-    query = f"""
-        SELECT
-            dni.item_code AS "item_code",
-            dni.item_name AS "item_name",
-            dni.stock_uom AS "stock_uom"
-            {case_statements_sql}
-        FROM
-            `tabDelivery Note` dn
-        INNER JOIN
-            `tabDelivery Note Item` dni ON dn.name = dni.parent
-        WHERE
-            dn.docstatus = 1 -- Only consider submitted delivery notes
-        GROUP BY
-            dni.item_code, dni.item_name, dni.stock_uom
-        ORDER BY
-            dni.item_code;
-    """
-
-    
-    # Step 4: Execute the query
-    result = frappe.db.sql(query, as_dict=True)
-    
-    # Step 5: Return columns and result as expected by ERPNext
-    return columns, result
+    for transporter, key in keys.items():
+        columns.append({"label": _("Cartons by {0}").format(transporter), "fieldname": f"cartons_by_{key}", "fieldtype": "Float", "width": 120})
+        columns.append({"label": _("Metric Ton by {0}").format(transporter), "fieldname": f"metric_ton_by_{key}", "fieldtype": "Float", "width": 120})
+    return columns
+
+
+def pivot_by_transporter(rows, keys):
+    data = {}
+    for row in rows:
+        item = data.setdefault(
+            (row.item_code, row.item_name, row.stock_uom),
+            {"item_code": row.item_code, "item_name": row.item_name, "stock_uom": row.stock_uom},
+        )
+        key = keys[row.transporter_name]
+        item[f"cartons_by_{key}"] = item.get(f"cartons_by_{key}", 0) + (row.cartons or 0)
+        item[f"metric_ton_by_{key}"] = item.get(f"metric_ton_by_{key}", 0) + (row.metric_ton or 0)
+    return list(data.values())
@@ -0,0 +1,33 @@
+# Copyright (c) 2026, Kossivi Dodzi Amouzou and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from erpmco.erpmco.report.sales_delivery_by_transporter.sales_delivery_by_transporter import (
+    get_columns,
+    get_transporter_keys,
+    pivot_by_transporter,
+)
+
+
+class TestSalesDeliveryByTransporter(FrappeTestCase):
+    def test_colliding_names_get_distinct_keys(self):
+        keys = get_transporter_keys(["Trans-Co", "Trans Co", "trans_co", "Other"])
+
+        self.assertEqual(keys, {"Trans-Co": "trans_co", "Trans Co": "trans_co_2", "trans_co": "trans_co_3", "Other": "other"})
+        fieldnames = [c["fieldname"] for c in get_columns(keys)]
+        self.assertEqual(len(fieldnames), len(set(fieldnames)))
+
+    def test_pivot_keeps_colliding_transporters_apart(self):
+        rows = [
+            frappe._dict(item_code="ITEM", item_name="Item", stock_uom="Nos", transporter_name=name, cartons=cartons, metric_ton=1)
+            for name, cartons in (("Trans-Co", 2), ("Trans Co", 5), ("Trans-Co", 3))
+        ]
+        keys = get_transporter_keys(["Trans-Co", "Trans Co"])
+
+        (item,) = pivot_by_transporter(rows, keys)
+
+        self.assertEqual(item["cartons_by_trans_co"], 5)
+        self.assertEqual(item["cartons_by_trans_co_2"], 5)
+        self.assertEqual(item["metric_ton_by_trans_co"], 2)
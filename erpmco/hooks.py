@@ -54,6 +54,10 @@ doctype_js = {
     "Purchase Order": "public/js/purchase_order_item_360.js",
 }
 
+doctype_list_js = {
+    "Sales Order": "public/js/sales_order_list.js",
+}
+
 
 # Svg Icons
 # ------------------
@@ -164,7 +168,11 @@ doc_events = {
     "Purchase Receipt": {
         "validate": "erpmco.utils.purchase_receipt.share_document",
         "on_update": "erpmco.utils.purchase_receipt.on_workflow_action_on_update",
-        "on_submit": "erpmco.utils.purchase_receipt.on_submit_purchase_receipt"
+        "on_submit": [
+            "erpmco.utils.purchase_receipt.on_submit_purchase_receipt",
+            "erpmco.utils.lead_time.on_submit_purchase_receipt",
+        ],
+        "on_cancel": "erpmco.utils.lead_time.on_cancel_purchase_receipt",
     },
     "Material Request": {
         "validate": "erpmco.utils.purchase_receipt.share_document",
@@ -173,7 +181,13 @@ doc_events = {
     "Purchase Order": {
         "validate": "erpmco.utils.purchase_receipt.share_document",
         "after_insert": "erpmco.utils.purchase_receipt.update_dossier",
-        "on_update": "erpmco.utils.purchase_receipt.on_workflow_action_on_update",
+        "on_update": [
+            "erpmco.utils.purchase_receipt.on_workflow_action_on_update",
+            "erpmco.utils.po_exception_scan.enqueue_po_exception_scan",
+        ],
+        "on_submit": "erpmco.utils.po_exception_scan.enqueue_po_exception_scan",
+        "on_update_after_submit": "erpmco.utils.po_exception_scan.enqueue_po_exception_scan",
+        "on_trash": "erpmco.utils.po_exception_scan.clear_po_exception_scan",
     },
     "Leave Application": {
         "validate": "erpmco.utils.purchase_receipt.share_document",
@@ -183,11 +197,65 @@ doc_events = {
         "validate": [
             "erpmco.utils.purchase_receipt.share_document"],
         "on_update": "erpmco.utils.purchase_receipt.on_workflow_action_on_update",
-        "on_submit": "erpmco.overrides.stock_entry.create_allocation",
+        "on_submit": "erpmco.utils.allocation_queue.queue_stock_entry_allocation",
     },
     
     "Sales Order": {
-        "on_submit": "erpmco.overrides.sales_order.create_allocation",
+        "on_submit": "erpmco.utils.allocation_queue.queue_sales_order_allocation",
+    },
+    "Sales Invoice": {
+        "on_submit": [
+            "erpmco.utils.sales_fact.on_sales_invoice_change",
+            "erpmco.utils.report_cache.invalidate_report_cache",
+        ],
+        "on_cancel": [
+            "erpmco.utils.sales_fact.on_sales_invoice_change",
+            "erpmco.utils.report_cache.invalidate_report_cache",
+        ],
+    },
+    "Delivery Note": {
+        "on_update": "erpmco.overrides.delivery_note.clear_reserved_stock_cache",
+        "on_trash": "erpmco.overrides.delivery_note.clear_reserved_stock_cache",
+        "on_submit": [
+            "erpmco.utils.sales_fact.on_delivery_note_change",
+            "erpmco.utils.transporter_rollup.on_delivery_note_change",
+            "erpmco.utils.reservation_balance.on_delivery_note_change",
+            "erpmco.utils.report_cache.invalidate_report_cache",
+            "erpmco.overrides.delivery_note.clear_reserved_stock_cache",
+        ],
+        "on_cancel": [
+            "erpmco.utils.sales_fact.on_delivery_note_change",
+            "erpmco.utils.transporter_rollup.on_delivery_note_change",
+            "erpmco.utils.reservation_balance.on_delivery_note_change",
+            "erpmco.utils.report_cache.invalidate_report_cache",
+            "erpmco.overrides.delivery_note.clear_reserved_stock_cache",
+        ],
+    },
+    "Prepared Report": {
+        "after_insert": "erpmco.erpmco.report.consolidated_monthly_sales_analysis.consolidated_monthly_sales_analysis.register_prepared_report",
+    },
+    "Stock Reservation Entry": {
+        "on_submit": "erpmco.overrides.delivery_note.clear_reserved_stock_cache",
+        "on_update_after_submit": "erpmco.overrides.delivery_note.clear_reserved_stock_cache",
+        "on_cancel": "erpmco.overrides.delivery_note.clear_reserved_stock_cache",
+    },
+    "BOM": {
+        "on_submit": "erpmco.utils.standard_cost.enqueue_standard_cost_rebuild",
+        "on_update_after_submit": "erpmco.utils.standard_cost.enqueue_standard_cost_rebuild",
+        "on_cancel": "erpmco.utils.standard_cost.enqueue_standard_cost_rebuild",
+    },
+    "Routing": {
+        "on_update": "erpmco.utils.standard_cost.enqueue_standard_cost_rebuild",
+        "on_trash": "erpmco.utils.standard_cost.enqueue_standard_cost_rebuild",
+    },
+    "Workstation": {
+        "on_update": "erpmco.utils.standard_cost.enqueue_standard_cost_rebuild",
+        "on_trash": "erpmco.utils.standard_cost.enqueue_standard_cost_rebuild",
+    },
+    "Warehouse": {
+        "on_update": "erpmco.item_360.clear_branch_warehouse_cache",
+        "on_trash": "erpmco.item_360.clear_branch_warehouse_cache",
+        "after_rename": "erpmco.item_360.clear_branch_warehouse_cache",
     },
     "*": {
         "on_update": [
@@ -318,7 +386,23 @@ scheduler_events = {
     "hourly": [
         "erpmco.utils.update_dossier.update_gl_entry_dossier"
     ],
+    "daily": [
+        # BOM cost updates (Update BOM Cost tool) do not fire doc events
+        "erpmco.utils.standard_cost.rebuild_standard_cost_snapshots",
+        # Catches reservation changes made without Stock Reservation Entry events
+        "erpmco.utils.reservation_balance.reconcile_reservation_balances",
+    ],
+    "daily_long": [
+        "erpmco.utils.replenishment.scheduled_replenishment_scan",
+        # Rebuilds the recent months of the sales fact table
+        "erpmco.utils.sales_fact.reconcile_sales_facts",
+        # Rebuilds the last month of the transporter rollup
+        "erpmco.utils.transporter_rollup.reconcile_transporter_rollup",
+    ],
     "cron": {
+        "* * * * *": [
+            "erpmco.utils.allocation_queue.process_allocation_queue"
+        ],
         "0 1 * * *": [
             "erpmco.utils.cleanup.delete_old_allocations"
         ]
@@ -1,6 +1,8 @@
 import frappe
 from frappe.utils import flt, getdate, nowdate, add_months
 
+from erpmco.utils.lead_time import get_lead_time_samples, summarize_samples
+
 
 # ----------------------------
 # Public API (single payload)
@@ -74,11 +76,12 @@ def get_item_360_for_po(
     purchases = _get_purchase_history(company, item_code, supplier_for_price, history_limit, effective_wh, branch_whs)
     last_purchase = purchases[0] if purchases else {}
 
-    # --- Rate trends (3/6/12 months) ---
+    # --- Rate trends (monthly buckets, 3/6/12 month summaries derived from them) ---
+    trend_series = _get_rate_trend_buckets(company, item_code, supplier_for_price, months=12, warehouse=effective_wh, branch_whs=branch_whs)
     trends = {
-        "m3": _get_rate_trend(company, item_code, supplier_for_price, months=3, warehouse=effective_wh, branch_whs=branch_whs),
-        "m6": _get_rate_trend(company, item_code, supplier_for_price, months=6, warehouse=effective_wh, branch_whs=branch_whs),
-        "m12": _get_rate_trend(company, item_code, supplier_for_price, months=12, warehouse=effective_wh, branch_whs=branch_whs),
+        "m3": _rate_trend_from_buckets(trend_series, months=3),
+        "m6": _rate_trend_from_buckets(trend_series, months=6),
+        "m12": _rate_trend_from_buckets(trend_series, months=12),
     }
 
     # --- Supplier-wise last rate ---
@@ -90,8 +93,9 @@ def get_item_360_for_po(
     # --- Reorder settings ---
     reorder = _get_reorder_settings(item_code, effective_wh, branch_whs)
 
-    # --- Lead time from linked PO only ---
-    lead_time = _get_lead_time_po_to_pr(company, item_code, lead_time_receipts, effective_wh, branch_whs)
+    # --- Lead time from linked PO only (statistics store first, live join as fallback) ---
+    lead_time = _get_lead_time_po_to_pr(company, item_code, lead_time_receipts, effective_wh, branch_whs, branch=branch)
+    supplier_lead_time = _get_supplier_lead_time(company, item_code, supplier, branch) if supplier else {}
 
     # --- Supplier status (useful flags) ---
     supplier_info = _get_supplier_info(supplier) if supplier else {}
@@ -130,12 +134,14 @@ def get_item_360_for_po(
 
             "last_purchase": last_purchase,
             "lead_time": lead_time,
+            "supplier_lead_time": supplier_lead_time,
 
             "supplier_info": supplier_info,
         },
         "purchases": {
             "history": purchases,
             "trends": trends,
+            "trend_series": trend_series,
             "supplier_last_rates": supplier_last_rates,
             "quotations": quotations,
         },
@@ -149,6 +155,48 @@ def get_item_360_for_po(
 # ----------------------------
 # Branch -> Warehouses mapping
 # ----------------------------
+BRANCH_WAREHOUSE_CACHE_KEY = "erpmco:branch_warehouses"
+
+# Use the lft range predicate instead of IN (...) once a branch has this many warehouses
+RANGE_SCOPE_MIN_WAREHOUSES = 20
+
+
+
+class BranchWarehouses(list):
+    """
+    Warehouse names of a branch. `ranges` holds [lft_from, lft_to] pairs that
+    cover exactly these warehouses in the Warehouse tree, so scoped queries can
+    use a range predicate instead of a large IN tuple.
+    """
+
+    def __init__(self, names=(), ranges=None):
+        super().__init__(names)
+        self.ranges = ranges or []
+
+
+def get_branch_field(doctype: str):
+    """
+    Column holding the branch on a doctype: `branch`, else `custom_branch`, else False.
+    Memoized on frappe.local, so per site and per request/job.
+    """
+    if not hasattr(frappe.local, "erpmco_branch_fields"):
+        frappe.local.erpmco_branch_fields = {}
+
+    fields = frappe.local.erpmco_branch_fields
+    if doctype not in fields:
+        if frappe.db.has_column(doctype, "branch"):
+            fields[doctype] = "branch"
+        elif frappe.db.has_column(doctype, "custom_branch"):
+            fields[doctype] = "custom_branch"
+        else:
+            fields[doctype] = False
+    return fields[doctype]
+
+
+def _get_branch_warehouse_field():
+    return get_branch_field("Warehouse")
+
+
 def _get_branch_warehouses(company: str, branch: str | None) -> list[str]:
     """
     Returns warehouses belonging to a branch.
@@ -156,31 +204,56 @@ def _get_branch_warehouses(company: str, branch: str | None) -> list[str]:
       - tabWarehouse.branch
       - tabWarehouse.custom_branch
     If neither exists or branch is empty, returns [].
+
+    The mapping is cached in Redis and cleared whenever a Warehouse changes.
     """
     if not branch:
         return []
 
-    wh_branch_field = None
-    if frappe.db.has_column("Warehouse", "branch"):
-        wh_branch_field = "branch"
-    elif frappe.db.has_column("Warehouse", "custom_branch"):
-        wh_branch_field = "custom_branch"
+    cached = frappe.cache().hget(
+        BRANCH_WAREHOUSE_CACHE_KEY,
+        f"{company}::{branch}",
+        generator=lambda: _load_branch_warehouses(company, branch),
+    )
+    return BranchWarehouses(cached["warehouses"], cached["ranges"])
+
 
+def _load_branch_warehouses(company: str, branch: str):
+    wh_branch_field = _get_branch_warehouse_field()
     if not wh_branch_field:
-        return []
+        return {"warehouses": [], "ranges": []}
 
     rows = frappe.db.sql(
         f"""
-        SELECT name
+        SELECT name, lft,
+          (company = %(company)s AND IFNULL(disabled, 0) = 0 AND `{wh_branch_field}` = %(branch)s) AS in_branch
         FROM `tabWarehouse`
-        WHERE company = %(company)s
-          AND IFNULL(disabled, 0) = 0
-          AND `{wh_branch_field}` = %(branch)s
+        ORDER BY lft
         """,
         {"company": company, "branch": branch},
         as_dict=True,
     )
-    return [r["name"] for r in rows]
+
+    warehouses = []
+    ranges = []
+    in_run = False
+    for r in rows:
+        if r["in_branch"]:
+            warehouses.append(r["name"])
+            if in_run:
+                ranges[-1][1] = r["lft"]
+            else:
+                ranges.append([r["lft"], r["lft"]])
+            in_run = True
+        else:
+            in_run = False
+
+    return {"warehouses": warehouses, "ranges": ranges}
+
+
+def clear_branch_warehouse_cache(doc=None, method=None, *args, **kwargs):
+    """Warehouse on_update / on_trash / after_rename."""
+    frappe.cache().delete_value(BRANCH_WAREHOUSE_CACHE_KEY)
 
 
 def _warehouse_condition(alias: str, warehouse: str | None, branch_whs: list[str], params: dict, fieldname: str = "warehouse") -> str:
@@ -189,6 +262,15 @@ def _warehouse_condition(alias: str, warehouse: str | None, branch_whs: list[str
     Priority: branch_whs -> warehouse -> none
     """
     if branch_whs:
+        ranges = getattr(branch_whs, "ranges", None)
+        if ranges and len(branch_whs) >= RANGE_SCOPE_MIN_WAREHOUSES and len(ranges) < len(branch_whs):
+            terms = []
+            for i, (lft_from, lft_to) in enumerate(ranges):
+                params[f"wh_lft_from_{i}"] = lft_from
+                params[f"wh_lft_to_{i}"] = lft_to
+                terms.append(f"wr.lft BETWEEN %(wh_lft_from_{i})s AND %(wh_lft_to_{i})s")
+            return f" AND {alias}.{fieldname} IN (SELECT wr.name FROM `tabWarehouse` wr WHERE {' OR '.join(terms)})"
+
         params["whs"] = tuple(branch_whs)
         return f" AND {alias}.{fieldname} IN %(whs)s"
     if warehouse:
@@ -415,25 +497,33 @@ def _get_purchase_history(company: str, item_code: str, supplier: str | None, li
     return po
 
 
-def _get_rate_trend(company: str, item_code: str, supplier: str | None, months: int,
-                    warehouse: str | None, branch_whs: list[str]):
+def _get_rate_trend_buckets(company: str, item_code: str, supplier: str | None, months: int,
+                            warehouse: str | None, branch_whs: list[str], by_supplier: bool = False):
+    """
+    Monthly purchase-rate buckets (base / stock UOM) from Purchase Invoices,
+    covering the current month and the `months` calendar months before it.
+    One grouped scan; window summaries are derived from these in Python.
+    """
     params = {"company": company, "item_code": item_code}
     supplier_cond = ""
     if supplier:
         supplier_cond = " AND p.supplier = %(supplier)s"
         params["supplier"] = supplier
 
-    from_date = getdate(add_months(nowdate(), -months))
-    params["from_date"] = from_date
+    params["from_date"] = _month_start(add_months(nowdate(), -months))
 
     wh_cond = _warehouse_condition("pii", warehouse, branch_whs, params, fieldname="warehouse")
+    supplier_col = ", p.supplier" if by_supplier else ""
 
-    r = frappe.db.sql(
+    rows = frappe.db.sql(
         f"""
         SELECT
+          DATE_FORMAT(p.posting_date, '%%Y-%%m') AS month
+          {supplier_col},
           MIN(pii.base_rate / NULLIF(pii.conversion_factor, 0)) AS min_rate,
-          AVG(pii.base_rate / NULLIF(pii.conversion_factor, 0)) AS avg_rate,
           MAX(pii.base_rate / NULLIF(pii.conversion_factor, 0)) AS max_rate,
+          SUM(pii.base_rate / NULLIF(pii.conversion_factor, 0)) AS sum_rate,
+          COUNT(pii.base_rate / NULLIF(pii.conversion_factor, 0)) AS n_rated,
           COUNT(*) AS n
         FROM `tabPurchase Invoice` p
         INNER JOIN `tabPurchase Invoice Item` pii ON pii.parent = p.name
@@ -443,21 +533,65 @@ def _get_rate_trend(company: str, item_code: str, supplier: str | None, months:
           AND p.posting_date >= %(from_date)s
           {supplier_cond}
           {wh_cond}
+        GROUP BY month {supplier_col}
+        ORDER BY month {supplier_col}
         """,
         params,
         as_dict=True,
-    )[0]
+    )
+
+    for r in rows:
+        r["avg_rate"] = (flt(r["sum_rate"]) / r["n_rated"]) if r["n_rated"] else 0.0
+    return rows
+
+
+def _rate_trend_from_buckets(buckets: list[dict], months: int):
+    """
+    min/avg/max over the last `months` months, aggregated from monthly buckets.
+    The window starts on the first day of the month `months` months ago.
+    """
+    from_date = _month_start(add_months(nowdate(), -months))
+    window = [b for b in buckets if b["month"] >= from_date.strftime("%Y-%m")]
+
+    min_rates = [flt(b["min_rate"]) for b in window if b["min_rate"] is not None]
+    max_rates = [flt(b["max_rate"]) for b in window if b["max_rate"] is not None]
+    n_rated = sum(int(b["n_rated"] or 0) for b in window)
 
     return {
         "from_date": str(from_date),
         "months": months,
-        "min_rate": flt(r["min_rate"]),
-        "avg_rate": flt(r["avg_rate"]),
-        "max_rate": flt(r["max_rate"]),
-        "n": int(r["n"] or 0),
+        "min_rate": min(min_rates) if min_rates else 0.0,
+        "avg_rate": (sum(flt(b["sum_rate"]) for b in window) / n_rated) if n_rated else 0.0,
+        "max_rate": max(max_rates) if max_rates else 0.0,
+        "n": sum(int(b["n"] or 0) for b in window),
     }
 
 
+def _month_start(date):
+    return getdate(date).replace(day=1)
+
+
+@frappe.whitelist()
+def get_rate_trend_series(
+    company: str,
+    item_code: str,
+    supplier: str | None = None,
+    branch: str | None = None,
+    warehouse: str | None = None,
+    months: int = 12,
+    by_supplier: int = 0,
+):
+    """Monthly purchase-rate series for charting, optionally split per supplier."""
+    if not company or not item_code:
+        frappe.throw("company and item_code are required")
+
+    branch_whs = _get_branch_warehouses(company, branch)
+    return _get_rate_trend_buckets(
+        company, item_code, supplier, months=int(months or 12),
+        warehouse=warehouse, branch_whs=branch_whs, by_supplier=bool(int(by_supplier or 0)),
+    )
+
+
 def _get_supplier_wise_last_rate(company: str, item_code: str, limit: int,
                                  warehouse: str | None, branch_whs: list[str]):
     params = {"company": company, "item_code": item_code, "limit": limit}
@@ -555,13 +689,7 @@ def _get_reorder_settings(item_code: str, warehouse: str | None, branch_whs: lis
     Else return all.
     """
     params = {"item_code": item_code}
-    cond = ""
-    if branch_whs:
-        params["whs"] = tuple(branch_whs)
-        cond = " AND ir.warehouse IN %(whs)s"
-    elif warehouse:
-        params["warehouse"] = warehouse
-        cond = " AND ir.warehouse = %(warehouse)s"
+    cond = _warehouse_condition("ir", warehouse, branch_whs, params, fieldname="warehouse")
 
     # Item Reorder is a child table of Item (parent = item_code)
     return frappe.db.sql(
@@ -585,11 +713,26 @@ def _get_reorder_settings(item_code: str, warehouse: str | None, branch_whs: lis
 # Lead time: PO -> PR linked only
 # ----------------------------
 def _get_lead_time_po_to_pr(company: str, item_code: str, limit_receipts: int,
-                            warehouse: str | None, branch_whs: list[str]):
+                            warehouse: str | None, branch_whs: list[str], branch: str | None = None):
+    """
+    Served from the Lead Time Statistic store when the branch has samples;
+    falls back to joining PR -> PO on the fly otherwise. Both are scoped by the
+    receipt's branch, so the source never changes the numbers.
+    """
+    if branch:
+        samples = get_lead_time_samples(company, [item_code], branch).get(item_code)
+        if samples:
+            return {**summarize_samples(samples, limit_receipts), "source": "store"}
+
     params = {"company": company, "item_code": item_code, "limit": limit_receipts}
 
-    # Scope by PR item warehouse if possible (PRI has warehouse)
-    wh_cond = _warehouse_condition("pri", warehouse, branch_whs, params, fieldname="warehouse")
+    pr_branch_field = get_branch_field("Purchase Receipt") if branch else None
+    if pr_branch_field:
+        params["branch"] = branch
+        scope_cond = f" AND pr.`{pr_branch_field}` = %(branch)s"
+    else:
+        # No branch to match the store on: scope by PR item warehouse (PRI has warehouse)
+        scope_cond = _warehouse_condition("pri", warehouse, branch_whs, params, fieldname="warehouse")
 
     rows = frappe.db.sql(
         f"""
@@ -603,10 +746,13 @@ def _get_lead_time_po_to_pr(company: str, item_code: str, limit_receipts: int,
         INNER JOIN `tabPurchase Receipt Item` pri ON pri.parent = pr.name
         INNER JOIN `tabPurchase Order` po ON po.name = pri.purchase_order
         WHERE pr.docstatus = 1
+          AND pr.is_return = 0
           AND pr.company = %(company)s
           AND pri.item_code = %(item_code)s
           AND pri.purchase_order IS NOT NULL
-          {wh_cond}
+          {scope_cond}
+        -- one sample per (PR, PO), as in the store
+        GROUP BY pr.name, pri.purchase_order
         ORDER BY pr.posting_date DESC, pr.modified DESC
         LIMIT %(limit)s
         """,
@@ -615,10 +761,14 @@ def _get_lead_time_po_to_pr(company: str, item_code: str, limit_receipts: int,
     )
 
     if not rows:
-        return {"avg_days": None, "n": 0, "samples": []}
+        return {"avg_days": None, "p50_days": None, "p90_days": None, "n": 0, "samples": [], "source": "live"}
+
+    return {**summarize_samples(rows), "source": "live"}
 
-    avg_days = sum(flt(r["lead_days"]) for r in rows) / len(rows)
-    return {"avg_days": avg_days, "n": len(rows), "samples": rows}
+
+def _get_supplier_lead_time(company: str, item_code: str, supplier: str, branch: str | None):
+    samples = get_lead_time_samples(company, [item_code], branch, supplier=supplier).get(item_code)
+    return summarize_samples(samples) if samples else {}
 
 
 # ----------------------------
@@ -648,9 +798,9 @@ def _get_supplier_info(supplier: str):
 
 def _build_flags(po_base_rate: float | None, po_cf: float | None, last_purchase: dict,
                  cover_post_days: float | None, supplier_info: dict):
-    # Replace with Settings doctype later
-    PRICE_VAR_THRESH_PCT = 10.0
-    COVER_OVERSTOCK_DAYS = 90.0
+    settings = get_exception_settings()
+    PRICE_VAR_THRESH_PCT = settings.price_var_thresh_pct
+    COVER_OVERSTOCK_DAYS = settings.cover_overstock_days
 
     flags = {
         "price_variance_pct": None,
@@ -700,29 +850,58 @@ def _build_flags(po_base_rate: float | None, po_cf: float | None, last_purchase:
 @frappe.whitelist()
 def get_po_exception_items(
     po_name: str,
-    consumption_days: int = 180,
-    price_var_thresh_pct: float = 10.0,
-    cover_overstock_days: float = 90.0
+    consumption_days: int | None = None,
+    price_var_thresh_pct: float | None = None,
+    cover_overstock_days: float | None = None,
+    refresh: int = 0,
 ):
     """
     Returns PO item rows that trigger exceptions (price variance / cover / supplier hold/disabled).
     Optimized: compute in bulk, minimal queries.
+
+    Thresholds default to Item 360 Settings. When the background scan is enabled
+    and the stored scan matches the current PO rows, the stored rows are returned
+    without rescanning (pass refresh=1 to force a live scan).
     """
 
     if not po_name:
         frappe.throw("po_name is required")
 
+    settings = get_exception_settings()
+    use_defaults = consumption_days is None and price_var_thresh_pct is None and cover_overstock_days is None
+
+    if use_defaults and not int(refresh or 0) and settings.enable_background_exception_scan:
+        from erpmco.utils.po_exception_scan import get_stored_exception_rows
+
+        stored = get_stored_exception_rows(po_name)
+        if stored is not None:
+            return stored
+
     po = frappe.get_doc("Purchase Order", po_name)
-    company = po.company
-    supplier = po.supplier
+    rows = scan_po_exception_rows(
+        po,
+        get_po_exception_inputs(po),
+        consumption_days=consumption_days if consumption_days is not None else settings.consumption_days,
+        price_var_thresh_pct=price_var_thresh_pct if price_var_thresh_pct is not None else settings.price_var_thresh_pct,
+        cover_overstock_days=cover_overstock_days if cover_overstock_days is not None else settings.cover_overstock_days,
+    )
+    return [r for r in rows if r["has_exception"]]
 
-    # Branch + warehouse scoping
-    branch = getattr(po, "branch", None) or getattr(po, "custom_branch", None)
-    set_wh = getattr(po, "set_warehouse", None)
 
-    branch_whs = _get_branch_warehouses(company, branch)
+def get_exception_settings():
+    settings = frappe.get_cached_doc("Item 360 Settings")
+    return frappe._dict({
+        "consumption_days": int(settings.consumption_days or 180),
+        "price_var_thresh_pct": flt(settings.price_var_thresh_pct or 10.0),
+        "cover_overstock_days": flt(settings.cover_overstock_days or 90.0),
+        "enable_background_exception_scan": int(settings.enable_background_exception_scan or 0),
+    })
+
+
+def get_po_exception_inputs(po):
+    """The PO item rows as used by the exception scan."""
+    set_wh = getattr(po, "set_warehouse", None)
 
-    # Build list of item rows
     items = []
     for it in po.items:
         if not it.item_code:
@@ -737,10 +916,30 @@ def get_po_exception_items(
             "conversion_factor": flt(it.conversion_factor) or 1.0,
             "base_rate": flt(getattr(it, "base_rate", 0))  # v15 has base_rate on row
         })
+    return items
+
 
+def scan_po_exception_rows(
+    po,
+    items: list[dict],
+    consumption_days: int = 180,
+    price_var_thresh_pct: float = 10.0,
+    cover_overstock_days: float = 90.0,
+):
+    """
+    Computes exception metrics for the given PO item rows (all of them, flagged
+    with has_exception), so callers can rescan a subset of a PO.
+    """
     if not items:
         return []
 
+    company = po.company
+    supplier = po.supplier
+
+    # Branch + warehouse scoping
+    branch = getattr(po, "branch", None) or getattr(po, "custom_branch", None)
+    branch_whs = _get_branch_warehouses(company, branch)
+
     # Precompute consumption window dates
     consumption_days = int(consumption_days or 180)
     to_date = getdate(nowdate())
@@ -759,9 +958,15 @@ def get_po_exception_items(
     cons_map = _get_consumption_map(company, item_codes, from_date, to_date, branch_whs, fallback_wh=None)
 
     # For performance: fetch open PO qty for all items in ONE query (excluding current PO) (scoped)
-    open_po_map = _get_open_po_map(company, item_codes, po_name, branch_whs)
+    open_po_map = _get_open_po_map(company, item_codes, po.name, branch_whs)
+
+    # Lead-time distribution for this supplier from the statistics store
+    lead_time_map = {
+        code: summarize_samples(samples)
+        for code, samples in get_lead_time_samples(company, item_codes, branch, supplier=supplier).items()
+    } if supplier else {}
 
-    exception_rows = []
+    scanned_rows = []
 
     for row in items:
         code = row["item_code"]
@@ -785,33 +990,39 @@ def get_po_exception_items(
             price_exception = abs(price_variance_pct) > flt(price_var_thresh_pct)
 
         has_exception = price_exception or cover_exception or supplier_exception
+        lead = lead_time_map.get(code) or {}
 
-        if has_exception:
-            exception_rows.append({
-                "po_detail": row["name"],
-                "item_code": code,
-                "item_name": row["item_name"],
-                "warehouse": row["warehouse"],
-                "qty": row["qty"],
-                "uom": row["uom"],
+        scanned_rows.append({
+            "po_detail": row["name"],
+            "item_code": code,
+            "item_name": row["item_name"],
+            "warehouse": row["warehouse"],
+            "qty": row["qty"],
+            "uom": row["uom"],
 
-                "total_stock": total_stock,
-                "avg_per_day": avg_per_day,
-                "open_po_qty": open_po_qty,
-                "cover_post_days": cover_post,
-
-                "last_purchase_base_per_stock": last_base,
-                "po_base_per_stock": po_base_per_stock,
-                "price_variance_pct": price_variance_pct,
+            "total_stock": total_stock,
+            "avg_per_day": avg_per_day,
+            "open_po_qty": open_po_qty,
+            "cover_post_days": cover_post,
 
-                "price_exception": price_exception,
-                "cover_exception": cover_exception,
-                "supplier_exception": supplier_exception,
-                "supplier_disabled": bool(supplier_info.get("disabled")),
-                "supplier_on_hold": bool(supplier_info.get("on_hold")),
-            })
+            "last_purchase_base_per_stock": last_base,
+            "po_base_per_stock": po_base_per_stock,
+            "price_variance_pct": price_variance_pct,
+
+            "has_exception": has_exception,
+            "price_exception": price_exception,
+            "cover_exception": cover_exception,
+            "supplier_exception": supplier_exception,
+            "supplier_disabled": bool(supplier_info.get("disabled")),
+            "supplier_on_hold": bool(supplier_info.get("on_hold")),
+
+            "lead_time_avg_days": lead.get("avg_days"),
+            "lead_time_p50_days": lead.get("p50_days"),
+            "lead_time_p90_days": lead.get("p90_days"),
+            "lead_time_n": lead.get("n", 0),
+        })
 
-    return exception_rows
+    return scanned_rows
 
 
 def _get_last_purchase_map(company: str, item_codes: list[str], supplier=None, warehouse=None, branch_whs=None):
@@ -827,13 +1038,7 @@ def _get_last_purchase_map(company: str, item_codes: list[str], supplier=None, w
     out = {}  # item_code -> base_rate_per_stock_uom
 
     def wh_cond(alias: str, params: dict):
-        if branch_whs:
-            params["whs"] = tuple(branch_whs)
-            return f" AND {alias}.warehouse IN %(whs)s"
-        if warehouse:
-            params["warehouse"] = warehouse
-            return f" AND {alias}.warehouse = %(warehouse)s"
-        return ""
+        return _warehouse_condition(alias, warehouse, branch_whs or [], params)
 
     # 1) Purchase Invoice (latest first)
     params = {"company": company, "item_codes": tuple(item_codes)}
@@ -937,10 +1142,7 @@ def _get_stock_map(company: str, item_codes: list[str], branch_whs: list[str], f
     if not item_codes:
         return {}
     params = {"company": company, "item_codes": tuple(item_codes)}
-    wh_cond = ""
-    if branch_whs:
-        params["whs"] = tuple(branch_whs)
-        wh_cond = " AND b.warehouse IN %(whs)s"
+    wh_cond = _warehouse_condition("b", fallback_wh, branch_whs, params)
 
     rows = frappe.db.sql(
         f"""
@@ -959,10 +1161,7 @@ def _get_consumption_map(company: str, item_codes: list[str], from_date, to_date
     if not item_codes:
         return {}
     params = {"company": company, "item_codes": tuple(item_codes), "from_date": from_date, "to_date": to_date}
-    wh_cond = ""
-    if branch_whs:
-        params["whs"] = tuple(branch_whs)
-        wh_cond = " AND sle.warehouse IN %(whs)s"
+    wh_cond = _warehouse_condition("sle", fallback_wh, branch_whs, params)
 
     rows = frappe.db.sql(
         f"""
@@ -983,14 +1182,11 @@ def _get_consumption_map(company: str, item_codes: list[str], from_date, to_date
     return {r["item_code"]: (flt(r["total_out_qty"]) / period_days) for r in rows}
 
 
-def _get_open_po_map(company: str, item_codes: list[str], exclude_po: str, branch_whs: list[str]):
+def _get_open_po_map(company: str, item_codes: list[str], exclude_po: str | None, branch_whs: list[str]):
     if not item_codes:
         return {}
-    params = {"company": company, "item_codes": tuple(item_codes), "exclude_po": exclude_po}
-    wh_cond = ""
-    if branch_whs:
-        params["whs"] = tuple(branch_whs)
-        wh_cond = " AND poi.warehouse IN %(whs)s"
+    params = {"company": company, "item_codes": tuple(item_codes), "exclude_po": exclude_po or ""}
+    wh_cond = _warehouse_condition("poi", None, branch_whs, params)
 
     rows = frappe.db.sql(
         f"""
@@ -1010,3 +1206,27 @@ def _get_open_po_map(company: str, item_codes: list[str], exclude_po: str, branc
         params, as_dict=True
     )
     return {r["item_code"]: flt(r["open_qty"]) for r in rows}
+
+
+def _get_reorder_map(item_codes: list[str], branch_whs: list[str], fallback_wh=None):
+    """Returns {item_code: {"reorder_level": .., "reorder_qty": ..}} summed over the scoped warehouses."""
+    if not item_codes:
+        return {}
+    params = {"item_codes": tuple(item_codes)}
+    wh_cond = _warehouse_condition("ir", fallback_wh, branch_whs, params)
+
+    rows = frappe.db.sql(
+        f"""
+        SELECT
+          ir.parent AS item_code,
+          SUM(ir.warehouse_reorder_level) AS reorder_level,
+          SUM(ir.warehouse_reorder_qty) AS reorder_qty
+        FROM `tabItem Reorder` ir
+        WHERE ir.parenttype = 'Item'
+          AND ir.parent IN %(item_codes)s
+          {wh_cond}
+        GROUP BY ir.parent
+        """,
+        params, as_dict=True
+    )
+    return {r["item_code"]: {"reorder_level": flt(r["reorder_level"]), "reorder_qty": flt(r["reorder_qty"])} for r in rows}
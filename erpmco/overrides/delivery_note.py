@@ -1,3 +1,5 @@
+from functools import partial
+
 import frappe
 from erpnext.stock.doctype.delivery_note.delivery_note import DeliveryNote
 from frappe.utils import cint, flt, nowdate, nowtime, parse_json
@@ -16,81 +18,20 @@ def get_delivery_note_items_from_reserved_stock(doc,details):
         if not details:
             frappe.throw("No entries selected.")
 
-        items = []
+        lines, taxes_by_template = get_reserved_stock_lines(details)
+
         taxes_and_charges = None
         taxes = []
-
-        for d in details:
-            # Fetch Stock Reservation Entry
-            sre = frappe.get_doc("Stock Reservation Entry", d["stock_reservation_entry"])
-
-            # Fetch additional item details from Sales Order Item
-            so_item_data = frappe.db.sql("""
-                SELECT 
-                    is_free_item, grant_commission, item_name, rate, amount
-                FROM `tabSales Order Item`
-                WHERE name = %s
-            """, (d["sales_order_item"],), as_dict=True)
-
-            if so_item_data:
-                so_item = so_item_data[0]
-
-                # Build item dictionary
-                item = frappe._dict({
-                    "item_code": d["item_code"],
-                    "qty": d["qty"],
-                    "stock_qty": d["stock_qty"],
-                    "use_serial_batch_fields": 0,
-                    "conversion_factor": d["conversion_factor"],
-                    "stock_uom": d["stock_uom"],
-                    "uom": d["uom"],
-                    "against_sales_order": d["sales_order"],
-                    "so_detail": d["sales_order_item"],
-                    "is_free_item": so_item.get("is_free_item"),
-                    "grant_commission": so_item.get("grant_commission"),
-                    "item_name": so_item.get("item_name"),
-                    "rate": so_item.get("rate"),
-                    "amount": so_item.get("amount"),
-                    "parenttype": "Delivery Note",
-                    "warehouse": sre.warehouse,
-                })
-
-                # Process batches from Stock Reservation Entry
-                #batches = []
-                #for idx, b in enumerate(sre.sb_entries, start=1):
-                #    batches.append({
-                #        "batch_no": b.batch_no,
-                #        "idx": idx,
-                #        "name": f"row {idx}",
-                #        "qty": b.qty,
-                #    })
-
-
-                # Add serial and batch ledger data
-                #sb_doc = add_serial_batch_ledgers(batches, item, doc, sre.warehouse)
-                #item.update({
-                #    "serial_and_batch_bundle": sb_doc.name,
-                #    "warehouse": sb_doc.warehouse,
-                #})
-
-                items.append(item)
-
-            # Check and fetch taxes from the Sales Order
-            sales_order = frappe.get_doc("Sales Order", d["sales_order"])
-            if sales_order.taxes_and_charges and not taxes_and_charges:
-                taxes_and_charges = sales_order.taxes_and_charges
-
-                # Fetch taxes using SQL query
-                taxes = frappe.db.sql("""
-                    SELECT 
-                        charge_type, account_head, description, rate, tax_amount, included_in_print_rate
-                    FROM `tabSales Taxes and Charges`
-                    WHERE parent = %s
-                """, (d["sales_order"],), as_dict=True)
+        # Taxes come from the first selected Sales Order that has a template
+        for line in lines:
+            if line.taxes_and_charges:
+                taxes_and_charges = line.taxes_and_charges
+                taxes = taxes_by_template.get(taxes_and_charges, [])
+                break
 
         # Consolidated data to return
         data = {
-            "items": items,
+            "items": [line.item for line in lines],
             "taxes_and_charges": taxes_and_charges,
             "taxes": taxes,
         }
@@ -101,13 +42,344 @@ def get_delivery_note_items_from_reserved_stock(doc,details):
         frappe.throw(f"An error occurred while creating Delivery Notes: {str(e)}")
 
 
+@frappe.whitelist()
+def make_delivery_notes_from_reserved_stock(details, insert=0):
+    """
+    Builds one Delivery Note per (company, customer, warehouse, tax template) from
+    selected reservations (rows of fetch_reserved_stock). Returns the documents,
+    or the names of the inserted drafts when insert is set.
+    """
+    if isinstance(details, str):
+        details = frappe.parse_json(details)
+    if not details:
+        frappe.throw("No entries selected.")
+
+    delivery_notes = build_delivery_notes(details)
+    if not cint(insert):
+        return delivery_notes
+
+    names = []
+    for dn in delivery_notes:
+        dn_doc = frappe.get_doc(dn)
+        dn_doc.insert()
+        names.append(dn_doc.name)
+    return names
+
+
+BULK_DELIVERY_NOTE_CHUNK_SIZE = 20
+
+
+@frappe.whitelist()
+def enqueue_bulk_delivery_notes(details):
+    """
+    Queues the creation of draft Delivery Notes for many customers' reservations
+    (rows as returned by fetch_reserved_stock). Progress is published to the caller.
+    """
+    if isinstance(details, str):
+        details = frappe.parse_json(details)
+    if not details:
+        frappe.throw("No entries selected.")
+
+    frappe.enqueue(
+        "erpmco.overrides.delivery_note.create_bulk_delivery_notes",
+        queue="long",
+        timeout=3600,
+        details=details,
+        user=frappe.session.user,
+    )
+    return {"queued": True, "lines": len(details)}
+
+
+def create_bulk_delivery_notes(details, user=None, chunk_size=BULK_DELIVERY_NOTE_CHUNK_SIZE):
+    """
+    Creates the draft Delivery Notes, committing every chunk_size notes. Each
+    line gets one Serial and Batch Bundle built from its reservation's batches.
+    A failing note is rolled back and logged without stopping the others.
+    """
+    details = [_normalize_reserved_stock_row(d) for d in details]
+    lines, taxes_by_template = get_reserved_stock_lines(details)
+    delivery_notes = group_delivery_note_lines(lines, taxes_by_template)
+    sb_entries = _get_reserved_batches({line.stock_reservation_entry for line in lines})
+
+    created, failed = [], []
+    total = len(delivery_notes)
+    for start in range(0, total, chunk_size):
+        for dn, dn_lines in delivery_notes[start:start + chunk_size]:
+            frappe.db.savepoint("bulk_delivery_note")
+            try:
+                created.append(_insert_bulk_delivery_note(dn, dn_lines, sb_entries))
+            except Exception:
+                frappe.db.rollback(save_point="bulk_delivery_note")
+                frappe.log_error(frappe.get_traceback(), "Bulk Delivery Note Creation Error")
+                failed.append(dn.customer)
+
+        frappe.db.commit()
+        done = min(start + chunk_size, total)
+        frappe.publish_progress(
+            done * 100 / total,
+            title="Creating Delivery Notes",
+            description=f"{done}/{total}",
+        )
+
+    frappe.publish_realtime(
+        "msgprint",
+        f"{len(created)} Delivery Note(s) created, {len(failed)} failed"
+        + (f" ({', '.join(sorted(set(failed)))})" if failed else ""),
+        user=user or frappe.session.user,
+    )
+    return {"created": created, "failed": failed}
+
+
+def _insert_bulk_delivery_note(dn, dn_lines, sb_entries):
+    dn_doc = frappe.get_doc(dn)
+    parent = frappe._dict({
+        "doctype": "Delivery Note",
+        "company": dn_doc.company,
+        "posting_date": dn_doc.posting_date or nowdate(),
+        "posting_time": dn_doc.posting_time or nowtime(),
+        "is_return": 0,
+    })
+    for item, line in zip(dn_doc.items, dn_lines):
+        batches = _take_reserved_batches(sb_entries.get(line.stock_reservation_entry), flt(item.stock_qty))
+        if not batches:
+            continue
+
+        bundle = add_serial_batch_ledgers(batches, frappe._dict(item.as_dict()), parent, item.warehouse)
+        item.serial_and_batch_bundle = bundle.name
+
+    dn_doc.insert()
+    return dn_doc.name
+
+
+def _get_reserved_batches(sre_names):
+    """{stock_reservation_entry: [batch rows with remaining qty]} in one query."""
+    if not sre_names:
+        return {}
+
+    out = {}
+    for row in frappe.db.sql("""
+        SELECT parent, batch_no, serial_no, qty - delivered_qty AS qty
+        FROM `tabSerial and Batch Entry`
+        WHERE parenttype = 'Stock Reservation Entry'
+          AND parent IN %(sres)s
+          AND qty > delivered_qty
+        ORDER BY parent, idx
+    """, {"sres": tuple(sre_names)}, as_dict=True):
+        row.qty = flt(row.qty)
+        out.setdefault(row.parent, []).append(row)
+    return out
+
+
+def _take_reserved_batches(entries, stock_qty):
+    """Consumes stock_qty from a reservation's batches, FIFO, across the lines sharing it."""
+    batches = []
+    for entry in entries or []:
+        if stock_qty <= 0:
+            break
+        if entry.qty <= 0:
+            continue
+
+        qty = min(entry.qty, stock_qty)
+        entry.qty -= qty
+        stock_qty -= qty
+        batches.append({
+            "idx": len(batches) + 1,
+            "name": f"row {len(batches) + 1}",
+            "batch_no": entry.batch_no,
+            "serial_no": entry.serial_no,
+            "qty": qty,
+        })
+    return batches
+
+
+def _normalize_reserved_stock_row(d):
+    """Accepts fetch_reserved_stock rows as well as picker selections."""
+    d = frappe._dict(d)
+    d.uom = d.get("uom") or d.get("custom_uom")
+    d.conversion_factor = d.get("conversion_factor") or d.get("custom_conversion_factor")
+    return d
+
+
+def build_delivery_notes(details):
+    lines, taxes_by_template = get_reserved_stock_lines(details)
+    return [dn for dn, _lines in group_delivery_note_lines(lines, taxes_by_template)]
+
+
+def group_delivery_note_lines(lines, taxes_by_template):
+    """[(delivery note dict, its lines)], one note per (company, customer, warehouse, tax template)."""
+    groups = {}
+    for line in lines:
+        key = (line.company, line.customer, line.item.warehouse, line.taxes_and_charges)
+        groups.setdefault(key, []).append(line)
+
+    delivery_notes = []
+    for (company, customer, warehouse, taxes_and_charges), group_lines in groups.items():
+        delivery_notes.append((frappe._dict({
+            "doctype": "Delivery Note",
+            "company": company,
+            "customer": customer,
+            "set_warehouse": warehouse,
+            "taxes_and_charges": taxes_and_charges,
+            "taxes": [dict(t) for t in taxes_by_template.get(taxes_and_charges, [])],
+            "items": [line.item for line in group_lines],
+        }), group_lines))
+    return delivery_notes
+
+
+def get_reserved_stock_lines(details):
+    """
+    Delivery Note lines for selected reservations, in three queries whatever the
+    selection size: the reservations, their Sales Order Items (with the order
+    header) and the taxes of each tax template used.
+    Returns (lines, {taxes_and_charges: [tax rows]}).
+    """
+    sre_names = list({d["stock_reservation_entry"] for d in details})
+    so_item_names = list({d["sales_order_item"] for d in details})
+
+    sre_map = {
+        r.name: r
+        for r in frappe.get_all(
+            "Stock Reservation Entry",
+            filters={"name": ["in", sre_names]},
+            fields=["name", "warehouse", "voucher_no", "voucher_detail_no"],
+        )
+    }
 
+    so_item_map = {
+        r.name: r
+        for r in frappe.db.sql("""
+            SELECT
+                soi.name, soi.is_free_item, soi.grant_commission, soi.item_name, soi.rate, soi.amount,
+                so.name AS sales_order, so.company, so.customer, so.taxes_and_charges
+            FROM `tabSales Order Item` soi
+            INNER JOIN `tabSales Order` so ON so.name = soi.parent
+            WHERE soi.name IN %(so_items)s
+        """, {"so_items": tuple(so_item_names)}, as_dict=True)
+    }
 
+    lines = []
+    template_source = {}
+    for d in details:
+        so_item = so_item_map.get(d["sales_order_item"])
+        sre = sre_map.get(d["stock_reservation_entry"])
+        if not so_item or not sre:
+            continue
+
+        item = frappe._dict({
+            "item_code": d["item_code"],
+            "qty": d["qty"],
+            "stock_qty": d["stock_qty"],
+            "use_serial_batch_fields": 0,
+            "conversion_factor": d["conversion_factor"],
+            "stock_uom": d["stock_uom"],
+            "uom": d["uom"],
+            "against_sales_order": d["sales_order"],
+            "so_detail": d["sales_order_item"],
+            "is_free_item": so_item.get("is_free_item"),
+            "grant_commission": so_item.get("grant_commission"),
+            "item_name": so_item.get("item_name"),
+            "rate": so_item.get("rate"),
+            "amount": so_item.get("amount"),
+            "parenttype": "Delivery Note",
+            "warehouse": sre.warehouse,
+        })
+        lines.append(frappe._dict({
+            "item": item,
+            "stock_reservation_entry": sre.name,
+            "company": so_item.company,
+            "customer": so_item.customer,
+            "taxes_and_charges": so_item.taxes_and_charges,
+        }))
+        if so_item.taxes_and_charges:
+            template_source.setdefault(so_item.taxes_and_charges, so_item.sales_order)
+
+    taxes_by_template = {}
+    if template_source:
+        source_template = {so: template for template, so in template_source.items()}
+        for tax in frappe.db.sql("""
+            SELECT
+                parent, charge_type, account_head, description, rate, tax_amount, included_in_print_rate
+            FROM `tabSales Taxes and Charges`
+            WHERE parent IN %(sales_orders)s AND parenttype = 'Sales Order'
+            ORDER BY parent, idx
+        """, {"sales_orders": tuple(source_template)}, as_dict=True):
+            template = source_template[tax.pop("parent")]
+            taxes_by_template.setdefault(template, []).append(tax)
+
+    return lines, taxes_by_template
+
+
+
+
+
+
+RESERVED_STOCK_CACHE_PREFIX = "erpmco:reserved_stock:"
+# Safety net for changes that fire no doc event (e.g. closing a Sales Order)
+RESERVED_STOCK_CACHE_TTL = 600
 
 
 @frappe.whitelist()
 def fetch_reserved_stock(customer=None):
-    # 1) Draft DN quantities grouped by (so_detail, item_code, warehouse)
+    return get_reserved_stock(customer)
+
+
+@frappe.whitelist()
+def fetch_reserved_stock_page(customer, start=0, page_length=100):
+    """Paginated reserved-stock picker rows for a customer, oldest reservations first."""
+    rows = get_reserved_stock(customer)
+    start = cint(start)
+    page_length = cint(page_length) or 100
+    return {
+        "total": len(rows),
+        "rows": rows[start:start + page_length],
+    }
+
+
+def get_reserved_stock(customer):
+    """Reserved stock of a customer net of draft Delivery Notes, cached until an SRE / DN of the customer changes."""
+    if not customer:
+        return []
+
+    key = RESERVED_STOCK_CACHE_PREFIX + customer
+    rows = frappe.cache().get_value(key)
+    if rows is None:
+        rows = _compute_reserved_stock(customer)
+        frappe.cache().set_value(key, rows, expires_in_sec=RESERVED_STOCK_CACHE_TTL)
+    return rows
+
+
+def clear_reserved_stock_cache(doc, method=None):
+    """Delivery Note / Stock Reservation Entry events: drop the picker cache of the customers involved."""
+    customers = set()
+    if doc.doctype == "Delivery Note":
+        customers.add(doc.customer)
+        sales_orders = {d.against_sales_order for d in doc.get("items") if d.against_sales_order}
+    else:
+        sales_orders = {doc.voucher_no} if doc.voucher_type == "Sales Order" else set()
+
+    if sales_orders:
+        customers.update(frappe.get_all(
+            "Sales Order", filters={"name": ["in", list(sales_orders)]}, pluck="customer"
+        ))
+
+    keys = [RESERVED_STOCK_CACHE_PREFIX + customer for customer in customers if customer]
+    if keys:
+        # Once committed: a picker read before then would cache the old reservations again
+        frappe.db.after_commit.add(partial(frappe.cache().delete_value, keys))
+
+
+def _compute_reserved_stock(customer):
+    # 0) SO lines of the customer with an open reservation balance
+    so_items = frappe.get_all(
+        "Reservation Balance",
+        filters={"customer": customer, "balance_qty": [">", 0]},
+        pluck="sales_order_item",
+        distinct=True,
+    )
+    if not so_items:
+        return []
+
+    # 1) Draft DN quantities grouped by (so_detail, item_code, warehouse), only for those SO lines
     draft_delivery = frappe.db.sql("""
         SELECT
             dni.so_detail,
@@ -117,16 +389,16 @@ def fetch_reserved_stock(customer=None):
         FROM `tabDelivery Note Item` dni
         INNER JOIN `tabDelivery Note` dn ON dn.name = dni.parent
         WHERE dn.docstatus = 0
-          AND dni.so_detail IS NOT NULL
+          AND dni.so_detail IN %(so_items)s
         GROUP BY dni.so_detail, dni.item_code, dni.warehouse
-    """, as_dict=True)
+    """, {"so_items": tuple(so_items)}, as_dict=True)
 
     draft_map = {
         (row.so_detail, row.item_code, row.warehouse): flt(row.qty)
         for row in draft_delivery
     }
 
-    # 2) Your main query (unchanged)
+    # 2) Open reservations of those SO lines
     query = """
         SELECT
             SUM(sre.custom_so_reserved_qty - sre.delivered_qty / sre.custom_conversion_factor) AS qty,
@@ -139,9 +411,10 @@ def fetch_reserved_stock(customer=None):
         INNER JOIN `tabSales Order` so ON so.name = sre.voucher_no
         INNER JOIN `tabItem` i ON i.name = sre.item_code
         WHERE
-            sre.reserved_qty > sre.delivered_qty
+            sre.voucher_detail_no IN %(so_items)s
+            AND sre.reserved_qty > sre.delivered_qty
             AND sre.docstatus = 1
-            AND so.customer = %s
+            AND so.customer = %(customer)s
             AND sre.status NOT IN ("Delivered", "Cancelled")
             AND sre.voucher_type = 'Sales Order'
             AND so.status NOT IN ("Delivered", "Cancelled", "Closed")
@@ -150,7 +423,7 @@ def fetch_reserved_stock(customer=None):
             sre.voucher_detail_no, sre.name, sre.custom_conversion_factor
         ORDER BY creation ASC
     """
-    raw_result = frappe.db.sql(query, customer, as_dict=True)
+    raw_result = frappe.db.sql(query, {"customer": customer, "so_items": tuple(so_items)}, as_dict=True)
 
     # 3) Allocate draft qty across reservations (FIFO)
     # Group rows by the same key used in draft_map
@@ -178,6 +451,6 @@ def fetch_reserved_stock(customer=None):
                 row["qty"] = available
                 final_result.append(row)
 
+    # Oldest reservations first across keys, so pages are stable
+    final_result.sort(key=lambda r: (r.get("creation") or "", r["stock_reservation_entry"]))
     return final_result
-
-
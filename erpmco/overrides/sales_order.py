@@ -1,6 +1,7 @@
 import frappe
 from erpnext.selling.doctype.sales_order.sales_order import SalesOrder
-from erpnext.stock.stock_balance import get_reserved_qty, update_bin_qty
+
+from erpmco.utils.reservation import unreserve_sales_orders, update_bins_reserved_qty
 
 class CustomSalesOrder(SalesOrder):
     def update_reserved_qty(self, so_item_rows=None):
@@ -9,16 +10,16 @@ class CustomSalesOrder(SalesOrder):
         if self.status == "Closed":
             self._unreserve_all_stock_entries()
 
-        item_wh_list = []
+        item_wh_list = set()
 
         def _valid_for_reserve(item_code, warehouse):
             if (
                 item_code
                 and warehouse
-                and [item_code, warehouse] not in item_wh_list
+                and (item_code, warehouse) not in item_wh_list
                 and frappe.get_cached_value("Item", item_code, "is_stock_item")
             ):
-                item_wh_list.append([item_code, warehouse])
+                item_wh_list.add((item_code, warehouse))
 
         for d in self.get("items"):
             if (not so_item_rows or d.name in so_item_rows) and not d.delivered_by_supplier:
@@ -29,47 +30,24 @@ class CustomSalesOrder(SalesOrder):
                 else:
                     _valid_for_reserve(d.item_code, d.warehouse)
 
-        for item_code, warehouse in item_wh_list:
-            update_bin_qty(item_code, warehouse, {"reserved_qty": get_reserved_qty(item_code, warehouse)})
+        pending = frappe.flags.deferred_reservation_updates
+        if pending is not None:
+            pending.reserved_bins.update(item_wh_list)
+        else:
+            update_bins_reserved_qty(item_wh_list)
 
     def _unreserve_all_stock_entries(self):
-        """Annule toutes les réservations pour ce Sales Order (y compris partiellement livrées)
-        en utilisant SQL pour détecter, mais cancel() pour exécuter toute la logique liée.
+        """Annule toutes les réservations pour ce Sales Order (y compris partiellement livrées).
+        cancel() exécute toute la logique liée, mais les Bins ne sont recalculés
+        qu'une fois par (article, entrepôt) via erpmco.utils.reservation.
         """
-        from frappe.utils import flt
-
-        # Détection rapide via SQL
-        sre_names = frappe.db.sql("""
-            SELECT name
-            FROM `tabStock Reservation Entry`
-            WHERE voucher_no = %s
-            AND voucher_type = 'Sales Order'
-            AND status NOT IN ('Delivered', 'Cancelled')
-            AND docstatus = 1
-            AND reserved_qty > delivered_qty
-        """, (self.name,), as_dict=False)
-
-        if not sre_names:
+        # Rien à annuler si le solde de réservation est nul
+        if not frappe.db.exists("Reservation Balance", {"sales_order": self.name, "balance_qty": [">", 0]}):
             return
 
-        cancelled_count = 0
-        for (sre_name,) in sre_names:
-            try:
-                doc = frappe.get_doc("Stock Reservation Entry", sre_name)
-                doc.cancel()  # Exécute toute la logique standard
-                cancelled_count += 1
-            except Exception:
-                frappe.log_error(frappe.get_traceback(), f"Error cancelling SRE {sre_name}")
-
+        cancelled_count = unreserve_sales_orders([self.name])
         frappe.logger().info(f"[SO {self.name}] Unreserved {cancelled_count} Stock Reservation Entries.")
 
-        # Rafraîchir les qty dans les bins
-        for row in self.get("items"):
-            if frappe.get_cached_value("Item", row.item_code, "is_stock_item") and row.warehouse:
-                update_bin_qty(row.item_code, row.warehouse, {
-                    "reserved_qty": get_reserved_qty(row.item_code, row.warehouse)
-                })
-
 
 def create_allocation(doc, method):
     try:
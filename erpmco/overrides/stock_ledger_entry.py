@@ -1,6 +1,7 @@
 import frappe
 from erpnext.stock.doctype.stock_ledger_entry.stock_ledger_entry import StockLedgerEntry
 from erpmco.erpmco.doctype.allocation.allocation import process_shortages
+from erpmco.erpmco.doctype.shortage.shortage import has_open_shortage
 
 class CustomStockLedgerEntry(StockLedgerEntry):
     pass
@@ -12,5 +13,5 @@ class CustomStockLedgerEntry(StockLedgerEntry):
         # Check if the entry is an incoming stock
         #frappe.throw(str(self.actual_qty))
         if self.actual_qty > 0:  # Assuming incoming stock has positive actual_qty
-            if frappe.db.exists("Shortage", {"docstatus": 1, "item_code": self.item_code}):
+            if has_open_shortage(self.item_code):
                 process_shortages(self.item_code)
\ No newline at end of file
@@ -15,6 +15,14 @@ class CustomStockReservationEntry(StockReservationEntry):
         self.auto_reserve_serial_and_batch()
         #self.validate_reservation_based_on_serial_and_batch()
 
+    def on_submit(self) -> None:
+        super().on_submit()
+        self.update_reservation_balance()
+
+    def on_cancel(self) -> None:
+        super().on_cancel()
+        self.update_reservation_balance()
+
     def on_update_after_submit(self) -> None:
         self.can_be_updated()
         self.validate_uom_is_integer()
@@ -26,8 +34,31 @@ class CustomStockReservationEntry(StockReservationEntry):
         self.update_reserved_qty_in_voucher()
         self.update_status()
         self.update_reserved_stock_in_bin()
+        self.update_reservation_balance()
         self.reload()
 
+    def update_reserved_stock_in_bin(self) -> None:
+        # Bulk unreserve (erpmco.utils.reservation) recomputes each Bin once at the end
+        pending = frappe.flags.deferred_reservation_updates
+        if pending is not None:
+            pending.stock_bins.add((self.item_code, self.warehouse))
+            return
+
+        super().update_reserved_stock_in_bin()
+
+    def update_reservation_balance(self) -> None:
+        """Keeps the Reservation Balance of the Sales Order Item in step with this entry."""
+        from erpmco.utils.reservation_balance import refresh_reservation_balances
+
+        if self.voucher_type != "Sales Order" or not self.voucher_detail_no:
+            return
+
+        pending = frappe.flags.deferred_reservation_updates
+        if pending is not None:
+            pending.so_items.add(self.voucher_detail_no)
+        else:
+            refresh_reservation_balances([self.voucher_detail_no])
+
 
     def validate_with_allowed_qty_2(self, qty_to_be_reserved: float) -> None:
         """Validates `Reserved Qty` with `Max Reserved Qty`."""
@@ -0,0 +1,6 @@
+import frappe
+
+
+def execute():
+    # Sales Delivery by Transporter filters submitted notes by date and groups by transporter
+    frappe.db.add_index("Delivery Note", ["docstatus", "posting_date", "transporter_name"], "docstatus_posting_date_transporter")
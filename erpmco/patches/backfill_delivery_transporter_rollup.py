@@ -0,0 +1,5 @@
+from erpmco.utils.transporter_rollup import rebuild_transporter_rollup
+
+
+def execute():
+    rebuild_transporter_rollup()
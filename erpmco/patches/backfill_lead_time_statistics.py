@@ -0,0 +1,5 @@
+from erpmco.utils.lead_time import rebuild_lead_time_statistics
+
+
+def execute():
+    rebuild_lead_time_statistics()
@@ -0,0 +1,5 @@
+from erpmco.utils.reservation_balance import reconcile_reservation_balances
+
+
+def execute():
+    reconcile_reservation_balances()
@@ -0,0 +1,5 @@
+from erpmco.utils.sales_fact import rebuild_sales_facts
+
+
+def execute():
+    rebuild_sales_facts()
@@ -0,0 +1,25 @@
+import frappe
+
+
+def execute():
+    # Runs before the unique (posting_date, transporter_name, branch, item_code) index
+    # is added on model sync. Rows of duplicated keys are dropped; the post-sync
+    # backfill rewrites them.
+    if not frappe.db.table_exists("Delivery Transporter Rollup"):
+        return
+
+    frappe.db.sql(
+        """
+        DELETE r
+        FROM `tabDelivery Transporter Rollup` r
+        INNER JOIN (
+            SELECT posting_date, transporter_name, branch, item_code
+            FROM `tabDelivery Transporter Rollup`
+            GROUP BY posting_date, transporter_name, branch, item_code
+            HAVING COUNT(*) > 1
+        ) d ON d.posting_date = r.posting_date
+            AND d.transporter_name = r.transporter_name
+            AND d.branch <=> r.branch
+            AND d.item_code = r.item_code
+        """
+    )
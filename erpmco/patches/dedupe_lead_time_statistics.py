@@ -0,0 +1,26 @@
+import frappe
+
+
+def execute():
+    # Runs before the unique (company, item_code, supplier, branch) index is added on
+    # model sync. Receipts without a branch are keyed on "" so the index covers them;
+    # rows of duplicated keys are dropped and the post-sync backfill rewrites them.
+    if not frappe.db.table_exists("Lead Time Statistic"):
+        return
+
+    frappe.db.sql("UPDATE `tabLead Time Statistic` SET branch = '' WHERE branch IS NULL")
+    frappe.db.sql(
+        """
+        DELETE s
+        FROM `tabLead Time Statistic` s
+        INNER JOIN (
+            SELECT company, item_code, supplier, branch
+            FROM `tabLead Time Statistic`
+            GROUP BY company, item_code, supplier, branch
+            HAVING COUNT(*) > 1
+        ) d ON d.company = s.company
+            AND d.item_code = s.item_code
+            AND d.supplier = s.supplier
+            AND d.branch = s.branch
+        """
+    )
@@ -0,0 +1,21 @@
+import frappe
+
+
+def execute():
+    # Runs before the unique (sales_order_item, warehouse) index is added on model sync.
+    # Rows of duplicated keys are dropped; the post-sync reconcile rewrites them.
+    if not frappe.db.table_exists("Reservation Balance"):
+        return
+
+    frappe.db.sql(
+        """
+        DELETE rb
+        FROM `tabReservation Balance` rb
+        INNER JOIN (
+            SELECT sales_order_item, warehouse
+            FROM `tabReservation Balance`
+            GROUP BY sales_order_item, warehouse
+            HAVING COUNT(*) > 1
+        ) d ON d.sales_order_item = rb.sales_order_item AND d.warehouse = rb.warehouse
+        """
+    )
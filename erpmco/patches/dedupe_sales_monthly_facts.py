@@ -0,0 +1,21 @@
+import frappe
+
+
+def execute():
+    # Runs before the unique (month, branch, item_code) index is added on model sync.
+    # Rows of duplicated keys are dropped; the post-sync backfill rewrites them.
+    if not frappe.db.table_exists("Sales Monthly Fact"):
+        return
+
+    frappe.db.sql(
+        """
+        DELETE f
+        FROM `tabSales Monthly Fact` f
+        INNER JOIN (
+            SELECT month, branch, item_code
+            FROM `tabSales Monthly Fact`
+            GROUP BY month, branch, item_code
+            HAVING COUNT(*) > 1
+        ) d ON d.month = f.month AND d.branch = f.branch AND d.item_code = f.item_code
+        """
+    )
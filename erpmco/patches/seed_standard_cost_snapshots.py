@@ -0,0 +1,5 @@
+from erpmco.utils.standard_cost import rebuild_standard_cost_snapshots
+
+
+def execute():
+    rebuild_standard_cost_snapshots()
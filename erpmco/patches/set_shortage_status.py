@@ -0,0 +1,23 @@
+import frappe
+
+from erpmco.erpmco.doctype.shortage.shortage import rebuild_open_shortage_items
+
+
+def execute():
+    # process_shortages cancels the shortages it covers without zeroing them, but
+    # writes what is left short on the Allocation Detail: a cancelled shortage whose
+    # detail has nothing left short was resolved rather than cancelled by hand
+    frappe.db.sql(
+        """
+        UPDATE `tabShortage` s
+        LEFT JOIN `tabAllocation Detail` ad ON ad.name = s.allocation_detail
+        SET s.status = CASE
+            WHEN s.docstatus = 0 THEN 'Draft'
+            WHEN s.docstatus = 1 AND s.shortage > 0 THEN 'Open'
+            WHEN s.docstatus = 1 THEN 'Resolved'
+            WHEN s.shortage <= 0 OR ad.shortage <= 0 THEN 'Resolved'
+            ELSE 'Cancelled'
+        END
+        """
+    )
+    rebuild_open_shortage_items()
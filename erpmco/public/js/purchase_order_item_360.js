@@ -64,10 +64,7 @@ grid.add_custom_button(__("Exception Items"), () => {
   frappe.call({
     method: "erpmco.item_360.get_po_exception_items",
     args: {
-      po_name: frm.doc.name,
-      consumption_days: 180,
-      price_var_thresh_pct: 10,
-      cover_overstock_days: 90
+      po_name: frm.doc.name
     },
     callback: (r) => {
       const rows = r.message || [];
@@ -93,6 +90,7 @@ function show_exception_items_dialog(frm, rows) {
       <td class="text-right">${frappe.format(x.open_po_qty || 0, {fieldtype:"Float"})}</td>
       <td class="text-right">${(x.cover_post_days != null) ? Number(x.cover_post_days).toFixed(1) : "-"}</td>
       <td class="text-right">${(x.price_variance_pct != null) ? Number(x.price_variance_pct).toFixed(2) + "%" : "-"}</td>
+      <td class="text-right">${(x.lead_time_p50_days != null) ? Number(x.lead_time_p50_days).toFixed(0) + " / " + Number(x.lead_time_p90_days).toFixed(0) : "-"}</td>
       <td>
         ${x.price_exception ? '<span class="indicator-pill red">Price</span>' : ''}
         ${x.cover_exception ? '<span class="indicator-pill orange">Cover</span>' : ''}
@@ -123,11 +121,12 @@ function show_exception_items_dialog(frm, rows) {
           <th class="text-right">Open PO</th>
           <th class="text-right">Cover Post (days)</th>
           <th class="text-right">Price Var</th>
+          <th class="text-right">Lead P50 / P90</th>
           <th>Exceptions</th>
         </tr>
       </thead>
       <tbody>
-        ${body || `<tr><td colspan="9" class="muted">No exception items found.</td></tr>`}
+        ${body || `<tr><td colspan="10" class="muted">No exception items found.</td></tr>`}
       </tbody>
     </table>
   `;
@@ -338,7 +337,7 @@ function show_item_360_dialog(item_code, data) {
       </div>
 
       <div class="tab" id="t2">
-        ${render_stock_replenishment_section(k, reorder, lead)}
+        ${render_stock_replenishment_section(k, reorder, lead, k.supplier_lead_time)}
       </div>
 
       <div class="tab" id="t3">
@@ -361,6 +360,28 @@ function show_item_360_dialog(item_code, data) {
   });
 
   d.show();
+
+  const series = (data.purchases && data.purchases.trend_series) ? data.purchases.trend_series : [];
+  render_rate_trend_chart(d.$wrapper.find(".rate-trend-chart")[0], series);
+}
+
+function render_rate_trend_chart(el, series) {
+  if (!el || !series.length) return;
+
+  new frappe.Chart(el, {
+    title: __("Monthly Rate (Base/Stock UOM)"),
+    type: "line",
+    height: 220,
+    data: {
+      labels: series.map(b => b.month),
+      datasets: [
+        { name: __("Min"), values: series.map(b => b.min_rate || 0) },
+        { name: __("Avg"), values: series.map(b => b.avg_rate || 0) },
+        { name: __("Max"), values: series.map(b => b.max_rate || 0) }
+      ]
+    },
+    lineOptions: { dotSize: 4 }
+  });
 }
 
 function render_purchases_section(purchases, trends, supplier_last, quotations, lastPurchase, supplierInfo) {
@@ -438,6 +459,7 @@ function render_purchases_section(purchases, trends, supplier_last, quotations,
       <thead><tr><th>Window</th><th class="text-right">Min</th><th class="text-right">Avg</th><th class="text-right">Max</th><th class="text-right">N</th></tr></thead>
       <tbody>${trendRows}</tbody>
     </table>
+    <div class="rate-trend-chart"></div>
 
     <h5>Supplier-wise Last Rate (Base/Stock UOM)</h5>
     <table class="table table-bordered table-sm">
@@ -453,7 +475,8 @@ function render_purchases_section(purchases, trends, supplier_last, quotations,
   `;
 }
 
-function render_stock_replenishment_section(k, reorder, lead) {
+function render_stock_replenishment_section(k, reorder, lead, supplier_lead) {
+  supplier_lead = supplier_lead || {};
   const stockRows = (k.stock_by_warehouse || []).map(r => `
     <tr>
       <td>${esc(r.warehouse)}</td>
@@ -508,8 +531,18 @@ function render_stock_replenishment_section(k, reorder, lead) {
 
     <h5>Lead Time Evidence (PO → PR linked only)</h5>
     <div class="muted" style="margin-bottom:6px;">
-      Avg: <b>${lead.avg_days != null ? lead.avg_days.toFixed(1) + " days" : "-"}</b> | Samples: <b>${esc(lead.n || 0)}</b>
+      Avg: <b>${lead.avg_days != null ? lead.avg_days.toFixed(1) + " days" : "-"}</b>
+      | P50: <b>${lead.p50_days != null ? lead.p50_days.toFixed(1) + " days" : "-"}</b>
+      | P90: <b>${lead.p90_days != null ? lead.p90_days.toFixed(1) + " days" : "-"}</b>
+      | Samples: <b>${esc(lead.n || 0)}</b>
     </div>
+    ${supplier_lead.n ? `
+    <div class="muted" style="margin-bottom:6px;">
+      This supplier: Avg <b>${supplier_lead.avg_days.toFixed(1)}</b>
+      | P50 <b>${supplier_lead.p50_days.toFixed(1)}</b>
+      | P90 <b>${supplier_lead.p90_days.toFixed(1)}</b> days
+      over <b>${esc(supplier_lead.n)}</b> receipts
+    </div>` : ""}
     <table class="table table-bordered table-sm">
       <thead><tr><th>PO</th><th>PO Date</th><th>PR</th><th>PR Date</th><th class="text-right">Days</th></tr></thead>
       <tbody>${samples || `<tr><td colspan="5" class="muted">No linked PO→PR samples found</td></tr>`}</tbody>
@@ -0,0 +1,33 @@
+const erpmco_sales_order_onload = frappe.listview_settings["Sales Order"]?.onload;
+
+frappe.listview_settings["Sales Order"] = Object.assign(frappe.listview_settings["Sales Order"] || {}, {
+  onload(listview) {
+    if (erpmco_sales_order_onload) erpmco_sales_order_onload(listview);
+
+    listview.page.add_action_item(__("Close and Unreserve"), () => {
+      const names = listview.get_checked_items(true);
+      if (!names.length) {
+        frappe.msgprint(__("Please select at least one Sales Order."));
+        return;
+      }
+
+      frappe.confirm(
+        __("Close {0} Sales Order(s) and cancel their stock reservations?", [names.length]),
+        () => {
+          frappe.call({
+            method: "erpmco.utils.reservation.close_sales_orders",
+            args: { names },
+            callback: (r) => {
+              if (r.message && r.message.queued) {
+                frappe.show_alert({
+                  message: __("Closing {0} Sales Order(s) in the background", [r.message.sales_orders]),
+                  indicator: "blue",
+                });
+              }
+            },
+          });
+        }
+      );
+    });
+  },
+});
@@ -0,0 +1,142 @@
+"""
+Coalesced background allocation.
+
+Submitting a Sales Order, or a finished-goods transfer, only records it in a
+Redis hash. A scheduler job drains the hash every minute and allocates what was
+queued in that window, per (company, branch), outside the submit transaction:
+queued orders are allocated together; transferred items are allocated against
+their open SO lines only, capped at the transferred quantities.
+
+Each (company, branch) has one standing Allocation (is_standing) whose details
+every run refreshes in place (Allocation.refresh_details), instead of creating
+a new document per run or rewriting the whole table.
+"""
+
+import frappe
+from frappe.utils import flt, now_datetime
+
+QUEUE_KEY = "erpmco:allocation_queue"
+ALLOCATION_BRANCHES = ("Kinshasa",)
+# Runs a failing entry is retried for before it is dropped (and logged)
+MAX_ATTEMPTS = 5
+FG_TRANSFER_TYPE = "Material Transfert"
+FG_PARENT_WAREHOUSE = "FG - MCO"
+
+
+def queue_sales_order_allocation(doc, method=None):
+    """Sales Order on_submit: allocate it with the next queue run."""
+    if doc.branch not in ALLOCATION_BRANCHES:
+        return
+
+    _push(
+        f"Sales Order::{doc.name}",
+        {"company": doc.company, "branch": doc.branch, "sales_order": doc.name},
+    )
+
+
+def queue_stock_entry_allocation(doc, method=None):
+    """Stock Entry on_submit: allocate the quantities transferred into finished goods."""
+    if doc.stock_entry_type != FG_TRANSFER_TYPE or doc.branch not in ALLOCATION_BRANCHES:
+        return
+
+    items = {}
+    for d in doc.get("items"):
+        if d.t_warehouse and frappe.get_cached_value("Warehouse", d.t_warehouse, "parent_warehouse") == FG_PARENT_WAREHOUSE:
+            items[d.item_code] = items.get(d.item_code, 0) + flt(d.transfer_qty)
+    if not items:
+        return
+
+    _push(
+        f"Stock Entry::{doc.name}",
+        {"company": doc.company, "branch": doc.branch, "items": items},
+    )
+
+
+def process_allocation_queue():
+    """Scheduler (every minute): allocate everything queued since the last run."""
+    # Entries queued while this run allocates wait for the next one
+    entries = frappe.cache().hgetall(QUEUE_KEY) or {}
+    if not entries:
+        return
+
+    groups = {}
+    for field, entry in entries.items():
+        group = groups.setdefault(
+            (entry["company"], entry["branch"]), frappe._dict(fields={}, sales_orders=set(), items={})
+        )
+        group.fields[field] = entry
+        if entry.get("sales_order"):
+            group.sales_orders.add(entry["sales_order"])
+        for item_code, qty in (entry.get("items") or {}).items():
+            group.items[item_code] = group.items.get(item_code, 0) + flt(qty)
+
+    for (company, branch), group in groups.items():
+        try:
+            if group.sales_orders:
+                allocate_sales_orders(company, branch, sorted(group.sales_orders))
+            if group.items:
+                allocate_transferred_items(company, branch, group.items)
+            frappe.db.commit()
+        except Exception:
+            frappe.db.rollback()
+            frappe.log_error(frappe.get_traceback(), f"Queued allocation failed for {branch}")
+            _requeue_failed(group.fields)
+            continue
+
+        # Only drop the entries once their allocation is committed
+        for field in group.fields:
+            frappe.cache().hdel(QUEUE_KEY, field)
+
+
+def _requeue_failed(fields):
+    """Keeps the entries of a failed group for the next run, up to MAX_ATTEMPTS runs."""
+    for field, entry in fields.items():
+        entry["attempts"] = entry.get("attempts", 0) + 1
+        if entry["attempts"] >= MAX_ATTEMPTS:
+            frappe.cache().hdel(QUEUE_KEY, field)
+            frappe.log_error(
+                f"Dropped {field} from the allocation queue after {MAX_ATTEMPTS} failed runs",
+                "Queued allocation dropped",
+            )
+        else:
+            frappe.cache().hset(QUEUE_KEY, field, entry)
+
+
+def get_standing_allocation(company, branch):
+    name = frappe.db.get_value("Allocation", {"is_standing": 1, "company": company, "branch": branch})
+    if name:
+        return frappe.get_doc("Allocation", name)
+
+    allocation = frappe.get_doc({
+        "doctype": "Allocation",
+        "company": company,
+        "branch": branch,
+        "is_standing": 1,
+    })
+    allocation.insert(ignore_permissions=True)
+    return allocation
+
+
+def allocate_sales_orders(company, branch, sales_orders):
+    """Reserves stock for the open lines of several Sales Orders."""
+    allocation = get_standing_allocation(company, branch)
+    allocation.reserve_all(details=allocation.refresh_details(sales_orders=sales_orders))
+    return allocation
+
+
+def allocate_transferred_items(company, branch, items):
+    """
+    Reserves stock for the open SO lines of the transferred items only, capped
+    per item at its transferred qty ({item_code: stock qty}).
+    """
+    allocation = get_standing_allocation(company, branch)
+    allocation.reserve_all(
+        details=allocation.refresh_details(item_codes=sorted(items)), stock_limits=dict(items)
+    )
+    return allocation
+
+
+def _push(field, entry):
+    entry["queued_on"] = now_datetime()
+    # Only queue once the document is committed
+    frappe.db.after_commit.add(lambda: frappe.cache().hset(QUEUE_KEY, field, entry))
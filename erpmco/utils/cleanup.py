@@ -1,13 +1,85 @@
+import time
+
 import frappe
 from frappe.utils import add_days, now_datetime
 
+PURGE_CHUNK_SIZE = 500
+
 def delete_old_allocations():
     # Supprimer uniquement les allocations de plus de 1 jour
     cutoff = add_days(now_datetime(), -1)
-    allocations = frappe.get_all("Allocation", filters={"creation": ["<", cutoff]}, fields=["name"])
+    purge_allocations(to_date=cutoff)
+
+
+def purge_allocations(from_date=None, to_date=None, chunk_size=PURGE_CHUNK_SIZE, dry_run=False):
+    """
+    Supprime les Allocations créées entre from_date (inclus) et to_date (exclu),
+    avec leurs lignes, par lots de chunk_size (un commit par lot). Sont conservées
+    les allocations permanentes (is_standing) et celles référencées par une
+    Shortage ouverte. dry_run compte sans rien supprimer.
+    bench --site <site> purge-allocations [--to-date 2025-06-01] [--dry-run]
+    """
+    conditions = ""
+    params = {"chunk_size": chunk_size}
+    if from_date:
+        conditions += " AND a.creation >= %(from_date)s"
+        params["from_date"] = from_date
+    if to_date:
+        conditions += " AND a.creation < %(to_date)s"
+        params["to_date"] = to_date
+
+    stats = frappe._dict(allocations=0, details=0, chunks=0, dry_run=bool(dry_run))
+    started = time.monotonic()
+    last_name = ""
+    while True:
+        params["last_name"] = last_name
+        names = frappe.db.sql_list(
+            f"""
+            SELECT a.name
+            FROM `tabAllocation` a
+            WHERE a.is_standing = 0
+              AND a.name > %(last_name)s
+              {conditions}
+              AND NOT EXISTS (
+                  SELECT 1 FROM `tabShortage` s
+                  WHERE s.allocation = a.name AND s.docstatus = 1 AND s.status = 'Open'
+              )
+            ORDER BY a.name
+            LIMIT %(chunk_size)s
+            """,
+            params,
+        )
+        if not names:
+            break
+
+        last_name = names[-1]
+        chunk_started = time.monotonic()
+        details = frappe.db.count("Allocation Detail", {"parenttype": "Allocation", "parent": ["in", names]})
+        if not dry_run:
+            _delete_allocations(names)
+            frappe.db.commit()
+
+        stats.allocations += len(names)
+        stats.details += details
+        stats.chunks += 1
+        frappe.logger("erpmco").info(
+            f"Allocation purge{' (dry run)' if dry_run else ''}: chunk {stats.chunks}, "
+            f"{len(names)} allocations / {details} details in {time.monotonic() - chunk_started:.2f}s"
+        )
+
+    stats.seconds = round(time.monotonic() - started, 2)
+    stats.rows_per_second = round((stats.allocations + stats.details) / stats.seconds, 1) if stats.seconds else 0
+    frappe.logger("erpmco").info(
+        f"Allocation purge{' (dry run)' if dry_run else ''} done: {stats.allocations} allocations, "
+        f"{stats.details} details, {stats.chunks} chunks in {stats.seconds}s ({stats.rows_per_second} rows/s)"
+    )
+    return stats
+
 
-    for alloc in allocations:
-        try:
-            frappe.delete_doc("Allocation", alloc.name, force=True)
-        except Exception as e:
-            frappe.log_error(f"Erreur suppression Allocation {alloc.name}: {e}", "Allocation Cleanup")
+def _delete_allocations(names):
+    params = {"names": tuple(names)}
+    frappe.db.sql(
+        "DELETE FROM `tabAllocation Detail` WHERE parenttype = 'Allocation' AND parent IN %(names)s",
+        params,
+    )
+    frappe.db.sql("DELETE FROM `tabAllocation` WHERE name IN %(names)s", params)
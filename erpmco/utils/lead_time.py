@@ -0,0 +1,266 @@
+import json
+
+import frappe
+from frappe.utils import flt, getdate
+
+# Rolling window of PO -> PR samples kept per (item, supplier, branch)
+LEAD_TIME_WINDOW = 50
+
+
+def on_submit_purchase_receipt(doc, method):
+    """Fold the PO -> PR lead times of this receipt into the statistics store."""
+    if doc.is_return:
+        return
+
+    samples = _get_receipt_samples(doc)
+    for (item_code, supplier, branch), rows in samples.items():
+        _update_statistic(doc.company, item_code, supplier, branch, add=rows)
+
+
+def on_cancel_purchase_receipt(doc, method):
+    """Drop the samples contributed by a cancelled receipt."""
+    if doc.is_return:
+        return
+
+    keys = {
+        (d.item_code, doc.supplier, _get_receipt_branch(doc))
+        for d in doc.get("items")
+        if d.item_code and d.purchase_order
+    }
+    for item_code, supplier, branch in keys:
+        _update_statistic(doc.company, item_code, supplier, branch, remove_pr=doc.name)
+
+
+def _get_receipt_samples(doc):
+    """Returns {(item_code, supplier, branch): [sample, ...]} for PO-linked rows of a receipt."""
+    po_names = list({d.purchase_order for d in doc.get("items") if d.item_code and d.purchase_order})
+    if not po_names:
+        return {}
+
+    po_dates = dict(
+        frappe.db.sql(
+            """
+            SELECT name, transaction_date
+            FROM `tabPurchase Order`
+            WHERE name IN %(pos)s
+            """,
+            {"pos": tuple(po_names)},
+        )
+    )
+
+    pr_date = getdate(doc.posting_date)
+    branch = _get_receipt_branch(doc)
+    out = {}
+    seen = set()
+    for d in doc.get("items"):
+        if not d.item_code or not d.purchase_order or d.purchase_order not in po_dates:
+            continue
+        # One sample per (PR, PO, item) even if the item is split over several rows
+        if (d.purchase_order, d.item_code) in seen:
+            continue
+        seen.add((d.purchase_order, d.item_code))
+
+        po_date = getdate(po_dates[d.purchase_order])
+        out.setdefault((d.item_code, doc.supplier, branch), []).append({
+            "pr": doc.name,
+            "pr_date": str(pr_date),
+            "po": d.purchase_order,
+            "po_date": str(po_date),
+            "lead_days": (pr_date - po_date).days,
+        })
+    return out
+
+
+def _get_receipt_branch(doc):
+    from erpmco.item_360 import get_branch_field
+
+    field = get_branch_field("Purchase Receipt")
+    return doc.get(field) if field else None
+
+
+def _update_statistic(company, item_code, supplier, branch, add=None, remove_pr=None):
+    # Receipts without a branch are keyed on "" so the unique index covers them too
+    key = {"company": company, "item_code": item_code, "supplier": supplier, "branch": branch or ""}
+    name = _get_statistic_name(key)
+    if not name:
+        if not add:
+            return
+
+        stat = frappe.get_doc({"doctype": "Lead Time Statistic", **key})
+        _apply_samples(stat, add=add)
+        frappe.db.savepoint("lead_time_statistic")
+        try:
+            stat.insert(ignore_permissions=True)
+            return
+        except (frappe.DuplicateEntryError, frappe.UniqueValidationError):
+            # A concurrent receipt created the row first: fold the samples into it
+            frappe.db.rollback(save_point="lead_time_statistic")
+            name = _get_statistic_name(key)
+
+    stat = frappe.get_doc("Lead Time Statistic", name, for_update=True)
+    _apply_samples(stat, add=add, remove_pr=remove_pr)
+    stat.save(ignore_permissions=True)
+
+
+def _get_statistic_name(key):
+    # Locking read: sees rows committed by concurrent receipts and serializes their updates
+    return frappe.db.get_value(
+        "Lead Time Statistic", {**key, "branch": _branch_filter(key["branch"])}, "name", for_update=True
+    )
+
+
+def _apply_samples(stat, add=None, remove_pr=None):
+    samples = json.loads(stat.samples or "[]")
+    if remove_pr:
+        samples = [s for s in samples if s.get("pr") != remove_pr]
+    if add:
+        known = {(s.get("pr"), s.get("po")) for s in samples}
+        samples.extend(s for s in add if (s["pr"], s["po"]) not in known)
+
+    samples.sort(key=lambda s: s.get("pr_date") or "", reverse=True)
+    _set_statistics(stat, samples[:LEAD_TIME_WINDOW])
+
+
+def _branch_filter(branch):
+    return branch if branch else ["is", "not set"]
+
+
+def _set_statistics(stat, samples):
+    days = [flt(s["lead_days"]) for s in samples]
+    stat.samples = json.dumps(samples)
+    stat.sample_count = len(days)
+    stat.mean_days = (sum(days) / len(days)) if days else 0
+    stat.p50_days = _percentile(days, 50)
+    stat.p90_days = _percentile(days, 90)
+    stat.last_receipt_date = samples[0]["pr_date"] if samples else None
+
+
+def _percentile(values, pct):
+    """Linear-interpolated percentile, None when there is no data."""
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * flt(pct) / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarize_samples(samples, limit=None):
+    """Mean / p50 / p90 over the most recent samples (newest first)."""
+    samples = sorted(samples, key=lambda s: s.get("pr_date") or "", reverse=True)
+    if limit:
+        samples = samples[:limit]
+    days = [flt(s["lead_days"]) for s in samples]
+    return {
+        "avg_days": (sum(days) / len(days)) if days else None,
+        "p50_days": _percentile(days, 50),
+        "p90_days": _percentile(days, 90),
+        "n": len(days),
+        "samples": samples,
+    }
+
+
+def get_lead_time_samples(company, item_codes, branch, supplier=None):
+    """
+    Returns {item_code: [sample, ...]} from the statistics store for a branch,
+    merged across suppliers unless one is given.
+    """
+    if not item_codes:
+        return {}
+
+    filters = {"company": company, "item_code": ["in", list(item_codes)], "branch": _branch_filter(branch)}
+    if supplier:
+        filters["supplier"] = supplier
+
+    out = {}
+    for r in frappe.get_all("Lead Time Statistic", filters=filters, fields=["item_code", "samples"]):
+        out.setdefault(r.item_code, []).extend(json.loads(r.samples or "[]"))
+    return out
+
+
+@frappe.whitelist()
+def get_lead_time_statistics(company: str, item_code: str, branch: str | None = None, supplier: str | None = None):
+    """Stored lead-time distribution per supplier for an item."""
+    filters = {"company": company, "item_code": item_code}
+    if branch:
+        filters["branch"] = branch
+    if supplier:
+        filters["supplier"] = supplier
+
+    return frappe.get_all(
+        "Lead Time Statistic",
+        filters=filters,
+        fields=["supplier", "branch", "sample_count", "mean_days", "p50_days", "p90_days", "last_receipt_date"],
+        order_by="sample_count desc",
+    )
+
+
+def rebuild_lead_time_statistics(company=None):
+    """
+    Rebuilds the store from submitted receipts linked to a PO.
+    bench --site <site> execute erpmco.utils.lead_time.rebuild_lead_time_statistics
+    """
+    from erpmco.item_360 import get_branch_field
+
+    params = {}
+    company_cond = ""
+    if company:
+        params["company"] = company
+        company_cond = " AND pr.company = %(company)s"
+
+    branch_field = get_branch_field("Purchase Receipt")
+    branch_col = f"IFNULL(pr.`{branch_field}`, '')" if branch_field else "''"
+
+    rows = frappe.db.sql(
+        f"""
+        SELECT
+          pr.company,
+          pri.item_code,
+          pr.supplier,
+          {branch_col} AS branch,
+          pr.name AS pr,
+          pr.posting_date AS pr_date,
+          pri.purchase_order AS po,
+          po.transaction_date AS po_date,
+          DATEDIFF(pr.posting_date, po.transaction_date) AS lead_days
+        FROM `tabPurchase Receipt` pr
+        INNER JOIN `tabPurchase Receipt Item` pri ON pri.parent = pr.name
+        INNER JOIN `tabPurchase Order` po ON po.name = pri.purchase_order
+        WHERE pr.docstatus = 1
+          AND pr.is_return = 0
+          AND pri.purchase_order IS NOT NULL
+          {company_cond}
+        GROUP BY pr.company, pri.item_code, pr.supplier, {branch_col}, pr.name, pri.purchase_order
+        ORDER BY pr.posting_date DESC
+        """,
+        params,
+        as_dict=True,
+    )
+
+    grouped = {}
+    for r in rows:
+        key = (r.company, r.item_code, r.supplier, r.branch)
+        bucket = grouped.setdefault(key, [])
+        if len(bucket) < LEAD_TIME_WINDOW:
+            bucket.append({
+                "pr": r.pr,
+                "pr_date": str(r.pr_date),
+                "po": r.po,
+                "po_date": str(r.po_date),
+                "lead_days": int(r.lead_days or 0),
+            })
+
+    frappe.db.delete("Lead Time Statistic", {"company": company} if company else {})
+    for (comp, item_code, supplier, branch), samples in grouped.items():
+        stat = frappe.get_doc({
+            "doctype": "Lead Time Statistic",
+            "company": comp,
+            "item_code": item_code,
+            "supplier": supplier,
+            "branch": branch or "",
+        })
+        _set_statistics(stat, samples)
+        stat.insert(ignore_permissions=True)
+
+    frappe.db.commit()
@@ -0,0 +1,170 @@
+import hashlib
+import json
+
+import frappe
+from frappe.utils import add_to_date, flt, get_datetime, now_datetime
+
+from erpmco.item_360 import get_exception_settings, get_po_exception_inputs, scan_po_exception_rows
+
+STORED_FIELDS = [
+    "po_detail", "item_code", "item_name", "warehouse", "qty", "uom",
+    "total_stock", "avg_per_day", "open_po_qty", "cover_post_days",
+    "last_purchase_base_per_stock", "po_base_per_stock", "price_variance_pct",
+    "has_exception", "price_exception", "cover_exception", "supplier_exception",
+    "supplier_disabled", "supplier_on_hold",
+    "lead_time_avg_days", "lead_time_p50_days", "lead_time_p90_days", "lead_time_n",
+]
+# Stored rows older than this are rescanned: stock, consumption and open POs move on
+STORED_SCAN_MAX_AGE_HOURS = 6
+FLAG_FIELDS = ["has_exception", "price_exception", "cover_exception", "supplier_exception", "supplier_disabled", "supplier_on_hold"]
+
+
+def enqueue_po_exception_scan(doc, method):
+    """Purchase Order on_update: scan exceptions after commit, outside the request."""
+    if doc.docstatus == 2 or not get_exception_settings().enable_background_exception_scan:
+        return
+
+    frappe.enqueue(
+        "erpmco.utils.po_exception_scan.run_po_exception_scan",
+        queue="short",
+        job_id=f"po_exception_scan::{doc.name}",
+        deduplicate=True,
+        enqueue_after_commit=True,
+        po_name=doc.name,
+    )
+
+
+def clear_po_exception_scan(doc, method):
+    frappe.db.delete("Purchase Order Exception", {"purchase_order": doc.name})
+
+
+def run_po_exception_scan(po_name: str, full: bool = False):
+    """
+    Recomputes stored exception rows for a PO. Only item rows whose inputs
+    changed since the last scan are rescanned unless full=True.
+    """
+    if not frappe.db.exists("Purchase Order", po_name):
+        return
+
+    po = frappe.get_doc("Purchase Order", po_name)
+    settings = get_exception_settings()
+
+    items = get_po_exception_inputs(po)
+    context = _scan_context(po.supplier, settings)
+    hashes = {row["name"]: _row_hash(row, context) for row in items}
+    cutoff = _stale_cutoff()
+    stored = {
+        r.po_detail: r.row_hash if get_datetime(r.scanned_on) >= cutoff else None
+        for r in frappe.get_all(
+            "Purchase Order Exception",
+            filters={"purchase_order": po_name},
+            fields=["po_detail", "row_hash", "scanned_on"],
+        )
+    }
+
+    removed = [po_detail for po_detail in stored if po_detail not in hashes]
+    changed = items if full else [row for row in items if stored.get(row["name"]) != hashes[row["name"]]]
+
+    if removed:
+        frappe.db.delete("Purchase Order Exception", {"purchase_order": po_name, "po_detail": ["in", removed]})
+
+    if changed:
+        rows = scan_po_exception_rows(
+            po,
+            changed,
+            consumption_days=settings.consumption_days,
+            price_var_thresh_pct=settings.price_var_thresh_pct,
+            cover_overstock_days=settings.cover_overstock_days,
+        )
+        frappe.db.delete(
+            "Purchase Order Exception",
+            {"purchase_order": po_name, "po_detail": ["in", [r["po_detail"] for r in rows]]},
+        )
+        _insert_rows(po_name, rows, hashes)
+
+    frappe.db.commit()
+
+
+def _insert_rows(po_name, rows, hashes):
+    now = now_datetime()
+    fields = ["name", "creation", "modified", "owner", "modified_by", "purchase_order", "row_hash", "scanned_on"] + STORED_FIELDS
+    values = []
+    for r in rows:
+        values.append(
+            [frappe.generate_hash(length=10), now, now, frappe.session.user, frappe.session.user,
+             po_name, hashes[r["po_detail"]], now]
+            + [int(r[f]) if f in FLAG_FIELDS else r[f] for f in STORED_FIELDS]
+        )
+    frappe.db.bulk_insert("Purchase Order Exception", fields, values)
+
+
+def _scan_context(supplier, settings):
+    """Inputs shared by all rows of a PO: the supplier, its status and the exception thresholds."""
+    status = frappe.db.get_value("Supplier", supplier, ["disabled", "on_hold"], as_dict=True) or {}
+    return [
+        supplier, int(status.get("disabled") or 0), int(status.get("on_hold") or 0),
+        settings.consumption_days, flt(settings.price_var_thresh_pct), flt(settings.cover_overstock_days),
+    ]
+
+
+def _row_hash(row, context):
+    payload = context + [
+        row["item_code"], row["warehouse"], flt(row["qty"]), row["uom"],
+        flt(row["conversion_factor"]), flt(row["base_rate"]),
+    ]
+    return hashlib.md5(json.dumps(payload, default=str).encode()).hexdigest()
+
+
+def _stale_cutoff():
+    return add_to_date(now_datetime(), hours=-STORED_SCAN_MAX_AGE_HOURS)
+
+
+def get_stored_exception_rows(po_name: str):
+    """
+    Stored exception rows for a PO, or None when the stored scan does not match
+    the current PO rows, supplier status and thresholds (never scanned, or a scan
+    is still pending), or is older than STORED_SCAN_MAX_AGE_HOURS.
+    """
+    po = frappe.db.get_value("Purchase Order", po_name, ["supplier", "set_warehouse"], as_dict=True)
+    if not po:
+        return None
+
+    items = frappe.get_all(
+        "Purchase Order Item",
+        filters={"parent": po_name, "parenttype": "Purchase Order", "item_code": ["is", "set"]},
+        fields=["name", "item_code", "warehouse", "qty", "uom", "conversion_factor", "base_rate"],
+    )
+    for it in items:
+        it.warehouse = it.warehouse or po.set_warehouse
+        it.conversion_factor = flt(it.conversion_factor) or 1.0
+
+    stored = frappe.get_all(
+        "Purchase Order Exception",
+        filters={"purchase_order": po_name},
+        fields=["row_hash", "scanned_on"] + STORED_FIELDS,
+    )
+    context = _scan_context(po.supplier, get_exception_settings())
+    current = {it.name: _row_hash(it, context) for it in items}
+    if {r.po_detail: r.row_hash for r in stored} != current:
+        return None
+    cutoff = _stale_cutoff()
+    if any(get_datetime(r.scanned_on) < cutoff for r in stored):
+        frappe.enqueue(
+            "erpmco.utils.po_exception_scan.run_po_exception_scan",
+            queue="short",
+            job_id=f"po_exception_scan::{po_name}",
+            deduplicate=True,
+            po_name=po_name,
+        )
+        return None
+
+    out = []
+    for r in stored:
+        if not r.has_exception:
+            continue
+        r.pop("row_hash")
+        r.pop("scanned_on")
+        for f in FLAG_FIELDS:
+            r[f] = bool(r[f])
+        out.append(r)
+    return out
@@ -0,0 +1,149 @@
+import frappe
+import numpy as np
+import pandas as pd
+from frappe.utils import cint, getdate, now_datetime, nowdate
+
+from erpmco.item_360 import (
+    _get_branch_warehouses,
+    _get_consumption_map,
+    _get_open_po_map,
+    _get_reorder_map,
+    _get_stock_map,
+    get_exception_settings,
+)
+
+# Item codes per bulk-map query; keeps IN (...) tuples reasonable on large catalogs
+SCAN_CHUNK_SIZE = 2000
+INSERT_CHUNK_SIZE = 5000
+
+RESULT_FIELDS = [
+    "item_code", "item_name", "stock_uom",
+    "total_stock", "open_po_qty", "avg_per_day", "cover_current_days", "cover_post_days",
+    "reorder_level", "reorder_qty", "reorder_breach", "suggested_qty",
+]
+
+
+@frappe.whitelist()
+def run_replenishment_scan(company: str, branch: str, consumption_days: int | None = None):
+    """Queues a catalog-wide replenishment scan for a branch."""
+    frappe.only_for(("System Manager", "Purchase Manager", "Stock Manager"))
+    frappe.enqueue(
+        "erpmco.utils.replenishment.scan_branch",
+        queue="long",
+        timeout=1800,
+        job_id=f"replenishment_scan::{company}::{branch}",
+        deduplicate=True,
+        company=company,
+        branch=branch,
+        consumption_days=consumption_days,
+    )
+    return {"queued": True}
+
+
+def scheduled_replenishment_scan():
+    """Daily: scan every branch that has warehouses mapped to it."""
+    for company in frappe.get_all("Company", pluck="name"):
+        for branch in frappe.get_all("Branch", pluck="name"):
+            if _get_branch_warehouses(company, branch):
+                run_replenishment_scan(company, branch)
+
+
+def scan_branch(company: str, branch: str, consumption_days: int | None = None):
+    """
+    Computes cover, reorder breaches and suggested quantities for every stock
+    item of a branch and replaces the branch's Replenishment Scan Result rows.
+    """
+    consumption_days = cint(consumption_days) or get_exception_settings().consumption_days
+    branch_whs = _get_branch_warehouses(company, branch)
+    if not branch_whs:
+        frappe.throw(f"No warehouses are mapped to branch {branch}")
+
+    df = compute_replenishment(company, branch_whs, consumption_days)
+
+    frappe.db.delete("Replenishment Scan Result", {"company": company, "branch": branch})
+    _insert_results(company, branch, df)
+    frappe.db.commit()
+
+    return {"items": len(df), "breaches": int(df["reorder_breach"].sum()) if len(df) else 0}
+
+
+def compute_replenishment(company: str, branch_whs: list[str], consumption_days: int) -> pd.DataFrame:
+    items = frappe.get_all(
+        "Item",
+        filters={"is_stock_item": 1, "disabled": 0},
+        fields=["name as item_code", "item_name", "stock_uom"],
+        order_by="name",
+    )
+    if not items:
+        return pd.DataFrame(columns=RESULT_FIELDS)
+
+    to_date = getdate(nowdate())
+    from_date = getdate(frappe.utils.add_days(to_date, -max(consumption_days - 1, 0)))
+
+    stock_map, cons_map, open_po_map, reorder_map = {}, {}, {}, {}
+    codes = [i.item_code for i in items]
+    for start in range(0, len(codes), SCAN_CHUNK_SIZE):
+        chunk = codes[start:start + SCAN_CHUNK_SIZE]
+        stock_map.update(_get_stock_map(company, chunk, branch_whs))
+        cons_map.update(_get_consumption_map(company, chunk, from_date, to_date, branch_whs))
+        open_po_map.update(_get_open_po_map(company, chunk, None, branch_whs))
+        reorder_map.update(_get_reorder_map(chunk, branch_whs))
+
+    df = pd.DataFrame(items)
+    df["total_stock"] = df["item_code"].map(stock_map).fillna(0.0)
+    df["avg_per_day"] = df["item_code"].map(cons_map).fillna(0.0)
+    df["open_po_qty"] = df["item_code"].map(open_po_map).fillna(0.0)
+    df["reorder_level"] = df["item_code"].map(lambda c: reorder_map.get(c, {}).get("reorder_level", 0.0))
+    df["reorder_qty"] = df["item_code"].map(lambda c: reorder_map.get(c, {}).get("reorder_qty", 0.0))
+
+    projected = df["total_stock"] + df["open_po_qty"]
+    avg = df["avg_per_day"].where(df["avg_per_day"] > 0)
+    df["cover_current_days"] = df["total_stock"] / avg
+    df["cover_post_days"] = projected / avg
+
+    breach = (df["reorder_level"] > 0) & (projected <= df["reorder_level"])
+    df["reorder_breach"] = breach.astype(int)
+    df["suggested_qty"] = np.where(
+        breach,
+        np.maximum(df["reorder_qty"], df["reorder_level"] - projected),
+        0.0,
+    )
+
+    return df[RESULT_FIELDS]
+
+
+def _insert_results(company, branch, df):
+    now = now_datetime()
+    user = frappe.session.user
+    fields = ["name", "creation", "modified", "owner", "modified_by", "company", "branch", "scanned_on"] + RESULT_FIELDS
+
+    # object dtype hands plain Python scalars (and None for NaN) to the DB driver
+    records = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    values = [
+        [frappe.generate_hash(length=10), now, now, user, user, company, branch, now] + list(r)
+        for r in records
+    ]
+    frappe.db.bulk_insert("Replenishment Scan Result", fields, values, chunk_size=INSERT_CHUNK_SIZE)
+
+
+@frappe.whitelist()
+def get_replenishment_scan(
+    company: str,
+    branch: str,
+    start: int = 0,
+    page_length: int = 500,
+    only_breaches: int = 0,
+):
+    """Pages through the latest scan of a branch, breaches and lowest cover first."""
+    filters = {"company": company, "branch": branch}
+    if cint(only_breaches):
+        filters["reorder_breach"] = 1
+
+    return frappe.get_all(
+        "Replenishment Scan Result",
+        filters=filters,
+        fields=["scanned_on"] + RESULT_FIELDS,
+        order_by="reorder_breach desc, cover_post_days IS NULL, cover_post_days asc, item_code asc",
+        start=cint(start),
+        page_length=cint(page_length) or 500,
+    )
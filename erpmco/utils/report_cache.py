@@ -0,0 +1,169 @@
+"""
+Result cache for erpmco script reports.
+
+A report opts in by decorating the function that hits the database:
+
+    @cached_report("Sales Delivery by Transporter", doctypes=["Delivery Note"])
+    def get_rows(filters):
+        ...
+
+Entries are keyed on the report name plus the normalized filters and carry
+dependency tags: the doctypes they read and the filtered date range. Submitting
+or cancelling a tagged doctype (see doc_events in hooks.py) drops the entries
+whose range covers the document date. Entries also expire after a TTL, and each
+report keeps at most a bounded number of entries (oldest evicted first).
+
+TTL and size can be tuned per site with `erpmco_report_cache_ttl` (seconds) and
+`erpmco_report_cache_max_entries` in site_config.json.
+"""
+
+import functools
+import hashlib
+import json
+
+import frappe
+from frappe.utils import getdate, now_datetime, time_diff_in_seconds
+
+CACHE_PREFIX = "erpmco:report_cache:"
+INDEX_KEY = "erpmco:report_cache_index"
+DEFAULT_TTL = 6 * 3600
+DEFAULT_MAX_ENTRIES = 50
+
+
+def cached_report(report_name, doctypes, key_filters=None, date_fields=("from_date", "to_date"), ttl=None):
+    """
+    Caches the result of `fn(filters, *args)`.
+    key_filters: filters that identify a result (defaults to all of them).
+    date_fields: (from, to) filter names giving the period the result depends on.
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(filters, *args, **kwargs):
+            filters = frappe._dict(filters or {})
+            cache_key = get_cache_key(report_name, filters, key_filters)
+
+            cached = get_entry(report_name, cache_key, ttl)
+            if cached is not None:
+                return cached
+
+            result = fn(filters, *args, **kwargs)
+            set_entry(report_name, cache_key, result, doctypes, _get_period(filters, date_fields))
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def get_cache_key(report_name, filters, key_filters=None):
+    keys = key_filters or sorted(filters)
+    payload = {k: _normalize(filters.get(k)) for k in keys}
+    return hashlib.md5(json.dumps([report_name, payload], sort_keys=True, default=str).encode()).hexdigest()
+
+
+def get_entry(report_name, cache_key, ttl=None):
+    meta = frappe.cache().hget(INDEX_KEY, _index_field(report_name, cache_key))
+    if not meta:
+        return None
+
+    ttl = ttl or frappe.conf.get("erpmco_report_cache_ttl") or DEFAULT_TTL
+    if time_diff_in_seconds(now_datetime(), meta["cached_on"]) > ttl:
+        drop_entries([(report_name, cache_key)])
+        return None
+
+    return frappe.cache().hget(_cache_name(report_name), cache_key)
+
+
+def set_entry(report_name, cache_key, result, doctypes, period=None):
+    frappe.cache().hset(_cache_name(report_name), cache_key, result)
+    # Tags live in a separate index so invalidation never loads cached results
+    frappe.cache().hset(
+        INDEX_KEY,
+        _index_field(report_name, cache_key),
+        {
+            "report_name": report_name,
+            "cache_key": cache_key,
+            "doctypes": list(doctypes),
+            "from_date": str(period[0]) if period else None,
+            "to_date": str(period[1]) if period else None,
+            "cached_on": now_datetime(),
+        },
+    )
+    _evict(report_name)
+
+
+def drop_entries(entries):
+    for report_name, cache_key in entries:
+        frappe.cache().hdel(_cache_name(report_name), cache_key)
+        frappe.cache().hdel(INDEX_KEY, _index_field(report_name, cache_key))
+
+
+def clear_report_cache(report_name=None, doctype=None, from_date=None, to_date=None):
+    """
+    Drops entries matching all given tags. An entry without a period matches
+    any date; a date range matches the entries whose period overlaps it.
+    """
+    from_date = getdate(from_date) if from_date else None
+    to_date = getdate(to_date) if to_date else from_date
+
+    matches = []
+    for meta in _get_index().values():
+        if report_name and meta["report_name"] != report_name:
+            continue
+        if doctype and doctype not in meta["doctypes"]:
+            continue
+        if from_date and meta["from_date"] and meta["to_date"]:
+            if getdate(meta["from_date"]) > to_date or getdate(meta["to_date"]) < from_date:
+                continue
+        matches.append((meta["report_name"], meta["cache_key"]))
+
+    drop_entries(matches)
+
+
+def invalidate_report_cache(doc, method=None):
+    """
+    doc_events handler: drop cached results that read this doctype over this document's
+    date, once the transaction commits (a report run before then would cache the old data).
+    """
+    doc_date = doc.get("posting_date") or doc.get("transaction_date")
+    frappe.db.after_commit.add(
+        functools.partial(clear_report_cache, doctype=doc.doctype, from_date=doc_date, to_date=doc_date)
+    )
+
+
+def _evict(report_name):
+    max_entries = frappe.conf.get("erpmco_report_cache_max_entries") or DEFAULT_MAX_ENTRIES
+    entries = [meta for meta in _get_index().values() if meta["report_name"] == report_name]
+    if len(entries) <= max_entries:
+        return
+
+    entries.sort(key=lambda meta: meta["cached_on"])
+    drop_entries([(meta["report_name"], meta["cache_key"]) for meta in entries[: len(entries) - max_entries]])
+
+
+def _get_index():
+    return frappe.cache().hgetall(INDEX_KEY) or {}
+
+
+def _get_period(filters, date_fields):
+    if not date_fields:
+        return None
+    from_date, to_date = (filters.get(f) for f in date_fields)
+    if not from_date or not to_date:
+        return None
+    return getdate(from_date), getdate(to_date)
+
+
+def _normalize(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    return value if value not in (None, "") else None
+
+
+def _cache_name(report_name):
+    return CACHE_PREFIX + frappe.scrub(report_name)
+
+
+def _index_field(report_name, cache_key):
+    return f"{report_name}::{cache_key}"
@@ -0,0 +1,235 @@
+from contextlib import contextmanager
+
+import frappe
+from erpnext.stock.stock_balance import update_bin_qty
+from erpnext.stock.utils import get_or_make_bin
+from frappe.utils import flt
+
+SRE_CHUNK_SIZE = 200
+CLOSE_CHUNK_SIZE = 20
+
+
+@contextmanager
+def deferred_reservation_updates():
+    """
+    Collects the Bin and Reservation Balance refreshes requested while many
+    reservations are cancelled, then runs each one once on exit. Nested blocks
+    share the outer block's queue.
+    """
+    if frappe.flags.deferred_reservation_updates is not None:
+        yield frappe.flags.deferred_reservation_updates
+        return
+
+    pending = frappe._dict(stock_bins=set(), reserved_bins=set(), so_items=set())
+    frappe.flags.deferred_reservation_updates = pending
+    try:
+        yield pending
+    finally:
+        frappe.flags.deferred_reservation_updates = None
+
+    flush_reservation_updates(pending)
+
+
+def flush_reservation_updates(pending):
+    from erpmco.utils.reservation_balance import refresh_reservation_balances
+
+    for item_code, warehouse in pending.stock_bins:
+        frappe.get_doc("Bin", get_or_make_bin(item_code, warehouse)).update_reserved_stock()
+    update_bins_reserved_qty(pending.reserved_bins)
+    refresh_reservation_balances(pending.so_items)
+
+
+def update_bins_reserved_qty(pairs):
+    """
+    Sets Bin.reserved_qty of many (item_code, warehouse) pairs from one grouped
+    query, writing only the Bins whose value changed.
+    """
+    pairs = {(item_code, warehouse) for item_code, warehouse in pairs if item_code and warehouse}
+    if not pairs:
+        return
+
+    reserved = get_reserved_qty_by_bin(pairs)
+    current = {
+        (b.item_code, b.warehouse): flt(b.reserved_qty)
+        for b in frappe.get_all(
+            "Bin",
+            filters={
+                "item_code": ["in", list({p[0] for p in pairs})],
+                "warehouse": ["in", list({p[1] for p in pairs})],
+            },
+            fields=["item_code", "warehouse", "reserved_qty"],
+        )
+    }
+
+    for item_code, warehouse in pairs:
+        qty = flt(reserved.get((item_code, warehouse)))
+        if (item_code, warehouse) not in current and not qty:
+            continue
+        if flt(current.get((item_code, warehouse))) != qty:
+            update_bin_qty(item_code, warehouse, {"reserved_qty": qty})
+
+
+def get_reserved_qty_by_bin(pairs):
+    """
+    erpnext.stock.stock_balance.get_reserved_qty for many (item_code, warehouse)
+    pairs at once: pending Sales Order qty, direct and through Product Bundles,
+    of submitted orders that are not On Hold or Closed.
+    """
+    dont_reserve_on_return = frappe.get_cached_value(
+        "Selling Settings", "Selling Settings", "dont_reserve_sales_order_qty_on_sales_return"
+    )
+    returned = "so_item.returned_qty" if dont_reserve_on_return else "0"
+    params = {
+        "item_codes": tuple({p[0] for p in pairs}),
+        "warehouses": tuple({p[1] for p in pairs}),
+    }
+
+    rows = frappe.db.sql(
+        f"""
+        SELECT t.item_code, t.warehouse, SUM(t.qty * (t.so_qty - t.so_delivered_qty - t.so_returned_qty) / t.so_qty) AS reserved_qty
+        FROM (
+            SELECT pi.item_code, pi.warehouse, pi.qty,
+                so_item.qty AS so_qty, so_item.delivered_qty AS so_delivered_qty, {returned} AS so_returned_qty
+            FROM `tabPacked Item` pi
+            INNER JOIN `tabSales Order Item` so_item ON so_item.name = pi.parent_detail_docname
+            INNER JOIN `tabSales Order` so ON so.name = pi.parent
+            WHERE pi.parenttype = 'Sales Order'
+              AND pi.item_code != pi.parent_item
+              AND pi.item_code IN %(item_codes)s
+              AND pi.warehouse IN %(warehouses)s
+              AND IFNULL(so_item.delivered_by_supplier, 0) = 0
+              AND so.docstatus = 1
+              AND so.status NOT IN ('On Hold', 'Closed')
+
+            UNION ALL
+
+            SELECT so_item.item_code, so_item.warehouse, so_item.stock_qty,
+                so_item.qty, so_item.delivered_qty, {returned}
+            FROM `tabSales Order Item` so_item
+            INNER JOIN `tabSales Order` so ON so.name = so_item.parent
+            WHERE so_item.item_code IN %(item_codes)s
+              AND so_item.warehouse IN %(warehouses)s
+              AND IFNULL(so_item.delivered_by_supplier, 0) = 0
+              AND so.docstatus = 1
+              AND so.status NOT IN ('On Hold', 'Closed')
+        ) t
+        WHERE t.so_qty >= t.so_delivered_qty
+        GROUP BY t.item_code, t.warehouse
+        """,
+        params,
+        as_dict=True,
+    )
+
+    return {
+        (r.item_code, r.warehouse): flt(r.reserved_qty)
+        for r in rows
+        if (r.item_code, r.warehouse) in pairs
+    }
+
+
+def get_open_reservations(sales_orders):
+    """Open Stock Reservation Entries of some Sales Orders, oldest first."""
+    if not sales_orders:
+        return []
+
+    return frappe.db.sql_list(
+        """
+        SELECT name
+        FROM `tabStock Reservation Entry`
+        WHERE voucher_type = 'Sales Order'
+          AND voucher_no IN %(sales_orders)s
+          AND docstatus = 1
+          AND status NOT IN ('Delivered', 'Cancelled')
+          AND reserved_qty > delivered_qty
+        ORDER BY creation
+        """,
+        {"sales_orders": tuple(sales_orders)},
+    )
+
+
+def unreserve_sales_orders(sales_orders, chunk_size=SRE_CHUNK_SIZE, commit=False):
+    """
+    Cancels the open reservations of some Sales Orders, chunk_size at a time.
+    Bins and Reservation Balances are refreshed once per chunk instead of once
+    per entry. A failing entry is rolled back and logged. Returns the cancelled count.
+    """
+    sre_names = get_open_reservations(sales_orders)
+
+    cancelled = 0
+    for start in range(0, len(sre_names), chunk_size):
+        with deferred_reservation_updates():
+            for sre_name in sre_names[start:start + chunk_size]:
+                frappe.db.savepoint("unreserve_sre")
+                try:
+                    frappe.get_doc("Stock Reservation Entry", sre_name).cancel()
+                    cancelled += 1
+                except Exception:
+                    frappe.db.rollback(save_point="unreserve_sre")
+                    frappe.log_error(frappe.get_traceback(), f"Error cancelling SRE {sre_name}")
+
+        if commit:
+            frappe.db.commit()
+
+    return cancelled
+
+
+@frappe.whitelist()
+def close_sales_orders(names):
+    """Queues closing (and unreserving) many Sales Orders. Progress is published to the caller."""
+    if isinstance(names, str):
+        names = frappe.parse_json(names)
+    if not names:
+        frappe.throw("No Sales Orders selected.")
+
+    for name in names:
+        frappe.has_permission("Sales Order", "write", name, throw=True)
+
+    frappe.enqueue(
+        "erpmco.utils.reservation.close_sales_orders_job",
+        queue="long",
+        timeout=3600,
+        names=names,
+        user=frappe.session.user,
+    )
+    return {"queued": True, "sales_orders": len(names)}
+
+
+def close_sales_orders_job(names, user=None, chunk_size=CLOSE_CHUNK_SIZE):
+    """
+    Closes the Sales Orders chunk_size at a time, committing each chunk. Closing
+    an order cancels its reservations (CustomSalesOrder.update_reserved_qty);
+    each affected Bin is recomputed once per chunk. A failing order is rolled
+    back and logged.
+    """
+    closed, failed = [], []
+    total = len(names)
+    for start in range(0, total, chunk_size):
+        chunk = names[start:start + chunk_size]
+        with deferred_reservation_updates():
+            for name in chunk:
+                frappe.db.savepoint("close_sales_order")
+                try:
+                    so = frappe.get_doc("Sales Order", name)
+                    if so.status != "Closed":
+                        so.update_status("Closed")
+                    closed.append(name)
+                except Exception:
+                    frappe.db.rollback(save_point="close_sales_order")
+                    frappe.log_error(frappe.get_traceback(), f"Error closing Sales Order {name}")
+                    failed.append(name)
+
+        frappe.db.commit()
+        done = min(start + chunk_size, total)
+        frappe.publish_progress(
+            done * 100 / total,
+            title="Closing Sales Orders",
+            description=f"{done}/{total}",
+        )
+
+    frappe.publish_realtime(
+        "msgprint",
+        f"{len(closed)} Sales Order(s) closed, {len(failed)} failed"
+        + (f" ({', '.join(failed)})" if failed else ""),
+        user=user or frappe.session.user,
+    )
+    return {"closed": closed, "failed": failed}
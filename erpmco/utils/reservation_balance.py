@@ -0,0 +1,124 @@
+import frappe
+from frappe.utils import flt, now_datetime
+
+INSERT_CHUNK_SIZE = 5000
+DELETE_CHUNK_SIZE = 1000
+
+BALANCE_FIELDS = [
+    "sales_order", "sales_order_item", "customer", "company", "item_code", "warehouse",
+    "stock_uom", "uom", "conversion_factor", "reserved_qty", "delivered_qty", "balance_qty",
+    "so_reserved_qty", "so_balance_qty", "open_entries", "first_reserved_on",
+]
+QTY_FIELDS = ["reserved_qty", "delivered_qty", "balance_qty", "so_reserved_qty", "so_balance_qty", "open_entries"]
+
+
+def on_delivery_note_change(doc, method):
+    """
+    Delivery Note on_submit / on_cancel: ERPNext writes the delivered qty of the
+    reservations with db_set, which fires no event, so refresh the SO lines it delivers.
+    """
+    so_items = {d.so_detail for d in doc.get("items") if d.get("so_detail")}
+    if so_items:
+        refresh_reservation_balances(so_items)
+
+
+def refresh_reservation_balances(so_items):
+    """Recomputes the balances of some Sales Order Items, across warehouses."""
+    so_items = [d for d in set(so_items) if d]
+    if not so_items:
+        return
+
+    frappe.db.delete("Reservation Balance", {"sales_order_item": ["in", so_items]})
+    # A concurrent refresh may have inserted the same rows already (unique key)
+    _insert_balances(get_reservation_balance_rows(so_items=so_items), ignore_duplicates=True)
+
+
+def reconcile_reservation_balances():
+    """
+    Compares the balances with the open Stock Reservation Entries and rewrites the
+    Sales Order Items that drifted. Returns the number of Sales Order Items fixed.
+    bench --site <site> reconcile-reservation-balances
+    """
+    expected = {_key(r): r for r in get_reservation_balance_rows()}
+    current, row_counts = {}, {}
+    for r in frappe.get_all("Reservation Balance", fields=["sales_order_item", "warehouse"] + QTY_FIELDS):
+        current[_key(r)] = r
+        row_counts[_key(r)] = row_counts.get(_key(r), 0) + 1
+
+    stale = {key[0] for key in expected.keys() ^ current.keys()}
+    stale.update(key[0] for key, count in row_counts.items() if count > 1)
+    for key in expected.keys() & current.keys():
+        if any(flt(expected[key][f], 6) != flt(current[key][f], 6) for f in QTY_FIELDS):
+            stale.add(key[0])
+
+    stale = list(stale)
+    for start in range(0, len(stale), DELETE_CHUNK_SIZE):
+        chunk = stale[start : start + DELETE_CHUNK_SIZE]
+        frappe.db.delete("Reservation Balance", {"sales_order_item": ["in", chunk]})
+        chunk = set(chunk)
+        _insert_balances([r for key, r in expected.items() if key[0] in chunk])
+        frappe.db.commit()
+
+    if stale:
+        frappe.logger().info(f"Reservation Balance: reconciled {len(stale)} Sales Order Items")
+    return len(stale)
+
+
+def get_reservation_balance_rows(so_items=None):
+    """Open Sales Order reservations summed per (Sales Order Item, warehouse)."""
+    params = {}
+    conditions = ""
+    if so_items:
+        params["so_items"] = tuple(so_items)
+        conditions += " AND sre.voucher_detail_no IN %(so_items)s"
+
+    return frappe.db.sql(
+        f"""
+        SELECT
+            sre.voucher_no AS sales_order,
+            sre.voucher_detail_no AS sales_order_item,
+            so.customer,
+            sre.company,
+            sre.item_code,
+            sre.warehouse,
+            MAX(sre.stock_uom) AS stock_uom,
+            MAX(sre.custom_uom) AS uom,
+            MAX(sre.custom_conversion_factor) AS conversion_factor,
+            SUM(sre.reserved_qty) AS reserved_qty,
+            SUM(sre.delivered_qty) AS delivered_qty,
+            SUM(sre.reserved_qty - sre.delivered_qty) AS balance_qty,
+            SUM(sre.custom_so_reserved_qty) AS so_reserved_qty,
+            SUM(sre.custom_so_reserved_qty - sre.delivered_qty / IFNULL(NULLIF(sre.custom_conversion_factor, 0), 1)) AS so_balance_qty,
+            COUNT(*) AS open_entries,
+            MIN(sre.creation) AS first_reserved_on
+        FROM `tabStock Reservation Entry` sre
+        INNER JOIN `tabSales Order` so ON so.name = sre.voucher_no
+        WHERE sre.docstatus = 1
+          AND sre.voucher_type = 'Sales Order'
+          AND sre.status NOT IN ('Delivered', 'Cancelled')
+          {conditions}
+        GROUP BY sre.voucher_no, sre.voucher_detail_no, so.customer, sre.company, sre.item_code, sre.warehouse
+        """,
+        params,
+        as_dict=True,
+    )
+
+
+def _insert_balances(rows, ignore_duplicates=False):
+    if not rows:
+        return
+
+    now = now_datetime()
+    user = frappe.session.user
+    fields = ["name", "creation", "modified", "owner", "modified_by"] + BALANCE_FIELDS
+    values = [
+        [frappe.generate_hash(length=10), now, now, user, user] + [r[f] for f in BALANCE_FIELDS]
+        for r in rows
+    ]
+    frappe.db.bulk_insert(
+        "Reservation Balance", fields, values, chunk_size=INSERT_CHUNK_SIZE, ignore_duplicates=ignore_duplicates
+    )
+
+
+def _key(row):
+    return (row["sales_order_item"], row["warehouse"])
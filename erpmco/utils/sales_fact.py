@@ -0,0 +1,211 @@
+import frappe
+from frappe.utils import add_months, get_first_day, get_last_day, getdate, now_datetime, today
+
+from erpmco.erpmco.report.consolidated_monthly_sales_analysis.consolidated_monthly_sales_analysis import (
+    invalidate_cached_results,
+)
+
+INSERT_CHUNK_SIZE = 5000
+
+FACT_FIELDS = [
+    "month", "branch", "item_code", "item_name", "uom", "conversion_factor",
+    "qty", "stock_qty", "gross_amount", "net_amount", "tva", "fpi", "dda",
+    "cogs", "cogs_stock_qty", "free_qty", "cogs_free_qty",
+]
+
+
+def on_sales_invoice_change(doc, method):
+    """Sales Invoice on_submit / on_cancel: refresh the (month, branch) facts it touches."""
+    # The report only reads invoices with a branch (si.branch LIKE ...)
+    if not doc.get("branch") or not any(d.item_code for d in doc.get("items")):
+        return
+
+    enqueue_sales_fact_refresh(_month(doc.posting_date), doc.branch)
+
+
+def on_delivery_note_change(doc, method):
+    """
+    Delivery Note on_submit / on_cancel: COGS is read from the Delivery Note
+    Items of invoiced deliveries, so refresh the facts of the invoices billing it.
+    """
+    rows = frappe.db.sql(
+        """
+        SELECT DISTINCT DATE_FORMAT(si.posting_date, '%%Y-%%m') AS month, si.branch
+        FROM `tabSales Invoice Item` sii
+        INNER JOIN `tabSales Invoice` si ON si.name = sii.parent
+        WHERE sii.delivery_note = %(dn)s
+          AND si.docstatus = 1
+          AND IFNULL(si.branch, '') != ''
+        """,
+        {"dn": doc.name},
+        as_dict=True,
+    )
+
+    for r in rows:
+        enqueue_sales_fact_refresh(r.month, r.branch)
+
+
+def enqueue_sales_fact_refresh(month: str, branch: str):
+    """
+    Refreshes one month and branch once the submitting transaction commits, off
+    the request. Documents posted while the job is queued share it.
+    """
+    frappe.enqueue(
+        "erpmco.utils.sales_fact.refresh_sales_facts",
+        queue="short",
+        job_id=f"sales_fact::{month}::{branch}",
+        deduplicate=True,
+        enqueue_after_commit=True,
+        month=month,
+        branch=branch,
+    )
+
+
+def refresh_sales_facts(month: str, branch: str, item_codes=None):
+    """Recomputes the facts of one month and branch, or of some of its items."""
+    month_start = getdate(f"{month}-01")
+    filters = {"month": month, "branch": branch}
+    if item_codes:
+        item_codes = list(item_codes)
+        filters["item_code"] = ["in", item_codes]
+
+    frappe.db.delete("Sales Monthly Fact", filters)
+    rows = get_sales_fact_rows(month_start, get_last_day(month_start), branch=branch, item_codes=item_codes)
+    # A concurrent refresh may have inserted the same rows already (unique key)
+    _insert_facts(rows, ignore_duplicates=True)
+    invalidate_cached_results(month_start, get_last_day(month_start))
+
+
+def reconcile_sales_facts():
+    """
+    Daily: rebuilds the current and previous month, catching invoices changed
+    without submit / cancel events and refresh jobs that were lost.
+    """
+    rebuild_sales_facts(add_months(get_first_day(today()), -1), today())
+
+
+def rebuild_sales_facts(from_date=None, to_date=None):
+    """
+    Rebuilds the fact table month by month from submitted Sales Invoices.
+    bench --site <site> rebuild-sales-facts [--from-date 2025-01-01] [--to-date 2025-12-31]
+    """
+    if not from_date or not to_date:
+        bounds = frappe.db.sql(
+            "SELECT MIN(posting_date), MAX(posting_date) FROM `tabSales Invoice` WHERE docstatus = 1"
+        )[0]
+        if not bounds[0]:
+            return
+        from_date = from_date or bounds[0]
+        to_date = to_date or bounds[1]
+
+    month_start = get_first_day(from_date)
+    last_month = get_first_day(to_date)
+    while month_start <= last_month:
+        frappe.db.delete("Sales Monthly Fact", {"month": _month(month_start)})
+        _insert_facts(get_sales_fact_rows(month_start, get_last_day(month_start)))
+        invalidate_cached_results(month_start, get_last_day(month_start))
+        frappe.db.commit()
+        month_start = add_months(month_start, 1)
+
+
+def get_sales_fact_rows(from_date, to_date, branch=None, item_codes=None):
+    """Aggregates invoiced sales and delivered COGS per (month, branch, item) over a date range."""
+    params = {"from_date": from_date, "to_date": to_date}
+    conditions = ""
+    if branch:
+        params["branch"] = branch
+        conditions += " AND si.branch = %(branch)s"
+    if item_codes:
+        params["item_codes"] = tuple(item_codes)
+        conditions += " AND sii.item_code IN %(item_codes)s"
+
+    return frappe.db.sql(
+        f"""
+        SELECT
+            s.*,
+            IFNULL(c.cogs, 0) AS cogs,
+            IFNULL(c.cogs_stock_qty, 0) AS cogs_stock_qty,
+            IFNULL(c.free_qty, 0) AS free_qty,
+            IFNULL(c.cogs_free_qty, 0) AS cogs_free_qty
+        FROM (
+            SELECT
+                DATE_FORMAT(si.posting_date, '%%Y-%%m') AS month,
+                si.branch,
+                sii.item_code,
+                MAX(sii.item_name) AS item_name,
+                MAX(sii.uom) AS uom,
+                MAX(ucd.conversion_factor) AS conversion_factor,
+                SUM(sii.qty) AS qty,
+                SUM(CASE WHEN sii.stock_uom = 'T' THEN sii.stock_qty ELSE 0 END) AS stock_qty,
+                SUM(sii.amount) AS gross_amount,
+                SUM(sii.net_amount) AS net_amount,
+                IFNULL(SUM(
+                    (JSON_UNQUOTE(JSON_EXTRACT(sii.item_tax_rate, '$."44310000 - T.V.A. Charged On Sales - MCO"')) / 100)
+                    * sii.net_amount
+                ), 0) AS tva,
+                IFNULL(SUM(
+                    (JSON_UNQUOTE(JSON_EXTRACT(sii.item_tax_rate, '$."44210300 - Taxes - FPI on Sales - MCO"')) / 100)
+                    * sii.net_amount
+                ), 0) AS fpi,
+                IFNULL(SUM(
+                    (JSON_UNQUOTE(JSON_EXTRACT(sii.item_tax_rate, '$."44350000 - Droit de Acciss on Sales - MCO"')) / 100)
+                    * sii.net_amount
+                ), 0) AS dda
+            FROM `tabSales Invoice` si
+            INNER JOIN `tabSales Invoice Item` sii ON si.name = sii.parent
+            INNER JOIN `tabUOM Conversion Detail` ucd ON ucd.parent = sii.item_code AND ucd.uom = sii.uom
+            WHERE si.docstatus = 1
+              AND si.posting_date BETWEEN %(from_date)s AND %(to_date)s
+              AND IFNULL(si.branch, '') != ''
+              {conditions}
+            GROUP BY month, si.branch, sii.item_code
+        ) s
+        LEFT JOIN (
+            SELECT t.month, t.branch, t.item_code,
+                SUM(t.cogs) AS cogs,
+                SUM(t.stock_qty) AS cogs_stock_qty,
+                SUM(t.free_qty) AS free_qty,
+                SUM(t.cogs_free_qty) AS cogs_free_qty
+            FROM (
+                SELECT DATE_FORMAT(si.posting_date, '%%Y-%%m') AS month, si.branch, si.name, dni.item_code,
+                    CASE WHEN dni.stock_uom = 'T' THEN dni.stock_qty ELSE 0 END AS stock_qty,
+                    dni.stock_qty * dni.incoming_rate AS cogs,
+                    CASE WHEN dni.is_free_item = 1 THEN dni.stock_qty ELSE 0 END AS free_qty,
+                    CASE WHEN dni.is_free_item = 1 THEN dni.stock_qty * dni.incoming_rate ELSE 0 END AS cogs_free_qty
+                FROM `tabDelivery Note Item` dni
+                INNER JOIN `tabSales Invoice Item` sii ON dni.parent = sii.delivery_note AND dni.item_code = sii.item_code
+                LEFT JOIN `tabSales Invoice` si ON si.name = sii.parent
+                WHERE si.docstatus = 1
+                  AND si.posting_date BETWEEN %(from_date)s AND %(to_date)s
+                  AND IFNULL(si.branch, '') != ''
+                  {conditions}
+                -- one row per delivered line, even when several invoice rows bill the same item
+                GROUP BY si.branch, si.name, si.posting_date, si.customer, si.customer_name, dni.item_code, dni.item_name,
+                    dni.qty, dni.stock_qty, dni.amount, dni.parent, dni.against_sales_order
+            ) AS t
+            GROUP BY t.month, t.branch, t.item_code
+        ) c ON c.month = s.month AND c.branch = s.branch AND c.item_code = s.item_code
+        """,
+        params,
+        as_dict=True,
+    )
+
+
+def _insert_facts(rows, ignore_duplicates=False):
+    if not rows:
+        return
+
+    now = now_datetime()
+    user = frappe.session.user
+    fields = ["name", "creation", "modified", "owner", "modified_by"] + FACT_FIELDS
+    values = [
+        [frappe.generate_hash(length=10), now, now, user, user] + [r[f] for f in FACT_FIELDS]
+        for r in rows
+    ]
+    frappe.db.bulk_insert(
+        "Sales Monthly Fact", fields, values, chunk_size=INSERT_CHUNK_SIZE, ignore_duplicates=ignore_duplicates
+    )
+
+
+def _month(date):
+    return getdate(date).strftime("%Y-%m")
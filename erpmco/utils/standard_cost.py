@@ -0,0 +1,126 @@
+import hashlib
+import json
+
+import frappe
+from frappe.utils import add_days, flt, getdate, now_datetime, nowdate
+
+# First snapshot of an item covers all past months
+SEED_VALID_FROM = "1900-01-01"
+
+COST_FIELDS = [
+    "raw_material_cost", "scrap_material_credit", "total_cost",
+    "factory_overhead", "other_overhead", "labour", "depreciation", "std_cogs",
+]
+
+
+def enqueue_standard_cost_rebuild(doc=None, method=None, *args, **kwargs):
+    """BOM / Routing / Workstation events: refresh the snapshots after commit."""
+    frappe.enqueue(
+        "erpmco.utils.standard_cost.rebuild_standard_cost_snapshots",
+        queue="short",
+        job_id="standard_cost_snapshot",
+        deduplicate=True,
+        enqueue_after_commit=True,
+    )
+
+
+def get_standard_costs():
+    """Standard cost per T of each production item (first routing, default active BOM)."""
+    return frappe.db.sql(
+        """
+        SELECT *
+        FROM (
+            SELECT r.production_item, r.name AS routing, b.name AS bom,
+                b.raw_material_cost,
+                (b.scrap_material_cost * -1) AS scrap_material_credit,
+                b.total_cost,
+                (w.hour_rate_electricity * o.time_in_mins / 60) AS factory_overhead,
+                (w.hour_rate_consumable * o.time_in_mins / 60) AS other_overhead,
+                (w.hour_rate_labour * o.time_in_mins / 60) AS labour,
+                (w.hour_rate_rent * o.time_in_mins / 60) AS depreciation,
+                b.total_cost + ((w.hour_rate_electricity + w.hour_rate_consumable + w.hour_rate_labour + w.hour_rate_rent) * o.time_in_mins / 60) AS std_cogs,
+                ROW_NUMBER() OVER (PARTITION BY r.production_item ORDER BY r.name) AS rn
+            FROM `tabRouting` r
+            INNER JOIN `tabBOM Operation` o ON o.parent = r.name
+            INNER JOIN `tabWorkstation` w ON w.name = o.workstation
+            INNER JOIN `tabBOM` b ON b.item = r.production_item
+            WHERE b.docstatus = 1 AND b.is_active = 1 AND b.is_default = 1
+        ) ranked
+        WHERE ranked.rn = 1
+        """,
+        as_dict=True,
+    )
+
+
+def rebuild_standard_cost_snapshots():
+    """
+    Opens a new snapshot for every production item whose standard cost changed
+    and closes the previous one the day before. Unchanged items keep their snapshot.
+    bench --site <site> execute erpmco.utils.standard_cost.rebuild_standard_cost_snapshots
+    """
+    today = getdate(nowdate())
+    current = {
+        r.production_item: r
+        for r in frappe.get_all(
+            "Standard Cost Snapshot",
+            filters={"is_current": 1},
+            fields=["name", "production_item", "valid_from", "cost_hash"],
+        )
+    }
+    known_items = set(frappe.get_all("Standard Cost Snapshot", pluck="production_item", distinct=True))
+
+    new_rows = []
+    for row in get_standard_costs():
+        cost_hash = _cost_hash(row)
+        snapshot = current.pop(row.production_item, None)
+        if snapshot and snapshot.cost_hash == cost_hash:
+            continue
+
+        if snapshot:
+            _close_snapshot(snapshot, today)
+        valid_from = today if row.production_item in known_items else getdate(SEED_VALID_FROM)
+        new_rows.append((row, cost_hash, valid_from))
+
+    # Items that lost their routing or default BOM
+    for snapshot in current.values():
+        _close_snapshot(snapshot, today)
+
+    _insert_snapshots(new_rows)
+    frappe.db.commit()
+
+
+def _close_snapshot(snapshot, today):
+    if getdate(snapshot.valid_from) >= today:
+        # Changed again on the day it was opened: the new snapshot replaces it
+        frappe.db.delete("Standard Cost Snapshot", {"name": snapshot.name})
+    else:
+        frappe.db.set_value(
+            "Standard Cost Snapshot",
+            snapshot.name,
+            {"valid_to": add_days(today, -1), "is_current": 0},
+            update_modified=False,
+        )
+
+
+def _insert_snapshots(rows):
+    if not rows:
+        return
+
+    now = now_datetime()
+    user = frappe.session.user
+    fields = [
+        "name", "creation", "modified", "owner", "modified_by",
+        "production_item", "routing", "bom", "valid_from", "valid_to", "is_current", "cost_hash",
+    ] + COST_FIELDS
+    values = [
+        [frappe.generate_hash(length=10), now, now, user, user,
+         r.production_item, r.routing, r.bom, valid_from, None, 1, cost_hash]
+        + [flt(r[f]) for f in COST_FIELDS]
+        for r, cost_hash, valid_from in rows
+    ]
+    frappe.db.bulk_insert("Standard Cost Snapshot", fields, values)
+
+
+def _cost_hash(row):
+    payload = [row.routing, row.bom] + [round(flt(row[f]), 6) for f in COST_FIELDS]
+    return hashlib.md5(json.dumps(payload).encode()).hexdigest()
@@ -0,0 +1,75 @@
+# Copyright (c) 2026, Kossivi Dodzi Amouzou and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from erpmco.utils import allocation_queue
+from erpmco.utils.allocation_queue import MAX_ATTEMPTS, QUEUE_KEY, process_allocation_queue
+
+
+def queue(sales_order, branch="Kinshasa", **kwargs):
+    field = f"Sales Order::{sales_order}"
+    frappe.cache().hset(
+        QUEUE_KEY, field, {"company": "_Test Company", "branch": branch, "sales_order": sales_order, **kwargs}
+    )
+    return field
+
+
+class TestAllocationQueue(FrappeTestCase):
+    def setUp(self):
+        frappe.cache().delete_value(QUEUE_KEY)
+
+    def tearDown(self):
+        frappe.cache().delete_value(QUEUE_KEY)
+
+    def run_queue(self, allocate):
+        with (
+            patch.object(allocation_queue, "allocate_sales_orders", side_effect=allocate) as allocate_sales_orders,
+            patch.object(frappe.db, "commit"),
+            patch.object(frappe.db, "rollback"),
+            patch("frappe.log_error") as log_error,
+        ):
+            process_allocation_queue()
+        return allocate_sales_orders, log_error
+
+    def test_committed_entries_are_dropped(self):
+        queue("SO-2")
+        queue("SO-1")
+
+        allocate, _ = self.run_queue(lambda *args: None)
+
+        allocate.assert_called_once_with("_Test Company", "Kinshasa", ["SO-1", "SO-2"])
+        self.assertFalse(frappe.cache().hgetall(QUEUE_KEY))
+
+    def test_failed_entries_are_retried(self):
+        field = queue("SO-1")
+
+        self.run_queue(frappe.ValidationError)
+
+        self.assertEqual(frappe.cache().hget(QUEUE_KEY, field)["attempts"], 1)
+        self.run_queue(frappe.ValidationError)
+        self.assertEqual(frappe.cache().hget(QUEUE_KEY, field)["attempts"], 2)
+
+    def test_entry_dropped_after_max_attempts(self):
+        field = queue("SO-1", attempts=MAX_ATTEMPTS - 1)
+
+        _, log_error = self.run_queue(frappe.ValidationError)
+
+        self.assertIsNone(frappe.cache().hget(QUEUE_KEY, field))
+        self.assertIn("Queued allocation dropped", [c.args[1] for c in log_error.call_args_list])
+
+    def test_failing_group_does_not_block_others(self):
+        failing = queue("SO-1", branch="Failing")
+        working = queue("SO-2")
+
+        def allocate(company, branch, sales_orders):
+            if branch == "Failing":
+                raise frappe.ValidationError
+
+        self.run_queue(allocate)
+
+        self.assertEqual(frappe.cache().hget(QUEUE_KEY, failing)["attempts"], 1)
+        self.assertIsNone(frappe.cache().hget(QUEUE_KEY, working))
@@ -0,0 +1,87 @@
+# Copyright (c) 2026, Kossivi Dodzi Amouzou and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, now_datetime
+
+from erpmco.utils.cleanup import purge_allocations
+
+
+def make_allocation(details=1, **kwargs):
+    allocation = frappe.get_doc(
+        {
+            "doctype": "Allocation",
+            "company": frappe.db.get_value("Company", {}, "name"),
+            "naming_series": "YY.ALL.MM.",
+            "details": [{"qty_ordered": 1} for _ in range(details)],
+            **kwargs,
+        }
+    )
+    allocation.insert(ignore_permissions=True)
+    return allocation
+
+
+def make_shortage(allocation, cancel=False):
+    shortage = frappe.get_doc(
+        {
+            "doctype": "Shortage",
+            "shortage": 1,
+            "allocation": allocation.name,
+            "allocation_detail": allocation.details[0].name,
+        }
+    )
+    shortage.insert(ignore_permissions=True)
+    shortage.submit()
+    if cancel:
+        shortage.flags.resolved = True
+        shortage.cancel()
+    return shortage
+
+
+class TestPurgeAllocations(FrappeTestCase):
+    def setUp(self):
+        self.from_date = add_to_date(now_datetime(), seconds=-1)
+        self.plain = make_allocation(details=2)
+        self.resolved = make_allocation()
+        make_shortage(self.resolved, cancel=True)
+        self.open_shortage = make_allocation()
+        make_shortage(self.open_shortage)
+        self.standing = make_allocation(is_standing=1)
+
+    def tearDown(self):
+        frappe.db.rollback()
+
+    def purge(self, **kwargs):
+        with patch.object(frappe.db, "commit"):
+            return purge_allocations(from_date=self.from_date, chunk_size=1, **kwargs)
+
+    def test_dry_run_deletes_nothing(self):
+        stats = self.purge(dry_run=True)
+
+        self.assertTrue(stats.dry_run)
+        self.assertEqual(stats.allocations, 2)
+        self.assertEqual(stats.details, 3)
+        for allocation in (self.plain, self.resolved, self.open_shortage, self.standing):
+            self.assertTrue(frappe.db.exists("Allocation", allocation.name))
+        self.assertEqual(frappe.db.count("Allocation Detail", {"parent": self.plain.name}), 2)
+
+    def test_purge_keeps_standing_and_open_shortage_allocations(self):
+        stats = self.purge()
+
+        self.assertEqual(stats.allocations, 2)
+        self.assertEqual(stats.chunks, 2)
+        for allocation in (self.plain, self.resolved):
+            self.assertFalse(frappe.db.exists("Allocation", allocation.name))
+            self.assertFalse(frappe.db.count("Allocation Detail", {"parent": allocation.name}))
+        for allocation in (self.open_shortage, self.standing):
+            self.assertTrue(frappe.db.exists("Allocation", allocation.name))
+        self.assertEqual(frappe.db.count("Allocation Detail", {"parent": self.open_shortage.name}), 1)
+
+    def test_date_range_excludes_newer_allocations(self):
+        stats = self.purge(to_date=self.from_date)
+
+        self.assertEqual(stats.allocations, 0)
+        self.assertTrue(frappe.db.exists("Allocation", self.plain.name))
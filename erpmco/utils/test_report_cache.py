@@ -0,0 +1,88 @@
+# Copyright (c) 2026, Kossivi Dodzi Amouzou and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, now_datetime
+
+from erpmco.utils import report_cache
+
+REPORT = "_Test Cached Report"
+FILTERS = {"from_date": "2025-01-01", "to_date": "2025-01-31", "branch": "Kinshasa"}
+
+
+class TestReportCache(FrappeTestCase):
+    def setUp(self):
+        self.calls = 0
+
+        @report_cache.cached_report(REPORT, doctypes=["Sales Invoice"])
+        def get_rows(filters):
+            self.calls += 1
+            return [{"qty": self.calls}]
+
+        self.get_rows = get_rows
+
+    def tearDown(self):
+        report_cache.clear_report_cache(REPORT)
+
+    def test_hit(self):
+        self.assertEqual(self.get_rows(FILTERS), [{"qty": 1}])
+        self.assertEqual(self.get_rows(dict(FILTERS)), [{"qty": 1}])
+        self.assertEqual(self.calls, 1)
+
+    def test_other_filters_miss(self):
+        self.get_rows(FILTERS)
+        self.get_rows({**FILTERS, "branch": "Lubumbashi"})
+        self.assertEqual(self.calls, 2)
+
+    def test_expiry(self):
+        self.get_rows(FILTERS)
+        cache_key = report_cache.get_cache_key(REPORT, frappe._dict(FILTERS))
+        field = report_cache._index_field(REPORT, cache_key)
+        meta = frappe.cache().hget(report_cache.INDEX_KEY, field)
+        meta["cached_on"] = add_to_date(now_datetime(), seconds=-(report_cache.DEFAULT_TTL + 1))
+        frappe.cache().hset(report_cache.INDEX_KEY, field, meta)
+
+        self.assertIsNone(report_cache.get_entry(REPORT, cache_key))
+        # The expired entry is dropped, not only skipped
+        self.assertIsNone(frappe.cache().hget(report_cache.INDEX_KEY, field))
+        self.get_rows(FILTERS)
+        self.assertEqual(self.calls, 2)
+
+    def test_invalidation_by_doctype_and_date(self):
+        self.get_rows(FILTERS)
+
+        report_cache.clear_report_cache(doctype="Delivery Note", from_date="2025-01-10")
+        report_cache.clear_report_cache(doctype="Sales Invoice", from_date="2025-02-10")
+        self.get_rows(FILTERS)
+        self.assertEqual(self.calls, 1)
+
+        report_cache.clear_report_cache(doctype="Sales Invoice", from_date="2025-01-10")
+        self.get_rows(FILTERS)
+        self.assertEqual(self.calls, 2)
+
+    def test_document_event_clears_after_commit(self):
+        self.get_rows(FILTERS)
+        doc = frappe._dict(doctype="Sales Invoice", posting_date="2025-01-10")
+
+        with patch.object(frappe.db.after_commit, "add") as after_commit:
+            report_cache.invalidate_report_cache(doc, "on_submit")
+        # Nothing is cleared inside the transaction
+        self.get_rows(FILTERS)
+        self.assertEqual(self.calls, 1)
+
+        after_commit.call_args.args[0]()
+        self.get_rows(FILTERS)
+        self.assertEqual(self.calls, 2)
+
+    def test_eviction_keeps_the_newest_entries(self):
+        with patch.object(report_cache, "DEFAULT_MAX_ENTRIES", 2):
+            for branch in ("A", "B", "C"):
+                self.get_rows({**FILTERS, "branch": branch})
+
+            self.get_rows({**FILTERS, "branch": "C"})
+            self.assertEqual(self.calls, 3)
+            self.get_rows({**FILTERS, "branch": "A"})
+            self.assertEqual(self.calls, 4)
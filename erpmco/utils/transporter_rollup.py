@@ -0,0 +1,166 @@
+import frappe
+from frappe.utils import add_days, getdate, now_datetime, today
+
+INSERT_CHUNK_SIZE = 5000
+# Days rebuilt by the daily reconcile
+RECONCILE_DAYS = 31
+
+ROLLUP_FIELDS = ["posting_date", "branch", "transporter_name", "item_code", "item_name", "stock_uom", "cartons", "metric_ton"]
+
+
+def on_delivery_note_change(doc, method):
+    """Delivery Note on_submit / on_cancel: refresh the (date, transporter) rows it touches."""
+    if not doc.get("transporter_name") or not any(d.item_code for d in doc.get("items")):
+        return
+
+    enqueue_transporter_rollup_refresh(doc.posting_date, doc.transporter_name)
+
+
+def enqueue_transporter_rollup_refresh(posting_date, transporter_name):
+    """
+    Refreshes one day and transporter once the submitting transaction commits, off
+    the request. Delivery Notes posted while the job is queued share it.
+    """
+    posting_date = getdate(posting_date)
+    frappe.enqueue(
+        "erpmco.utils.transporter_rollup.refresh_transporter_rollup",
+        queue="short",
+        job_id=f"transporter_rollup::{posting_date}::{transporter_name}",
+        deduplicate=True,
+        enqueue_after_commit=True,
+        posting_date=posting_date,
+        transporter_name=transporter_name,
+    )
+
+
+def refresh_transporter_rollup(posting_date, transporter_name, item_codes=None):
+    """Recomputes the rows of one day and transporter, across branches, or of some of its items."""
+    filters = {"posting_date": posting_date, "transporter_name": transporter_name}
+    if item_codes:
+        item_codes = list(item_codes)
+        filters["item_code"] = ["in", item_codes]
+
+    frappe.db.delete("Delivery Transporter Rollup", filters)
+    rows = get_rollup_rows(posting_date, posting_date, transporter_name=transporter_name, item_codes=item_codes)
+    # A concurrent refresh may have inserted the same rows already (unique key)
+    _insert_rollup(rows, ignore_duplicates=True)
+
+
+def reconcile_transporter_rollup():
+    """
+    Daily: rebuilds the last RECONCILE_DAYS days, catching Delivery Notes changed
+    without submit / cancel events and refresh jobs that were lost.
+    """
+    rebuild_transporter_rollup(add_days(today(), -RECONCILE_DAYS), today())
+
+
+def rebuild_transporter_rollup(from_date=None, to_date=None):
+    """
+    Rebuilds the rollup from submitted Delivery Notes, one month of days per commit.
+    bench --site <site> rebuild-transporter-rollup [--from-date 2025-01-01] [--to-date 2025-12-31]
+    """
+    if not from_date or not to_date:
+        bounds = frappe.db.sql(
+            "SELECT MIN(posting_date), MAX(posting_date) FROM `tabDelivery Note` WHERE docstatus = 1"
+        )[0]
+        if not bounds[0]:
+            return
+        from_date = from_date or bounds[0]
+        to_date = to_date or bounds[1]
+
+    start = getdate(from_date)
+    to_date = getdate(to_date)
+    while start <= to_date:
+        end = min(add_days(start, 30), to_date)
+        frappe.db.delete("Delivery Transporter Rollup", {"posting_date": ["between", [start, end]]})
+        _insert_rollup(get_rollup_rows(start, end))
+        frappe.db.commit()
+        start = add_days(end, 1)
+
+
+def get_rollup_rows(from_date, to_date, transporter_name=None, item_codes=None):
+    params = {"from_date": from_date, "to_date": to_date}
+    conditions = ""
+    if transporter_name:
+        params["transporter_name"] = transporter_name
+        conditions += " AND dn.transporter_name = %(transporter_name)s"
+    if item_codes:
+        params["item_codes"] = tuple(item_codes)
+        conditions += " AND dni.item_code IN %(item_codes)s"
+
+    return frappe.db.sql(
+        f"""
+        SELECT
+            dn.posting_date,
+            dn.branch,
+            dn.transporter_name,
+            dni.item_code,
+            MAX(dni.item_name) AS item_name,
+            MAX(dni.stock_uom) AS stock_uom,
+            SUM(dni.stock_qty) AS cartons,
+            SUM(dni.stock_qty * dni.conversion_factor) AS metric_ton
+        FROM `tabDelivery Note` dn
+        INNER JOIN `tabDelivery Note Item` dni ON dn.name = dni.parent
+        WHERE dn.docstatus = 1
+          AND dn.posting_date BETWEEN %(from_date)s AND %(to_date)s
+          AND IFNULL(dn.transporter_name, '') != ''
+          {conditions}
+        GROUP BY dn.posting_date, dn.branch, dn.transporter_name, dni.item_code
+        """,
+        params,
+        as_dict=True,
+    )
+
+
+def _insert_rollup(rows, ignore_duplicates=False):
+    if not rows:
+        return
+
+    now = now_datetime()
+    user = frappe.session.user
+    fields = ["name", "creation", "modified", "owner", "modified_by"] + ROLLUP_FIELDS
+    values = [
+        [frappe.generate_hash(length=10), now, now, user, user] + [r[f] for f in ROLLUP_FIELDS]
+        for r in rows
+    ]
+    frappe.db.bulk_insert(
+        "Delivery Transporter Rollup", fields, values, chunk_size=INSERT_CHUNK_SIZE, ignore_duplicates=ignore_duplicates
+    )
+
+
+def get_rollup_by_transporter(from_date, to_date, branch=None, transporter_name=None):
+    """Cartons and metric tons per (item, transporter) over a date range, from the rollup."""
+    params = {"from_date": from_date, "to_date": to_date}
+    conditions = ""
+    if branch:
+        params["branch"] = branch
+        conditions += " AND r.branch = %(branch)s"
+    if transporter_name:
+        params["transporter_name"] = transporter_name
+        conditions += " AND r.transporter_name = %(transporter_name)s"
+
+    return frappe.db.sql(
+        f"""
+        SELECT
+            r.item_code,
+            MAX(r.item_name) AS item_name,
+            MAX(r.stock_uom) AS stock_uom,
+            r.transporter_name,
+            SUM(r.cartons) AS cartons,
+            SUM(r.metric_ton) AS metric_ton
+        FROM `tabDelivery Transporter Rollup` r
+        WHERE r.posting_date BETWEEN %(from_date)s AND %(to_date)s
+          {conditions}
+        GROUP BY r.item_code, r.transporter_name
+        ORDER BY r.item_code
+        """,
+        params,
+        as_dict=True,
+    )
+
+
+@frappe.whitelist()
+def get_delivered_by_transporter(from_date: str, to_date: str, branch: str | None = None, transporter_name: str | None = None):
+    """JSON API: delivered cartons and metric tons per item and transporter for a date range."""
+    frappe.has_permission("Delivery Note", "read", throw=True)
+    return get_rollup_by_transporter(getdate(from_date), getdate(to_date), branch=branch, transporter_name=transporter_name)